@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Per update planning time of the frontier explorer (delta_explorer.frontier_explorer).
+# The maps are the competition map (dis_tutorial3/maps/map.yaml) tiled n x n times with corridors
+# between the tiles, at its 5 cm resolution and resampled to 2.5 cm. Everything further than
+# 'radius' meters from the start is hidden as unknown, like a partially explored map from
+# slam_toolbox. The explorer runs with the same parameters on every map.
+#
+# run with: python3 benchmarks/bench_frontiers.py [--map YAML]   (from delta_explorer)
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from delta_explorer.frontier_explorer import FrontierExplorer
+from delta_perception.occupancy_map import OccupancyMap
+
+DEFAULT_MAP = os.path.join(os.path.dirname(__file__), '..', '..', 'dis_tutorial3', 'maps', 'map.yaml')
+
+
+# the map tiled n x n times and resampled to 'resolution'. Every tile has its own outer walls, so
+# 0.6 m wide corridors are cut through the middle of the tiles to connect them.
+def scaled_map(base, n, resolution):
+    grid = np.tile(base.grid, (n, n))
+    half = int(round(0.3 / base.resolution))
+    for k in range(n):
+        cy = k * base.height + base.height // 2
+        cx = k * base.width + base.width // 2
+        grid[cy - half:cy + half, :] = OccupancyMap.FREE
+        grid[:, cx - half:cx + half] = OccupancyMap.FREE
+    factor = base.resolution / resolution
+    if factor != 1.0:
+        grid = cv2.resize(grid.astype(np.int16), None, fx=factor, fy=factor, interpolation=cv2.INTER_NEAREST).astype(np.int8)
+    return OccupancyMap(grid, resolution, base.origin_x, base.origin_y)
+
+
+# hides the map further than 'radius' meters from (x, y)
+def partially_explored(occupancy, x, y, radius):
+    iy, ix = np.mgrid[:occupancy.height, :occupancy.width]
+    wx, wy = occupancy.cell_to_world(ix, iy)
+    grid = occupancy.grid.copy()
+    grid[np.hypot(wx - x, wy - y) > radius] = OccupancyMap.UNKNOWN
+    return OccupancyMap(grid, occupancy.resolution, occupancy.origin_x, occupancy.origin_y)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--map', default=DEFAULT_MAP)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    base = OccupancyMap.from_yaml(args.map)
+    explorer = FrontierExplorer()
+    # in the corridors of the first tile
+    start_x, start_y = base.cell_to_world(base.width // 2, base.height // 2)
+
+    print('%6s %8s %12s %10s %10s %10s' % ('tiles', 'res [m]', 'cells', 'frontiers', 'plan [ms]', 'us/kcell'))
+    for resolution in (base.resolution, base.resolution / 2):
+        for n in (1, 2, 4, 8):
+            occupancy = scaled_map(base, n, resolution)
+            for radius in (2.0, 0.5 * n * base.width * base.resolution):
+                explored = partially_explored(occupancy, start_x, start_y, radius)
+                best = float('inf')
+                for _ in range(args.repeats):
+                    t0 = time.perf_counter()
+                    frontiers = explorer.plan(explored, start_x, start_y)
+                    best = min(best, time.perf_counter() - t0)
+                cells = explored.width * explored.height
+                print('%6d %8.3f %12d %10d %10.2f %10.2f' % (
+                    n, resolution, cells, len(frontiers), best * 1e3, best * 1e6 / (cells / 1e3)))
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,14 @@ from geometry_msgs.msg import PointStamped
 from rclpy.qos import QoSProfile, QoSReliabilityPolicy
 from builtin_interfaces.msg import Duration
 
+# frontier exploration
+import math
+from nav_msgs.msg import OccupancyGrid
+from delta_perception.occupancy_map import OccupancyMap
+from delta_perception.transform_cache import TransformCache
+from delta_perception.robot_pose import RobotPoseCache
+from delta_explorer.frontier_explorer import FrontierExplorer
+
 
 
 # robot commander ----------------------------------------------------------------------------------
@@ -56,6 +64,13 @@ amcl_pose_qos = QoSProfile(
           history=QoSHistoryPolicy.KEEP_LAST,
           depth=1)
 
+# /map is published once (transient local) by map_server and slam_toolbox
+map_qos = QoSProfile(
+          durability=QoSDurabilityPolicy.TRANSIENT_LOCAL,
+          reliability=QoSReliabilityPolicy.RELIABLE,
+          history=QoSHistoryPolicy.KEEP_LAST,
+          depth=1)
+
 class RobotCommander(Node):
 
     def __init__(self, node_name='robot_commander', namespace=''):
@@ -315,6 +330,7 @@ class RobotController:
     
         self._arrived = False
         self._rotation_complete = False
+        self._move_status = None
         self._node = node
         
         # ROS2 Action clients
@@ -341,6 +357,7 @@ class RobotController:
         self._move_rot = rot
         
         self._arrived = False
+        self._move_status = None
           
         # building the message
         goal_pose = PoseStamped()
@@ -408,6 +425,7 @@ class RobotController:
 
     def get_move_result_callback(self, future):
         result = future.result()
+        self._move_status = result.status
         self._arrived = True
         
     def get_rotate_result_callback(self, future):
@@ -478,6 +496,28 @@ class Explorer(Node):
         
         self.explorationPointIndex = 0
         
+        # 'waypoints': the exploration points above are visited in a loop.
+        # 'frontier': explore the frontiers of the occupancy grid first, the exploration points are
+        # used when there are none left. This needs a map with unknown cells, i.e. a live /map of
+        # SLAM (slam_toolbox). The static competition map of map_server has no unknown cells, so
+        # with it there are no frontiers and frontier mode is the same as waypoints.
+        self.declare_parameter('exploration_mode', 'waypoints')
+        self.exploration_mode = self.get_parameter('exploration_mode').get_parameter_value().string_value
+        self.frontier_explorer = FrontierExplorer()
+        
+        # occupancy grid from /map, or from a map yaml file if 'map_yaml' is set
+        self.occupancy_map = None
+        self.declare_parameter('map_yaml', '')
+        map_yaml = self.get_parameter('map_yaml').get_parameter_value().string_value
+        if map_yaml:
+            self.occupancy_map = OccupancyMap.from_yaml(map_yaml)
+        else:
+            self.map_subscription = self.create_subscription(OccupancyGrid, '/map', self.receive_map, map_qos)
+        
+        # robot position for planning
+        self.tf_cache = TransformCache(self)
+        self.robot_pose = RobotPoseCache(self, self.tf_cache)
+        
         # publishing the jobs status
         self.publisher_ = self.create_publisher(JobStatus, 'job_status', 1)
         timer_period = 1.0  # seconds
@@ -528,7 +568,10 @@ class Explorer(Node):
         # TODO: start exploring!
         self.keepExploring = True
         self.stoppedExploring = False
-        thread = Thread(target = self.exploreNextPoint)
+        if self.exploration_mode == 'frontier':
+            thread = Thread(target = self.exploreNextFrontier)
+        else:
+            thread = Thread(target = self.exploreNextPoint)
         thread.start()
         self.get_logger().info('starting to explore! Finished job with id: '+self.id_of_current_job)
         
@@ -600,6 +643,54 @@ class Explorer(Node):
             self.stoppedExploring = True
             return
             
+    def receive_map(self, msg):
+        self.occupancy_map = OccupancyMap.from_msg(msg)
+        if self.exploration_mode == 'frontier' and not (self.occupancy_map.grid == OccupancyMap.UNKNOWN).any():
+            self.get_logger().warn('/map has no unknown cells (static map?), frontier mode needs a SLAM map', once=True)
+        
+    def exploreNextFrontier(self):
+        if not self.keepExploring:
+            self.stoppedExploring = True
+            return
+        
+        occupancy_map = self.occupancy_map
+        robot_pose = self.robot_pose.get(1.0)
+        if occupancy_map is None or robot_pose is None:
+            self.get_logger().info('waiting for the map and the robot position')
+            time.sleep(1)
+            thread = Thread(target = self.exploreNextFrontier)
+            thread.start()
+            return
+        
+        start = time.perf_counter()
+        frontiers = self.frontier_explorer.plan(occupancy_map, robot_pose.x, robot_pose.y)
+        self.get_logger().info('found %d frontiers in %.1f ms' % (len(frontiers), (time.perf_counter() - start) * 1e3))
+        if not frontiers:
+            self.get_logger().info('no frontiers left, continuing with the exploration points')
+            thread = Thread(target = self.exploreNextPoint)
+            thread.start()
+            return
+        
+        # drive to the best frontier, facing it
+        goal = frontiers[0]
+        rotation = math.atan2(goal.y - robot_pose.y, goal.x - robot_pose.x)
+        self.get_logger().info('moving to frontier (x: %f  y: %f  gain: %f m^2  distance: %f m)' % (goal.x, goal.y, goal.gain, goal.distance))
+        self.rc.move_to_position(goal.x, goal.y, rotation)
+        while not self.rc._arrived:
+            time.sleep(1)
+            self.get_logger().info('waiting until robot arrives at frontier')
+            # Publish a marker
+            self.send_marker(goal.x, goal.y)
+            self.send_marker(goal.x - 0.1, goal.y, 1, 0.15, "explorer_frontier")
+        
+        # not going there again, if it was reached its surroundings were seen, if not it is probably unreachable
+        if self.rc._move_status != GoalStatus.STATUS_SUCCEEDED:
+            self.get_logger().info('could not reach frontier (status %s)' % self.rc._move_status)
+        self.frontier_explorer.add_to_blacklist(goal.x, goal.y)
+        
+        thread = Thread(target = self.exploreNextFrontier)
+        thread.start()
+            
     def increment_exploration_point_index(self):
         self.explorationPointIndex = self.explorationPointIndex + 1
         if self.explorationPointIndex >= len(self.explorationPoints):
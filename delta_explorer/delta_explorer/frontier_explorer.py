@@ -0,0 +1,144 @@
+import math
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from delta_perception.occupancy_map import OccupancyMap
+
+
+# a frontier cluster: goal (x, y) in the map frame, length of the frontier (m), unknown area around
+# the goal (m^2), straight line distance from the robot (m) and the resulting score
+Frontier = namedtuple('Frontier', ['x', 'y', 'length', 'gain', 'distance', 'score'])
+
+
+# free cells with an unknown 8-neighbour
+def frontier_mask(grid):
+    free = (grid == OccupancyMap.FREE).astype(np.uint8)
+    unknown = (grid == OccupancyMap.UNKNOWN).astype(np.uint8)
+    near_unknown = cv2.dilate(unknown, np.ones((3, 3), dtype=np.uint8))
+    return (free & near_unknown).astype(bool)
+
+
+# free cells the robot (a disk of 'radius' meters) fits on and that are connected to (ix, iy),
+# the start is moved to the closest such cell if the robot stands too close to a wall
+def reachable_mask(occupancy, ix, iy, radius):
+    not_occupied = (occupancy.grid != OccupancyMap.OCCUPIED).astype(np.uint8)
+    clearance = cv2.distanceTransform(not_occupied, cv2.DIST_L2, 5) * occupancy.resolution
+    traversable = ((occupancy.grid == OccupancyMap.FREE) & (clearance > radius)).astype(np.uint8)
+    if not traversable.any():
+        return np.zeros(traversable.shape, dtype=bool)
+
+    ix = min(max(ix, 0), occupancy.width - 1)
+    iy = min(max(iy, 0), occupancy.height - 1)
+    if not traversable[iy, ix]:
+        ys, xs = np.nonzero(traversable)
+        k = int(np.argmin((xs - ix) ** 2 + (ys - iy) ** 2))
+        ix, iy = xs[k], ys[k]
+    _, labels = cv2.connectedComponents(traversable, connectivity=4)
+    return labels == labels[iy, ix]
+
+
+# {label: (ix, iy)} of the cell closest to the centroid of its label for all labels > 0 of the
+# label image, found for all labels at once by sorting the cells by (label, distance to centroid)
+def closest_to_centroids(label_image, centroids):
+    ys, xs = np.nonzero(label_image)
+    cell_labels = label_image[ys, xs]
+    d = (xs - centroids[cell_labels, 0]) ** 2 + (ys - centroids[cell_labels, 1]) ** 2
+    order = np.lexsort((d, cell_labels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cell_labels[order][1:] != cell_labels[order][:-1]
+    best = order[first]
+    return {int(label): (int(xs[i]), int(ys[i])) for label, i in zip(cell_labels[best], best)}
+
+
+# Finds the frontiers (borders between known free space and unknown space) of an occupancy grid and
+# ranks them for exploration by information gain over travel cost:
+#   score = gain / (distance + distance_offset)
+# with gain the unknown area within 'sensor_range' of the goal and distance the straight line
+# distance from the robot (Nav2 plans the actual path). All parameters are in meters, so the same
+# values work for any map size and resolution. Everything is done with NumPy / OpenCV operations
+# on the whole grid, the cost grows linearly with the number of cells.
+class FrontierExplorer:
+    def __init__(self, robot_radius=0.2, sensor_range=1.5, min_frontier_length=0.3, distance_offset=0.5,
+                 blacklist_radius=0.3):
+        self.robot_radius = robot_radius
+        self.sensor_range = sensor_range
+        self.min_frontier_length = min_frontier_length
+        self.distance_offset = distance_offset
+        self.blacklist_radius = blacklist_radius
+        self.blacklist = []
+
+    # goals Nav2 could not reach are not picked again
+    def add_to_blacklist(self, x, y):
+        self.blacklist.append((x, y))
+
+    # frontiers reachable from (robot_x, robot_y), best first
+    def plan(self, occupancy, robot_x, robot_y):
+        res = occupancy.resolution
+        ix, iy = occupancy.world_to_cell(robot_x, robot_y)
+
+        # frontier cells the robot can reach: the reachable area is grown by the robot radius
+        # (plus a cell) because the frontier cells themselves are often too close to unknown space
+        # or walls for the robot to stand on
+        reachable = reachable_mask(occupancy, int(ix), int(iy), self.robot_radius)
+        grow = int(math.ceil(self.robot_radius / res)) + 1
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * grow + 1, 2 * grow + 1))
+        near_reachable = cv2.dilate(reachable.astype(np.uint8), kernel).astype(bool)
+        frontiers = frontier_mask(occupancy.grid) & near_reachable
+        if not frontiers.any():
+            return []
+
+        _, labels, stats, centroids = cv2.connectedComponentsWithStats(frontiers.astype(np.uint8), connectivity=8)
+        # frontier length: number of cells times the cell size (a diagonal line is sqrt(2) longer,
+        # close enough for ranking)
+        lengths = stats[1:, cv2.CC_STAT_AREA] * res
+        keep = np.flatnonzero(lengths >= self.min_frontier_length) + 1
+        if len(keep) == 0:
+            return []
+
+        # goal of a cluster: the reachable cell closest to the centroid of its frontier cells
+        goal_cells = self._goal_cells(reachable, labels, centroids, keep, grow)
+
+        # unknown cells in a window of +-sensor_range around each goal, from an integral image
+        unknown = (occupancy.grid == OccupancyMap.UNKNOWN).astype(np.uint8)
+        integral = cv2.integral(unknown)
+        r = int(round(self.sensor_range / res))
+        gx, gy = goal_cells[:, 0], goal_cells[:, 1]
+        x0 = np.clip(gx - r, 0, occupancy.width)
+        x1 = np.clip(gx + r + 1, 0, occupancy.width)
+        y0 = np.clip(gy - r, 0, occupancy.height)
+        y1 = np.clip(gy + r + 1, 0, occupancy.height)
+        gains = (integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]) * res * res
+
+        wx, wy = occupancy.cell_to_world(gx, gy)
+        distances = np.hypot(wx - robot_x, wy - robot_y)
+        scores = gains / (distances + self.distance_offset)
+
+        result = []
+        for k in np.argsort(-scores):
+            if self._blacklisted(wx[k], wy[k]):
+                continue
+            result.append(Frontier(float(wx[k]), float(wy[k]), float(lengths[keep[k] - 1]), float(gains[k]),
+                                   float(distances[k]), float(scores[k])))
+        return result
+
+    def _goal_cells(self, reachable, labels, centroids, keep, grow):
+        # reachable cells near a frontier take the label of the closest frontier cell within 'grow'
+        # cells. Instead of a nearest neighbour search the labels are dilated, where clusters meet
+        # the larger label wins, which only moves the goal by a few cells.
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * grow + 1, 2 * grow + 1))
+        kept = np.zeros(labels.max() + 1, dtype=np.int32)
+        kept[keep] = keep
+        kept_labels = kept[labels]
+        grown = cv2.dilate(kept_labels.astype(np.float32), kernel).astype(np.int64)
+        grown[~reachable] = 0
+        goals = closest_to_centroids(grown, centroids)
+
+        # clusters without a reachable cell next to them keep the frontier cell closest to their centroid
+        fallback = closest_to_centroids(kept_labels, centroids)
+        return np.array([goals.get(label, fallback.get(label)) for label in keep], dtype=np.int64).reshape(-1, 2)
+
+    def _blacklisted(self, x, y):
+        r2 = self.blacklist_radius * self.blacklist_radius
+        return any((x - bx) ** 2 + (y - by) ** 2 < r2 for bx, by in self.blacklist)
@@ -5,7 +5,7 @@ package_name = 'delta_explorer'
 setup(
     name=package_name,
     version='0.0.0',
-    packages=find_packages(exclude=['test']),
+    packages=find_packages(exclude=['test', 'benchmarks']),
     data_files=[
         ('share/ament_index/resource_index/packages',
             ['resource/' + package_name]),
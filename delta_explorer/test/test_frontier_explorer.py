@@ -0,0 +1,67 @@
+from delta_explorer.frontier_explorer import FrontierExplorer, frontier_mask
+from delta_perception.occupancy_map import OccupancyMap
+import numpy as np
+
+
+def room_map(resolution=0.05):
+    # 6 x 4 m, walls around, the left half known and free, the right half unknown
+    scale = int(round(0.05 / resolution))
+    grid = np.full((80, 120), OccupancyMap.UNKNOWN, dtype=np.int8)
+    grid[:, :60] = OccupancyMap.FREE
+    grid[[0, -1], :] = OccupancyMap.OCCUPIED
+    grid[:, [0, -1]] = OccupancyMap.OCCUPIED
+    grid = np.kron(grid, np.ones((scale, scale), dtype=np.int8))
+    return OccupancyMap(grid, resolution, 0.0, 0.0)
+
+
+def test_frontier_mask():
+    grid = np.array([[0, 0, -1],
+                     [0, 100, -1],
+                     [0, 0, 0]], dtype=np.int8)
+    assert frontier_mask(grid).tolist() == [[False, True, False],
+                                            [False, False, False],
+                                            [False, True, True]]
+
+
+def test_goal_on_the_frontier():
+    occupancy = room_map()
+    frontiers = FrontierExplorer().plan(occupancy, 1.0, 2.0)
+    assert len(frontiers) == 1
+    goal = frontiers[0]
+    # the frontier is the line x = 3 m, the goal is in the middle of it and the robot fits there
+    assert abs(goal.x - 3.0) < 0.3
+    assert abs(goal.y - 2.0) < 0.2
+    assert occupancy.is_free(goal.x, goal.y)
+    assert goal.gain > 0
+
+
+def test_same_result_at_other_resolution():
+    coarse = FrontierExplorer().plan(room_map(0.05), 1.0, 2.0)[0]
+    fine = FrontierExplorer().plan(room_map(0.025), 1.0, 2.0)[0]
+    assert abs(coarse.x - fine.x) < 0.1 and abs(coarse.y - fine.y) < 0.1
+    assert abs(coarse.gain - fine.gain) / coarse.gain < 0.1
+
+
+def test_unreachable_frontier_is_ignored():
+    occupancy = room_map()
+    # wall between the robot and the frontier
+    occupancy.grid[:, 40] = OccupancyMap.OCCUPIED
+    assert FrontierExplorer().plan(occupancy, 1.0, 2.0) == []
+
+
+def test_prefers_close_frontier_with_same_gain():
+    grid = np.full((80, 200), OccupancyMap.FREE, dtype=np.int8)
+    grid[:, :20] = OccupancyMap.UNKNOWN
+    grid[:, -20:] = OccupancyMap.UNKNOWN
+    occupancy = OccupancyMap(grid, 0.05, 0.0, 0.0)
+    frontiers = FrontierExplorer().plan(occupancy, 3.0, 2.0)
+    assert len(frontiers) == 2
+    assert frontiers[0].x < 5.0
+
+
+def test_blacklist():
+    occupancy = room_map()
+    explorer = FrontierExplorer()
+    goal = explorer.plan(occupancy, 1.0, 2.0)[0]
+    explorer.add_to_blacklist(goal.x, goal.y)
+    assert explorer.plan(occupancy, 1.0, 2.0) == []
@@ -7,15 +7,23 @@ import math
 
 from delta_interfaces.msg import ParkingJob
 from delta_interfaces.msg import JobStatus
-from threading import Thread
+from threading import Thread, Event
 
 # for transforming between coordinate frames
-from tf2_ros.buffer import Buffer
-from tf2_ros import TransformException
-from tf2_ros.transform_listener import TransformListener
-from rclpy.duration import Duration
-from geometry_msgs.msg import PointStamped
-import tf2_geometry_msgs as tfg
+from delta_perception.transform_cache import TransformCache
+from delta_perception.robot_pose import RobotPoseCache
+from delta_perception.angles import wrap_angle
+
+# for the final approach onto the ring
+from geometry_msgs.msg import Twist
+from delta_parking.servo_parking import ServoParkingController
+
+# for searching the parking ring and the cylinder
+import os
+from ament_index_python.packages import get_package_share_directory
+from delta_perception.occupancy_map import OccupancyMap
+from delta_parking.search_planner import plan_search
+from delta_parking.goal_tracker import GoalTracker
 
 # robot controller imports
 from geometry_msgs.msg import Quaternion, PoseStamped
@@ -37,16 +45,25 @@ from irobot_create_msgs.msg import AudioNoteVector, AudioNote
 from std_msgs.msg import String as String_msg
 
 
+# how often the parking sequence used to check the completion flags (seconds), only used to
+# report how much time waiting on the events saves
+POLL_PERIODS = {'navigate': 0.2, 'rotate': 1.0, 'drive_forward': 1.0, 'cancel': 1.0}
+
+
 class RobotController:
 
     def __init__(self, node):
     
-        self._arrived = False
-        self._rotation_complete = False
-        self._move_forward_complete = False
-        self._task_canceled = False
+        # set by the result callbacks, the parking thread waits on them
+        self.arrived_event = Event()
+        self.rotation_event = Event()
+        self.move_forward_event = Event()
+        self.canceled_event = Event()
         self._node = node
         
+        # sequence numbers of the primitives, results of canceled or replaced goals are ignored
+        self.goals = GoalTracker()
+        
         # ROS2 Action clients
         self._nav_to_pose_client = ActionClient(self._node, NavigateToPose, 'navigate_to_pose')
         self._spin_client = ActionClient(self._node, Spin, 'spin')
@@ -56,6 +73,33 @@ class RobotController:
         self._move_y = None
         self._move_rot = None
         self._rotate_rot = None
+        self._drive_distance = None
+        self._drive_speed = None
+        
+    # checks if the robot arrived without waiting
+    @property
+    def _arrived(self):
+        return self.arrived_event.is_set()
+        
+    # (primitive, seconds from sending the goal to its result) of the finished primitives
+    @property
+    def primitive_durations(self):
+        return self.goals.durations
+        
+    @primitive_durations.setter
+    def primitive_durations(self, durations):
+        self.goals.durations = durations
+        
+    # result of primitive 'seq', sets its event unless a newer primitive was started meanwhile
+    def _finish(self, seq):
+        if not self.goals.finish(seq):
+            self._node.get_logger().info(f'Ignoring the result of an old goal ({seq}, current {self.goals.seq})')
+        
+    # seconds the finished primitives took and how much longer polling the flags would have taken
+    def timing_summary(self):
+        waited = sum(d for _, d in self.primitive_durations)
+        polled = sum(max(math.ceil(d / POLL_PERIODS[name]), 1) * POLL_PERIODS[name] for name, d in self.primitive_durations)
+        return len(self.primitive_durations), waited, polled - waited
         
         
     def YawToQuaternion(self, angle_z = 0.):
@@ -71,7 +115,7 @@ class RobotController:
         self._move_y = y
         self._move_rot = rot
         
-        self._arrived = False
+        seq = self.goals.start('navigate', self.arrived_event)
           
         # building the message
         goal_pose = PoseStamped()
@@ -92,12 +136,12 @@ class RobotController:
                   
         self._send_move_goal_future = self._nav_to_pose_client.send_goal_async(goal_msg, feedback_callback=self.feedback_callback)
         
-        self._send_move_goal_future.add_done_callback(self.move_goal_response_callback)
+        self._send_move_goal_future.add_done_callback(lambda future: self.move_goal_response_callback(seq, future))
         
     def rotate(self, spin_dist_in_rad):
         self._rotate_rot = spin_dist_in_rad
     
-        self._rotation_complete = False
+        seq = self.goals.start('rotate', self.rotation_event)
     
         goal_msg = Spin.Goal()
         goal_msg.target_yaw = spin_dist_in_rad
@@ -108,10 +152,13 @@ class RobotController:
         
         self._send_rotate_goal_future = self._spin_client.send_goal_async(goal_msg, feedback_callback=self.feedback_callback)
         
-        self._send_rotate_goal_future.add_done_callback(self.rotate_goal_response_callback)
+        self._send_rotate_goal_future.add_done_callback(lambda future: self.rotate_goal_response_callback(seq, future))
         
     def drive_forward(self, distance = 0.15, speed = 0.5):
-        self._move_forward_complete = False
+        self._drive_distance = distance
+        self._drive_speed = speed
+        
+        seq = self.goals.start('drive_forward', self.move_forward_event)
         
         drive_msg = DriveOnHeading.Goal()
         targetPoint = Point()
@@ -125,77 +172,77 @@ class RobotController:
         
         self._send_move_forward_goal_future = self._drive_on_heading_client.send_goal_async(drive_msg, feedback_callback=self.feedback_callback)
         
-        self._send_move_forward_goal_future.add_done_callback(self.drive_forward_response_callback)
+        self._send_move_forward_goal_future.add_done_callback(lambda future: self.drive_forward_response_callback(seq, future))
     
 
-    def move_goal_response_callback(self, future):
-        self.goal_handle = future.result()
-        if not self.goal_handle.accepted:
-            self._node.get_logger().info('Goal rejected :(')
-            self.move_to_position(self._move_x, self._move_y, self._move_rot)
-            return
-
-        self._node.get_logger().info('Goal accepted :)')
-
-        self.result_future = self.goal_handle.get_result_async()
-        self.result_future.add_done_callback(self.get_move_result_callback)
+    def move_goal_response_callback(self, seq, future):
+        self._goal_response(seq, future, lambda: self.move_to_position(self._move_x, self._move_y, self._move_rot))
+        
+    def rotate_goal_response_callback(self, seq, future):
+        self._goal_response(seq, future, lambda: self.rotate(self._rotate_rot))
         
-    def rotate_goal_response_callback(self, future):
-        self.goal_handle = future.result()
-        if not self.goal_handle.accepted:
-            self._node.get_logger().info('Goal rejected :(')
-            self.rotate(self._rotate_rot)
+    def drive_forward_response_callback(self, seq, future):
+        self._goal_response(seq, future, lambda: self.drive_forward(self._drive_distance, self._drive_speed))
+        
+    # goal response of primitive 'seq': a rejected goal is sent again with 'retry', a goal that was
+    # accepted after a newer primitive started (e.g. after a cancel) is canceled, the result of the
+    # others ends the primitive
+    def _goal_response(self, seq, future, retry):
+        goal_handle = future.result()
+        if not goal_handle.accepted:
+            if self.goals.is_current(seq):
+                self._node.get_logger().info('Goal rejected :(')
+                retry()
             return
 
-        self._node.get_logger().info('Goal accepted :)')
-
-        self.result_future = self.goal_handle.get_result_async()
-        self.result_future.add_done_callback(self.get_rotate_result_callback)
-        
-    def drive_forward_response_callback(self, future):
-        self.goal_handle = future.result()
-        if not self.goal_handle.accepted:
-            self._node.get_logger().info('Goal rejected :(')
-            self.drive_forward()
+        if not self.goals.accepted(seq, goal_handle):
+            self._node.get_logger().info('Goal accepted after it was replaced, canceling it')
+            goal_handle.cancel_goal_async()
             return
-            
+
         self._node.get_logger().info('Goal accepted :)')
-        
-        self.result_future = self.goal_handle.get_result_async()
-        self.result_future.add_done_callback(self.get_move_forward_callback)
-        
 
-    def get_move_result_callback(self, future):
-        result = future.result()
-        self._arrived = True
-        
-    def get_rotate_result_callback(self, future):
-        result = future.result()
-        self._rotation_complete = True
-        
-    def get_move_forward_callback(self, future):
-        result = future.result()
-        self._move_forward_complete = True
+        result_future = goal_handle.get_result_async()
+        result_future.add_done_callback(lambda _: self._finish(seq))
 
     def feedback_callback(self, feedback_msg):
         feedback = feedback_msg.feedback
         
-    def get_cancel_task_callback(self, future):
-         result = future.result()
-         self._task_canceled = True
-        
+    # cancels the goal of the current primitive. The primitive ends at once (e.g. arrived_event is
+    # set), its late result is ignored.
     def cancelTask(self):
-        self._task_canceled = False
+        seq, goal_handle = self.goals.cancel(self.canceled_event)
         self._node.get_logger().info('Canceling current task.')
-        if self.result_future:
-            self.cancel_result_future = self.goal_handle.cancel_goal_async()
-            self.cancel_result_future.add_done_callback(self.get_cancel_task_callback)
+        if goal_handle is not None:
+            self.cancel_result_future = goal_handle.cancel_goal_async()
+            self.cancel_result_future.add_done_callback(lambda _: self._finish(seq))
         else:
-            self._task_canceled = True
+            self._finish(seq)
      
      
 
 
+# seconds the parking sequence waits for a motion primitive before it cancels it and goes on
+MOVE_FORWARD_TIMEOUT = 20.0
+ROTATE_TIMEOUT = 30.0
+CANCEL_TIMEOUT = 5.0
+
+# final approach with cmd_vel: control rate (Hz), timeout (seconds) and the maximum age of the
+# robot pose it uses (seconds since its transform last updated)
+SERVO_RATE = 20.0
+SERVO_TIMEOUT = 15.0
+SERVO_POSE_MAX_AGE = 0.2
+
+# searching: horizontal field of view (rad) and range (m) in which the detectors find the
+# object, seconds to wait for a detection after each view and the time budget of a search
+RING_SEARCH_FOV = 1.0
+RING_SEARCH_RANGE = 1.0
+CYLINDER_SEARCH_FOV = 1.2
+CYLINDER_SEARCH_RANGE = 2.0
+SEARCH_DWELL = 0.5
+SEARCH_BUDGET = 60.0
+
+
 class Parking(Node):
 
     def __init__(self):
@@ -234,8 +281,25 @@ class Parking(Node):
         self.marker_pub = self.create_publisher(Marker, "/delta_nav_marker", QoSReliabilityPolicy.BEST_EFFORT)
         
         # for transforming between coordinate frames
-        self.tf_buffer = Buffer()
-        self.tf_listener = TransformListener(self.tf_buffer, self)
+        self.tf_cache = TransformCache(self)
+        
+        # robot pose in the map frame, read from tf once per tick (0.05 s, as fast as the servo control)
+        self.robot_pose = RobotPoseCache(self, self.tf_cache, 1.0 / SERVO_RATE)
+        # poses whose transform stopped updating longer ago than this (seconds) are not used
+        self.pose_max_age = 0.5
+        
+        # final approach onto the ring: streaming cmd_vel (True) or alternating Spin and DriveOnHeading goals (False)
+        self.declare_parameter('servo_parking', True)
+        self.servo_controller = ServoParkingController()
+        self.cmd_vel_pub = self.create_publisher(Twist, 'cmd_vel', 10)
+        
+        # static map for planning the searches, without it the planner assumes free space
+        self.declare_parameter('map_yaml', '')
+        self.occupancy_map = self.load_occupancy_map(self.get_parameter('map_yaml').get_parameter_value().string_value)
+        
+        # set by the marker callbacks, stops a running search
+        self.ring_spotted_event = Event()
+        self.cylinder_spotted_event = Event()
         
         # publisher to move the arm
         self.arm_publisher = self.create_publisher(String_msg, '/arm_command', 1)
@@ -263,9 +327,12 @@ class Parking(Node):
         
         cylinder_map_position = [msg.pose.position.x, msg.pose.position.y]#
         
-        robot_map_position = self.get_robot_world_position()
+        # do not block the callback, without a recent pose the marker is ignored
+        robot_pose = self.robot_pose.get(self.pose_max_age)
+        if robot_pose is None:
+            return
         
-        distance_squared = self.squared_distance_between(robot_map_position[0], robot_map_position[1], cylinder_map_position[0], cylinder_map_position[1])
+        distance_squared = robot_pose.distance_squared_to(cylinder_map_position[0], cylinder_map_position[1])
         max_distance = 2.0
         max_distance_squared = max_distance * max_distance
         self.get_logger().info('cylinder at squared distance: %f' % (distance_squared))
@@ -275,6 +342,7 @@ class Parking(Node):
         self.cylinder_position_x = cylinder_map_position[0]
         self.cylinder_position_y = cylinder_map_position[1]
         self.cylinder_spotted = True
+        self.cylinder_spotted_event.set()
         self.get_logger().info('valid cylinder detected at (x: %f  y: %f)' % (self.cylinder_position_x, self.cylinder_position_y))
         
     def set_marker_colors(self, r, g, b):
@@ -288,32 +356,10 @@ class Parking(Node):
         
         return self.get_angle_to_world_position(self.spotted_ring_x, self.spotted_ring_y)
         
+    # angle the robot has to rotate by to face (x, y), with the opposite sign (rotate(-angle))
     def get_angle_to_world_position(self, x, y):
-        robot_map_position = self.get_robot_world_position()
-        robot_forward = self.transform_from_robot_to_map_frame_safe(1.0, 0.0)
-        vector_robot_forward_x = robot_forward[0] - robot_map_position[0]
-        vector_robot_forward_y = robot_forward[1] - robot_map_position[1]
-        vector_robot_ring_x = x - robot_map_position[0]
-        vector_robot_ring_y = y - robot_map_position[1]
-        
-        angle = self.angle_between(vector_robot_forward_x, vector_robot_forward_y, vector_robot_ring_x, vector_robot_ring_y)
-        
-        # finding out if angle is positive or negative
-        p1 = self.transform_from_robot_to_map_frame_safe(0.0, 1.0)
-        p2 = self.transform_from_robot_to_map_frame_safe(0.0, -1.0)
-        
-        p1_ring_x = x - p1[0]
-        p1_ring_y = y - p1[1]
-        p2_ring_x = x - p2[0]
-        p2_ring_y = y - p2[1]
-        
-        dist1_squared = p1_ring_x * p1_ring_x + p1_ring_y * p1_ring_y
-        dist2_squared = p2_ring_x * p2_ring_x + p2_ring_y * p2_ring_y
-        
-        if dist1_squared < dist2_squared:
-            angle = -1.0 * angle
-        
-        return angle
+        robot_pose = self.robot_pose.wait(self.pose_max_age)
+        return -robot_pose.bearing_to(x, y)
 
     def publish_status(self):
         msg = JobStatus()
@@ -339,10 +385,23 @@ class Parking(Node):
             self.currently_executing_job = True
             self.publish_status()
 
-        thread = Thread(target=self.park_at_position, args=(msg.position_x, msg.position_y, msg.position_z, msg.only_wave))
+        thread = Thread(target=self.run_parking_job, args=(msg.position_x, msg.position_y, msg.position_z, msg.only_wave))
         thread.start()
         
+    # parking thread, a job is given up if there is no robot pose for too long
+    def run_parking_job(self, *args):
+        run_start = time.monotonic()
+        try:
+            self.park_at_position(*args)
+        except TimeoutError as e:
+            self.get_logger().error(f'parking job aborted: {e}')
+            self.publish_velocity(0.0, 0.0)
+            self.rc.cancelTask()
+            self.finish_parking_job(run_start)
+        
     def park_at_position(self, position_x, position_y, position_z, only_wave):
+        run_start = time.monotonic()
+        self.rc.primitive_durations = []
         
         # just take a short break from everything
         time.sleep(1)
@@ -386,8 +445,10 @@ class Parking(Node):
                 
                 if self.spotted_ring or self.robot_is_close_to_point(position_x, position_y, 0.4):
                     self.cancel_task()
+                    break
                     
-                time.sleep(0.2)
+                # returns as soon as the robot arrives
+                self.rc.arrived_event.wait(0.2)
                 
                 
         # parking user infos
@@ -397,29 +458,36 @@ class Parking(Node):
         # set marker color for looking for ring
         self.set_marker_colors(1.0, 0.0, 0.0)
         
-        while not self.spotted_ring:
+        if not self.spotted_ring:
             self.get_logger().info('can not find parking ring. searching...')
-            self.send_marker(position_x - 0.1, position_y, 1, 0.15, "searching_parking_ring")
             self.publish_arm_command()
-            self.rotate(6.3)
-            self.move_forward(0.1)
-            time.sleep(1.0)
+            if not self.search(self.ring_spotted_event, RING_SEARCH_FOV, RING_SEARCH_RANGE, "searching_parking_ring"):
+                self.get_logger().warn('parking ring not found, giving up')
+                self.finish_parking_job(run_start)
+                return
         
         # set marker color for parking at center of detected ring
         self.set_marker_colors(0.635, 0.823, 0.874)
         
-        self.rotate(-self.get_angle_to_detected_ring())
-        for i in range(5):
-            self.get_logger().info('parking...')
-            self.send_marker(self.spotted_ring_x, self.spotted_ring_y)
+        parked = False
+        if self.get_parameter('servo_parking').get_parameter_value().bool_value:
             self.send_marker(self.spotted_ring_x - 0.1, self.spotted_ring_y, 1, 0.15, "parking_ring_center")
-                
-            if self.robot_is_close_to_point(self.spotted_ring_x, self.spotted_ring_y, 0.05):
-                self.get_logger().info('close enough to center -> stopping parking')
-                break
-            
+            parked = self.servo_park()
+        
+        # the old way, if the servo parking is disabled or did not get there in time
+        if not parked:
             self.rotate(-self.get_angle_to_detected_ring())
-            self.approach_final_parking_spot(0.3)
+            for i in range(5):
+                self.get_logger().info('parking...')
+                self.send_marker(self.spotted_ring_x, self.spotted_ring_y)
+                self.send_marker(self.spotted_ring_x - 0.1, self.spotted_ring_y, 1, 0.15, "parking_ring_center")
+                
+                if self.robot_is_close_to_point(self.spotted_ring_x, self.spotted_ring_y, 0.05):
+                    self.get_logger().info('close enough to center -> stopping parking')
+                    break
+                
+                self.rotate(-self.get_angle_to_detected_ring())
+                self.approach_final_parking_spot(0.3)
         
         self.get_logger().info('parking finished')
         self.set_marker_colors(0.0, 0.5, 0.1)
@@ -434,13 +502,14 @@ class Parking(Node):
         
         
         # now going to cylinder
+        self.cylinder_spotted_event.clear()
         self.cylinder_spotted = False
         self.publish_arm_command_qrscan()
-        while not self.cylinder_spotted:
-            self.get_logger().info('searching for cylinder...')
-            self.send_marker(position_x - 0.1, position_y, 1, 0.15, "searching_cylinder")
-            self.publish_arm_command_qrscan()
-            self.rotate(1.0)
+        self.get_logger().info('searching for cylinder...')
+        if not self.search(self.cylinder_spotted_event, CYLINDER_SEARCH_FOV, CYLINDER_SEARCH_RANGE, "searching_cylinder"):
+            self.get_logger().warn('cylinder not found, giving up')
+            self.finish_parking_job(run_start)
+            return
         
         self.get_logger().info('rotating to cylinder')
         self.rotate(-self.get_angle_to_world_position(self.cylinder_position_x, self.cylinder_position_y))
@@ -457,12 +526,52 @@ class Parking(Node):
             self.rotate(-self.get_angle_to_world_position(self.cylinder_position_x, self.cylinder_position_y))
         
         
+        self.finish_parking_job(run_start)
+        
+    def finish_parking_job(self, run_start):
         self.currently_parking = False
         self.spotted_ring = False
+        self.ring_spotted_event.clear()
+        
+        count, waited, saved = self.rc.timing_summary()
+        self.get_logger().info('parking run took %.1f s, %d motion primitives took %.1f s, polling the flags would have added %.1f s' % (
+            time.monotonic() - run_start, count, waited, saved))
+        
         # IMPORTANT: after greeting has finished, set currently_executing_job to False
         self.currently_executing_job = False
         self.publish_status()
         
+    # drives onto the detected ring by streaming cmd_vel at SERVO_RATE, following the ring marker.
+    # Returns False if the robot did not get close enough to the center within SERVO_TIMEOUT
+    def servo_park(self):
+        period = 1.0 / SERVO_RATE
+        start = time.monotonic()
+        next_tick = start
+        while time.monotonic() - start < SERVO_TIMEOUT:
+            robot_pose = self.robot_pose.get(SERVO_POSE_MAX_AGE)
+            if robot_pose is None:
+                # stand still until there is a recent pose again
+                linear, angular, done = 0.0, 0.0, False
+            else:
+                linear, angular, done = self.servo_controller.command(
+                    robot_pose.x, robot_pose.y, robot_pose.yaw, self.spotted_ring_x, self.spotted_ring_y)
+            self.publish_velocity(linear, angular)
+            if done:
+                self.get_logger().info('servo parking reached the center after %.1f s' % (time.monotonic() - start))
+                return True
+            next_tick += period
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+        
+        self.publish_velocity(0.0, 0.0)
+        self.get_logger().warn('servo parking did not reach the center within %.1f s' % SERVO_TIMEOUT)
+        return False
+        
+    def publish_velocity(self, linear, angular):
+        msg = Twist()
+        msg.linear.x = float(linear)
+        msg.angular.z = float(angular)
+        self.cmd_vel_pub.publish(msg)
+        
     def approach_final_parking_spot(self, factor):
         # calculating remaining distance
         robot_map_position = self.get_robot_world_position()
@@ -489,45 +598,28 @@ class Parking(Node):
         
         if not self.currently_parking:
             return
-        if not self.robot_is_close_to_point(self.parking_goal_x, self.parking_goal_y, 1.0):
+        robot_pose = self.robot_pose.get(self.pose_max_age)
+        if robot_pose is None:
+            return
+        if not self.robot_is_close_to_point(self.parking_goal_x, self.parking_goal_y, 1.0, robot_pose):
             return
         
-        self.spotted_ring = True
         self.spotted_ring_x = x
         self.spotted_ring_y = y
+        self.spotted_ring = True
+        self.ring_spotted_event.set()
         
         
-    def robot_is_close_to_point(self, target_x, target_y, close_enough_distance):
-        x1 = target_x
-        y1 = target_y
-        
-        # getting the robot map position in a way to complicated way
-        robot_map_position = self.get_robot_world_position()
-        
-        x2 = robot_map_position [0]
-        y2 = robot_map_position [1]
-        
-        dx = x1 - x2
-        dy = y1 - y2
-        dist_squared = dx * dx + dy * dy
-        close_enough_distance_squared = close_enough_distance * close_enough_distance
-        
-        if (dist_squared < close_enough_distance_squared):
-            return True
-        return False
-        
-    def transform_from_robot_to_map_frame_safe(self, x, y):
-        robot_map_position = None
-        while robot_map_position is None:
-            robot_map_position = self.transform_from_robot_to_map_frame(x, y, 0.0)
-            if robot_map_position is None:
-                self.get_logger().info('failed to get robot map position. trying again')
-                time.sleep(1)
-        return robot_map_position
+    # waits for a recent robot pose if none is given, so only call it without one from the parking thread
+    def robot_is_close_to_point(self, target_x, target_y, close_enough_distance, robot_pose=None):
+        if robot_pose is None:
+            robot_pose = self.robot_pose.wait(self.pose_max_age)
+        return robot_pose.distance_squared_to(target_x, target_y) < close_enough_distance * close_enough_distance
         
+    # [x, y] of the robot in the map frame, waits for a recent pose
     def get_robot_world_position(self):
-        robot_map_position = self.transform_from_robot_to_map_frame_safe(0.0, 0.0)
-        return robot_map_position
+        robot_pose = self.robot_pose.wait(self.pose_max_age)
+        return [robot_pose.x, robot_pose.y]
         
         
     def unit_vector(self, vector):
@@ -545,23 +637,85 @@ class Parking(Node):
         v_y = y1 - y2
         return v_x * v_x + v_y * v_y
         
-    def move_forward(self, distanceInMeters):
+    # waits until 'event' is set, logging 'message' every second. Gives up after 'timeout' seconds
+    # or as soon as the 'interrupt' event is set, returns False then
+    def wait_for(self, event, message, timeout, interrupt=None):
+        start = time.monotonic()
+        last_log = start
+        step = 1.0 if interrupt is None else 0.05
+        while not event.wait(min(step, max(timeout - (time.monotonic() - start), 0.0))):
+            now = time.monotonic()
+            if interrupt is not None and interrupt.is_set():
+                return False
+            if now - start >= timeout:
+                self.get_logger().warn('%s: no result after %.1f s, giving up' % (message, timeout))
+                return False
+            if now - last_log >= 1.0:
+                self.get_logger().info(message)
+                last_log = now
+        return True
+        
+    def load_occupancy_map(self, map_yaml):
+        if not map_yaml:
+            try:
+                map_yaml = os.path.join(get_package_share_directory('dis_tutorial3'), 'maps', 'map.yaml')
+            except Exception:
+                map_yaml = ''
+        try:
+            occupancy_map = OccupancyMap.from_yaml(map_yaml)
+        except (OSError, ValueError, KeyError) as e:
+            self.get_logger().warn('could not load the map %s (%s), searching without it' % (map_yaml, e))
+            return None
+        self.get_logger().info('loaded the map %s for planning searches' % map_yaml)
+        return occupancy_map
+        
+    # looks around for an object with the views of plan_search until 'found' is set by its marker
+    # callback, stops turning or driving as soon as it is. Gives up after SEARCH_BUDGET seconds or when
+    # the plan is done, returns if the object was found.
+    def search(self, found, fov, view_range, marker_text):
+        robot_pose = self.robot_pose.wait(self.pose_max_age)
+        views = plan_search(self.occupancy_map, robot_pose.x, robot_pose.y, robot_pose.yaw, fov, view_range)
+        self.get_logger().info('search plan with %d views' % len(views))
+        start = time.monotonic()
+        for view in views:
+            if found.is_set():
+                break
+            if time.monotonic() - start > SEARCH_BUDGET:
+                self.get_logger().warn('search budget of %.0f s used up' % SEARCH_BUDGET)
+                break
+            self.send_marker(view.x, view.y, 1, 0.15, marker_text)
+            
+            # nudge to the view position
+            robot_pose = self.robot_pose.wait(self.pose_max_age)
+            distance = math.sqrt(robot_pose.distance_squared_to(view.x, view.y))
+            if distance > 0.05:
+                self.rotate(robot_pose.bearing_to(view.x, view.y), found)
+                if found.is_set():
+                    break
+                self.move_forward(distance, found)
+                if found.is_set():
+                    break
+            
+            robot_pose = self.robot_pose.wait(self.pose_max_age)
+            self.rotate(wrap_angle(view.heading - robot_pose.yaw), found)
+            # give the detector a few frames
+            found.wait(SEARCH_DWELL)
+        self.get_logger().info('search took %.1f s' % (time.monotonic() - start))
+        return found.is_set()
+        
+    def move_forward(self, distanceInMeters, interrupt=None):
         self.rc.drive_forward(distanceInMeters)
-        while not self.rc._move_forward_complete:
-                time.sleep(1)
-                self.get_logger().info('moving forward')
+        if not self.wait_for(self.rc.move_forward_event, 'moving forward', MOVE_FORWARD_TIMEOUT, interrupt):
+            self.cancel_task()
                 
-    def rotate(self, angleInRad):
+    def rotate(self, angleInRad, interrupt=None):
         self.rc.rotate(angleInRad)
-        while not self.rc._rotation_complete:
-                time.sleep(1)
-                self.get_logger().info('rotating')
+        if not self.wait_for(self.rc.rotation_event, 'rotating', ROTATE_TIMEOUT, interrupt):
+            self.cancel_task()
                 
     def cancel_task(self):
         self.rc.cancelTask()
-        while not self.rc._task_canceled:
-                time.sleep(1)
-                self.get_logger().info('waiting for task to be canceled')
+        self.wait_for(self.rc.canceled_event, 'waiting for task to be canceled', CANCEL_TIMEOUT)
 
     def send_marker(self, x, y, marker_id = 0, scale = 0.1, text = ""):
         point_in_map_frame = PointStamped()
@@ -610,30 +764,6 @@ class Parking(Node):
 
         return marker
         
-    def transform_from_robot_to_map_frame(self, robot_frame_x, robot_frame_y, robot_frame_z):
-        
-        point_in_robot_frame = PointStamped()
-        point_in_robot_frame.header.frame_id = "/base_link"
-        point_in_robot_frame.header.stamp = self.get_clock().now().to_msg()
-        point_in_robot_frame.point.x = robot_frame_x
-        point_in_robot_frame.point.y = robot_frame_y
-        point_in_robot_frame.point.z = robot_frame_z
-        
-        time_now = rclpy.time.Time()
-        timeout = rclpy.duration.Duration(seconds=0.1)
-
-        try:
-            trans = self.tf_buffer.lookup_transform("map", "base_link", time_now, timeout)
-            point_in_map_frame = tfg.do_transform_point(point_in_robot_frame, trans)
-            map_frame_x = point_in_map_frame.point.x
-            map_frame_y = point_in_map_frame.point.y
-            map_frame_z = point_in_map_frame.point.z
-            return [map_frame_x, map_frame_y, map_frame_z]
-        except TransformException as te:
-            self.get_logger().info(f"Cound not get the transform: {te}")
-            return None
-        
-        
     def destroyNode(self):
         self.rc._nav_to_pose_client.destroy()
         super().destroy_node()
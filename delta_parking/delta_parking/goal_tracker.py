@@ -0,0 +1,70 @@
+import time
+from threading import Lock
+
+
+# Bookkeeping of the motion primitives (Nav2 goals and cancels) of the RobotController.
+# Every primitive gets the next sequence number, which its goal response and result callbacks
+# capture. Only the newest primitive can finish, so the late result of a canceled or replaced goal
+# can not set the event of the next one or record a duration. Canceling ends the canceled primitive
+# right away: its event is set like a result would, so whoever waits on it goes on.
+class GoalTracker:
+    def __init__(self):
+        self.lock = Lock()
+        self.seq = 0
+        self.name = None
+        self.event = None
+        self.start_time = None
+        # handle of the accepted goal of the current primitive
+        self.goal_handle = None
+
+        # (primitive, seconds from sending the goal to its result) of the finished primitives
+        self.durations = []
+        self.ignored = 0
+
+    # starts a new primitive, clears its event and returns its sequence number
+    def start(self, name, event):
+        with self.lock:
+            return self._start(name, event)
+
+    def is_current(self, seq):
+        return seq == self.seq
+
+    # goal of primitive 'seq' was accepted, returns False if a newer primitive started meanwhile
+    def accepted(self, seq, goal_handle):
+        with self.lock:
+            if seq != self.seq:
+                return False
+            self.goal_handle = goal_handle
+            return True
+
+    # result of primitive 'seq', sets its event unless a newer primitive started meanwhile,
+    # returns False if the result was ignored
+    def finish(self, seq):
+        with self.lock:
+            if seq != self.seq:
+                self.ignored += 1
+                return False
+            if self.start_time is not None:
+                self.durations.append((self.name, time.monotonic() - self.start_time))
+                self.start_time = None
+            self.goal_handle = None
+            self.event.set()
+            return True
+
+    # ends the current primitive (without a duration, it did not finish) and starts the cancel
+    # primitive, returns its sequence number and the goal handle to cancel (None if there is none yet)
+    def cancel(self, event):
+        with self.lock:
+            goal_handle = self.goal_handle
+            if self.event is not None:
+                self.event.set()
+            return self._start('cancel', event), goal_handle
+
+    def _start(self, name, event):
+        self.seq += 1
+        self.name = name
+        self.event = event
+        self.start_time = time.monotonic()
+        self.goal_handle = None
+        event.clear()
+        return self.seq
@@ -0,0 +1,122 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+
+# a place to look from: drive to (x, y) and turn to the map frame 'heading'
+SearchView = namedtuple('SearchView', ['x', 'y', 'heading'])
+
+
+# free cells around (x, y) that could hold what we are looking for. Without a map the disk is
+# sampled on a 5 cm grid and everything counts as free.
+def search_targets(occupancy, x, y, radius):
+    if occupancy is not None:
+        return occupancy.free_cells_within(x, y, radius)
+    offsets = np.arange(-radius, radius + 0.025, 0.05)
+    dx, dy = np.meshgrid(offsets, offsets)
+    inside = dx * dx + dy * dy <= radius * radius
+    return np.stack([x + dx[inside], y + dy[inside]], axis=1)
+
+
+# masks of the targets seen from (x, y) with every heading: in range, inside the horizontal field
+# of view and not hidden behind a wall. Returns a (len(headings), len(targets)) bool array.
+def visible_targets(occupancy, x, y, headings, targets, fov, view_range):
+    d = targets - (x, y)
+    distance = np.hypot(d[:, 0], d[:, 1])
+    bearing = np.arctan2(d[:, 1], d[:, 0])
+    seen = distance <= view_range
+    if occupancy is not None:
+        seen &= occupancy.line_of_sight(x, y, targets)
+    off_axis = np.abs(wrap_angles(bearing[None, :] - np.asarray(headings)[:, None]))
+    return seen[None, :] & (off_axis <= fov / 2)
+
+
+def wrap_angles(angles):
+    return (np.asarray(angles) + np.pi) % (2 * np.pi) - np.pi
+
+
+# orders the headings of one position with the least turning, starting at yaw: a full sweep in
+# one direction or turning one way first and then back past the start to the other side
+def sweep_order(headings, yaw):
+    if len(headings) < 2:
+        return list(headings)
+    offsets = [math.remainder(h - yaw, 2 * math.pi) for h in headings]
+    left = sorted((o, h) for o, h in zip(offsets, headings) if o >= 0)
+    right = sorted(((o, h) for o, h in zip(offsets, headings) if o < 0), reverse=True)
+    a = left[-1][0] if left else 0.0
+    b = -right[-1][0] if right else 0.0
+    ccw = [((h - yaw) % (2 * math.pi), h) for h in headings]
+    cw = [((yaw - h) % (2 * math.pi), h) for h in headings]
+    options = [
+        (max(ccw)[0], [h for _, h in sorted(ccw)]),
+        (max(cw)[0], [h for _, h in sorted(cw)]),
+        (2 * a + b, [h for _, h in left] + [h for _, h in right]),
+        (2 * b + a, [h for _, h in right] + [h for _, h in left]),
+    ]
+    return min(options, key=lambda option: option[0])[1]
+
+
+# Plans where to look for an object (parking ring, cylinder) that should be within 'radius' of the
+# robot. Greedily picks the views (position and heading) that see the most not yet seen free cells
+# of the map, from the current position and from positions 'nudge' meters away in 8 directions
+# (only where the robot fits, 'robot_radius'), until 'coverage' of all cells that can be seen at all
+# are covered or 'max_views' views are planned. Views that need a nudge only win if they see more.
+# Returns the SearchViews, the views of the current position first, each position swept with the
+# least turning.
+def plan_search(occupancy, x, y, yaw, fov, view_range, radius=None, nudge=0.3, heading_step=math.radians(30),
+                coverage=0.95, max_views=10, robot_radius=0.2):
+    radius = view_range if radius is None else radius
+    targets = search_targets(occupancy, x, y, radius)
+    if len(targets) == 0:
+        return []
+
+    headings = wrap_angles(yaw + np.arange(0.0, 2 * math.pi - 1e-9, heading_step))
+    positions = [(x, y)]
+    for k in range(8):
+        a = yaw + k * math.pi / 4
+        px, py = x + nudge * math.cos(a), y + nudge * math.sin(a)
+        if occupancy is None or occupancy.is_free_disk(px, py, robot_radius):
+            positions.append((px, py))
+
+    # candidate views, the nudges are ranked a little lower so the current position wins ties
+    candidates = []
+    for p, (px, py) in enumerate(positions):
+        masks = visible_targets(occupancy, px, py, headings, targets, fov, view_range)
+        for h, mask in zip(headings, masks):
+            candidates.append((p, float(h), mask))
+
+    seeable = np.zeros(len(targets), dtype=bool)
+    for _, _, mask in candidates:
+        seeable |= mask
+    needed = coverage * seeable.sum()
+
+    covered = np.zeros(len(targets), dtype=bool)
+    chosen = []
+    while covered.sum() < needed and len(chosen) < max_views:
+        gains = [int((mask & ~covered).sum()) - (0.5 if p > 0 else 0.0) for p, _, mask in candidates]
+        best = int(np.argmax(gains))
+        if gains[best] <= 0:
+            break
+        p, h, mask = candidates.pop(best)
+        covered |= mask
+        chosen.append((p, h))
+
+    # current position first, then the nudges in the order they were chosen
+    order = []
+    for p, _ in sorted(chosen, key=lambda c: c[0] != 0):
+        if p not in order:
+            order.append(p)
+    views = []
+    current_x, current_y, current_yaw = x, y, yaw
+    for p in order:
+        px, py = positions[p]
+        if p != 0:
+            # the robot arrives facing the direction it drove
+            current_yaw = math.atan2(py - current_y, px - current_x)
+            current_x, current_y = px, py
+        for h in sweep_order([h for q, h in chosen if q == p], current_yaw):
+            views.append(SearchView(px, py, h))
+            current_yaw = h
+    return views
+
@@ -0,0 +1,74 @@
+import math
+
+from delta_perception.angles import wrap_angle
+
+
+def clip(value, limit):
+    return max(-limit, min(limit, value))
+
+
+# Proportional controller that drives a differential drive robot onto a point (the center of the
+# parking ring). Gives (linear, angular) velocities for cmd_vel from the robot pose (x, y, yaw)
+# and the goal. The robot drives backwards if the goal is behind it, so overshooting the center
+# does not need a half turn. The linear speed is scaled by the cosine of the heading error, the
+# robot turns towards the goal first and only drives fast when it faces it.
+class ServoParkingController:
+    def __init__(self, k_linear=0.8, k_angular=2.0, max_linear=0.2, max_angular=1.5, tolerance=0.05):
+        self.k_linear = k_linear
+        self.k_angular = k_angular
+        self.max_linear = max_linear
+        self.max_angular = max_angular
+        self.tolerance = tolerance
+
+    # (linear, angular, done), done is True once the robot is within 'tolerance' of the goal
+    def command(self, x, y, yaw, goal_x, goal_y):
+        dx = goal_x - x
+        dy = goal_y - y
+        distance = math.hypot(dx, dy)
+        if distance < self.tolerance:
+            return 0.0, 0.0, True
+
+        heading_error = wrap_angle(math.atan2(dy, dx) - yaw)
+        direction = 1.0
+        if abs(heading_error) > math.pi / 2:
+            # goal behind the robot, drive backwards
+            direction = -1.0
+            heading_error = wrap_angle(heading_error - math.pi)
+
+        linear = direction * min(self.k_linear * distance, self.max_linear) * max(math.cos(heading_error), 0.0)
+        angular = clip(self.k_angular * heading_error, self.max_angular)
+        return linear, angular, False
+
+
+# kinematic stand-in for the robot (unicycle model), for testing the controller without Gazebo
+class UnicycleSim:
+    def __init__(self, x=0.0, y=0.0, yaw=0.0):
+        self.x = x
+        self.y = y
+        self.yaw = yaw
+
+    def step(self, linear, angular, dt):
+        if abs(angular) < 1e-9:
+            self.x += linear * math.cos(self.yaw) * dt
+            self.y += linear * math.sin(self.yaw) * dt
+        else:
+            # exact integration of the arc
+            radius = linear / angular
+            new_yaw = self.yaw + angular * dt
+            self.x += radius * (math.sin(new_yaw) - math.sin(self.yaw))
+            self.y -= radius * (math.cos(new_yaw) - math.cos(self.yaw))
+            self.yaw = new_yaw
+        self.yaw = wrap_angle(self.yaw)
+
+
+# runs the controller against the simulated robot at 'rate' Hz, returns (converged, seconds)
+def simulate(controller, sim, goal_x, goal_y, rate=20.0, timeout=15.0):
+    dt = 1.0 / rate
+    t = 0.0
+    while t < timeout:
+        linear, angular, done = controller.command(sim.x, sim.y, sim.yaw, goal_x, goal_y)
+        if done:
+            return True, t
+        sim.step(linear, angular, dt)
+        t += dt
+    return False, t
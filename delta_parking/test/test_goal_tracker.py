@@ -0,0 +1,70 @@
+from threading import Event
+
+from delta_parking.goal_tracker import GoalTracker
+
+
+def test_result_sets_the_event():
+    goals = GoalTracker()
+    arrived = Event()
+    seq = goals.start('navigate', arrived)
+    assert goals.accepted(seq, 'handle')
+    assert goals.goal_handle == 'handle'
+
+    assert goals.finish(seq)
+    assert arrived.is_set()
+    assert [name for name, _ in goals.durations] == ['navigate']
+    assert goals.goal_handle is None
+
+
+def test_cancel_ends_the_navigation():
+    # the parking loop cancels the navigation when the ring is spotted and waits for arrived_event
+    goals = GoalTracker()
+    arrived, canceled = Event(), Event()
+    nav = goals.start('navigate', arrived)
+    goals.accepted(nav, 'nav handle')
+
+    cancel, goal_handle = goals.cancel(canceled)
+    assert goal_handle == 'nav handle'
+    assert arrived.is_set()
+    assert not canceled.is_set()
+
+    # the result of the canceled goal comes after the cancel response
+    assert goals.finish(cancel)
+    assert not goals.finish(nav)
+    assert arrived.is_set() and canceled.is_set()
+    # only the cancel took a measured time, the canceled navigation did not finish
+    assert [name for name, _ in goals.durations] == ['cancel']
+
+
+def test_late_result_does_not_finish_the_next_primitive():
+    goals = GoalTracker()
+    arrived, canceled, rotated = Event(), Event(), Event()
+    nav = goals.start('navigate', arrived)
+    goals.accepted(nav, 'nav handle')
+    cancel, _ = goals.cancel(canceled)
+    goals.finish(cancel)
+
+    rotate = goals.start('rotate', rotated)
+    assert not goals.finish(nav)
+    assert not rotated.is_set()
+    assert goals.ignored == 1
+
+    assert goals.finish(rotate)
+    assert rotated.is_set()
+    assert [name for name, _ in goals.durations] == ['cancel', 'rotate']
+
+
+def test_goal_accepted_after_it_was_replaced():
+    goals = GoalTracker()
+    old = goals.start('rotate', Event())
+    new = goals.start('drive_forward', Event())
+    assert not goals.accepted(old, 'old handle')
+    assert goals.accepted(new, 'new handle')
+    assert goals.goal_handle == 'new handle'
+
+
+def test_cancel_without_a_goal_handle():
+    goals = GoalTracker()
+    goals.start('navigate', Event())
+    _, goal_handle = goals.cancel(Event())
+    assert goal_handle is None
@@ -0,0 +1,64 @@
+import math
+
+from delta_parking.search_planner import plan_search, sweep_order, visible_targets
+from delta_perception.occupancy_map import OccupancyMap
+import numpy as np
+
+
+def corridor_map():
+    # 4 x 4 m room with 5 cm cells and a wall at x = 1 m from y = -2 to y = 1
+    grid = np.zeros((80, 80), dtype=np.int8)
+    grid[[0, -1], :] = OccupancyMap.OCCUPIED
+    grid[:, [0, -1]] = OccupancyMap.OCCUPIED
+    grid[:60, 60] = OccupancyMap.OCCUPIED
+    return OccupancyMap(grid, 0.05, -2.0, -2.0)
+
+
+def coverage(occupancy, views, targets, fov, view_range):
+    seen = np.zeros(len(targets), dtype=bool)
+    for view in views:
+        seen |= visible_targets(occupancy, view.x, view.y, [view.heading], targets, fov, view_range)[0]
+    return seen.mean()
+
+
+def test_free_space_needs_a_full_turn():
+    fov = 1.0
+    views = plan_search(None, 0.0, 0.0, 0.0, fov, 1.0)
+    # every view from the current position, a full turn in steps of the field of view
+    assert all(view.x == 0.0 and view.y == 0.0 for view in views)
+    assert len(views) <= math.ceil(2 * math.pi / fov) + 1
+
+
+def test_covers_the_visible_neighbourhood():
+    occupancy = corridor_map()
+    fov, view_range = 1.0, 1.0
+    views = plan_search(occupancy, 0.5, 0.0, 0.0, fov, view_range, coverage=0.95)
+    assert 0 < len(views) <= 10
+
+    targets = occupancy.free_cells_within(0.5, 0.0, view_range)
+    seeable = np.zeros(len(targets), dtype=bool)
+    for x, y in [(0.5, 0.0)] + [(view.x, view.y) for view in views]:
+        headings = np.linspace(-math.pi, math.pi, 36, endpoint=False)
+        seeable |= visible_targets(occupancy, x, y, headings, targets, fov, view_range).any(axis=0)
+    assert coverage(occupancy, views, targets[seeable], fov, view_range) >= 0.9
+
+
+def test_wall_hides_cells():
+    occupancy = corridor_map()
+    targets = np.array([[0.8, 0.0], [1.2, 0.0]])
+    masks = visible_targets(occupancy, 0.5, 0.0, [0.0], targets, 1.0, 1.0)
+    assert masks.tolist() == [[True, False]]
+
+
+def test_nudges_stay_in_free_space():
+    occupancy = corridor_map()
+    views = plan_search(occupancy, 0.5, -1.6, 0.0, 1.0, 1.0)
+    for view in views:
+        assert occupancy.is_free_disk(view.x, view.y, 0.2)
+
+
+def test_sweep_order():
+    # small turn to the left first, then back to the right
+    assert sweep_order([-0.5, -1.0, 0.2], 0.0) == [0.2, -0.5, -1.0]
+    # all around, one direction
+    assert sweep_order([1.5, 3.0, -1.5, 0.0], 0.0) == [0.0, 1.5, 3.0, -1.5]
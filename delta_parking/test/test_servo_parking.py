@@ -0,0 +1,51 @@
+import math
+import random
+
+from delta_parking.servo_parking import ServoParkingController, UnicycleSim, simulate
+
+
+def test_converges_from_random_starts():
+    # the ring is spotted when the robot is at most about a meter away from it
+    rng = random.Random(0)
+    controller = ServoParkingController()
+    for _ in range(500):
+        distance = rng.uniform(0.05, 1.0)
+        angle = rng.uniform(-math.pi, math.pi)
+        sim = UnicycleSim(distance * math.cos(angle), distance * math.sin(angle), rng.uniform(-math.pi, math.pi))
+
+        converged, seconds = simulate(controller, sim, 0.0, 0.0, rate=20.0, timeout=15.0)
+
+        assert converged
+        assert seconds < 8.0
+        assert math.hypot(sim.x, sim.y) < controller.tolerance
+
+
+def test_converges_at_lower_rate():
+    controller = ServoParkingController()
+    sim = UnicycleSim(0.8, -0.5, 2.0)
+    converged, _ = simulate(controller, sim, 0.0, 0.0, rate=10.0, timeout=15.0)
+    assert converged
+
+
+def test_goal_behind_drives_backwards():
+    controller = ServoParkingController()
+    linear, angular, done = controller.command(0.3, 0.0, 0.0, 0.0, 0.0)
+    assert not done
+    assert linear < 0.0
+    assert abs(angular) < 1e-9
+
+
+def test_limits():
+    controller = ServoParkingController(max_linear=0.2, max_angular=1.5)
+    linear, angular, _ = controller.command(0.0, 0.0, 0.0, 5.0, 0.0)
+    assert linear == 0.2
+    _, angular, _ = controller.command(0.0, 0.0, 0.0, 0.0, 5.0)
+    assert angular == 1.5
+
+
+def test_timeout():
+    # gains of zero never move the robot
+    controller = ServoParkingController(k_linear=0.0, k_angular=0.0)
+    converged, seconds = simulate(controller, UnicycleSim(1.0, 0.0, 0.0), 0.0, 0.0, timeout=2.0)
+    assert not converged
+    assert seconds >= 2.0
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Latency and accuracy of the person detector backends at the input size the nodes use.
+# Accuracy is measured against the first backend that runs (torch): "agree" is the fraction of images where both
+# find a person (or both find none), "iou" the mean IoU of the best boxes when both find one.
+# Backends whose runtime is not installed are skipped.
+#
+# run with: python3 benchmarks/bench_person_detector.py [--threads N] [image ...]
+# without images the example images shipped with ultralytics are used
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from delta_perception.person_detector import load_person_detector, DEFAULT_IMGSZ
+
+CONFIGS = (
+    ('torch', False),
+    ('onnxruntime', False),
+    ('onnxruntime', True),
+    ('openvino', False),
+    ('openvino', True),
+)
+
+
+def default_images():
+    import ultralytics
+    assets = os.path.join(os.path.dirname(ultralytics.__file__), 'assets')
+    return sorted(glob.glob(os.path.join(assets, '*.jpg')))
+
+
+def box_iou(a, b):
+    w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def run(detector, images, repeats):
+    for image in images[:2]:
+        detector.detect(image)    # warm up
+    times, results = [], []
+    for image in images:
+        best = float('inf')
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            boxes, _ = detector.detect(image)
+            best = min(best, time.perf_counter() - t0)
+        times.append(best)
+        results.append(boxes)
+    return np.array(times), results
+
+
+def compare(reference, results):
+    agree, ious = 0, []
+    for ref, res in zip(reference, results):
+        if (len(ref) > 0) == (len(res) > 0):
+            agree += 1
+        if len(ref) > 0 and len(res) > 0:
+            ious.append(box_iou(ref[0], res[0]))
+    return agree / len(reference), (np.mean(ious) if ious else float('nan'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--width', type=int, default=320, help='images are resized to the camera resolution')
+    parser.add_argument('--height', type=int, default=240)
+    args = parser.parse_args()
+
+    paths = args.images or default_images()
+    images = [cv2.resize(cv2.imread(p), (args.width, args.height)) for p in paths]
+    print('%d images, %dx%d, imgsz %s, threads %d' % (len(images), args.width, args.height, DEFAULT_IMGSZ, args.threads))
+
+    print('%-12s %5s | %10s %10s | %6s %6s' % ('backend', 'int8', 'mean [ms]', 'p90 [ms]', 'agree', 'iou'))
+    reference = None
+    for backend, int8 in CONFIGS:
+        try:
+            detector = load_person_detector(backend, threads=args.threads, int8=int8)
+        except ImportError as e:
+            print('%-12s %5s | skipped (%s)' % (backend, int8, e))
+            continue
+        times, results = run(detector, images, args.repeats)
+        if reference is None:
+            reference = results
+        agree, iou = compare(reference, results)
+        print('%-12s %5s | %10.2f %10.2f | %6.2f %6.3f' % (
+            backend, int8, times.mean() * 1e3, np.percentile(times, 90) * 1e3, agree, iou))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# Microbenchmark of the nested rectangle (painting frame) pairing of dev_detect_people.
+# Compares the old all pairs python loop with the grid of delta_perception.rect_pairing and checks
+# that both return the same candidates:
+#   captured   the Mona Lisa crops saved by dev_detect_people (data/monalisa), letterboxed to the
+#              320x240 camera resolution and run through the same adaptive threshold + contours
+#   synthetic  frames with 10 - 2000 random rectangles, roughly a tenth of them nested
+#
+# run with: python3 benchmarks/bench_rect_pairing.py [--images DIR]   (from delta_perception)
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from delta_perception.rect_pairing import find_frame_candidates, find_rectangles
+
+DEFAULT_IMAGES = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'monalisa')
+
+
+# the loop that was in dev_detect_people.rgb_callback
+def nested_loop_pairs(rectangles, dist_thresh=50):
+    candidates = []
+    for n in range(len(rectangles)):
+        for m in range(n + 1, len(rectangles)):
+            r1 = rectangles[n]
+            r2 = rectangles[m]
+            dist = np.sqrt(((r1[0] - r2[0]) ** 2 + (r1[1] - r2[1]) ** 2))
+            if dist >= dist_thresh or dist == 0:
+                continue
+            if r1[2] >= r2[2] and r1[3] >= r2[3]:
+                larger = r1
+                smaller = r2
+            elif r2[2] >= r1[2] and r2[3] >= r1[3]:
+                larger = r2
+                smaller = r1
+            else:
+                continue
+            if smaller[2] / larger[2] < 0.8 or smaller[3] / larger[3] < 0.8:
+                continue
+            candidates.append(larger)
+    return candidates
+
+
+# the contour part of dev_detect_people on a camera sized frame
+def frame_rectangles(image, width=320, height=240):
+    scale = min(width / image.shape[1], height / image.shape[0])
+    resized = cv2.resize(image, None, fx=scale, fy=scale)
+    frame = np.full((height, width, 3), 128, dtype=np.uint8)
+    y0, x0 = (height - resized.shape[0]) // 2, (width - resized.shape[1]) // 2
+    frame[y0:y0 + resized.shape[0], x0:x0 + resized.shape[1]] = resized
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 15, 30)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    return contours
+
+
+def synthetic_rectangles(rng, n):
+    rects = []
+    while len(rects) < n:
+        x, y = int(rng.integers(0, 320)), int(rng.integers(0, 240))
+        w, h = int(rng.integers(5, 120)), int(rng.integers(5, 120))
+        rects.append((x, y, w, h))
+        if rng.random() < 0.1 and len(rects) < n:
+            s = rng.uniform(0.8, 1.0)
+            rects.append((x + int(rng.integers(1, 8)), y + int(rng.integers(1, 8)), int(w * s), int(h * s)))
+    return rects
+
+
+def timed(fn, *args, repeats=5):
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', default=DEFAULT_IMAGES)
+    parser.add_argument('--limit', type=int, default=200, help='number of captured images')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.images, '*.png')))[:args.limit]
+    if paths:
+        t_poly = t_loop = t_grid = 0.0
+        n_rects = n_pairs = 0
+        for path in paths:
+            contours = frame_rectangles(cv2.imread(path))
+            dt, rects = timed(find_rectangles, contours)
+            t_poly += dt
+            dt, ref = timed(nested_loop_pairs, rects)
+            t_loop += dt
+            dt, res = timed(find_frame_candidates, rects)
+            t_grid += dt
+            assert ref == res, 'candidate lists differ for %s' % path
+            n_rects += len(rects)
+            n_pairs += len(res)
+        k = len(paths)
+        print('captured: %d frames, %.1f rectangles and %.1f candidates per frame' % (k, n_rects / k, n_pairs / k))
+        print('  per frame: approxPolyDP %.3f ms, loop %.3f ms, grid %.3f ms' % (
+            t_poly / k * 1e3, t_loop / k * 1e3, t_grid / k * 1e3))
+    else:
+        print('no captured images in %s' % args.images)
+
+    rng = np.random.default_rng(0)
+    print('%8s %12s %12s %9s %6s' % ('rects', 'loop [ms]', 'grid [ms]', 'speedup', 'pairs'))
+    for n in (10, 50, 100, 250, 500, 1000, 2000):
+        rects = synthetic_rectangles(rng, n)
+        repeats = 1 if n >= 1000 else 5
+        t_loop, ref = timed(nested_loop_pairs, rects, repeats=repeats)
+        t_new, res = timed(find_frame_candidates, rects, repeats=5)
+        assert ref == res, 'candidate lists differ for %d rectangles' % n
+        print('%8d %12.3f %12.3f %8.1fx %6d' % (n, t_loop * 1e3, t_new * 1e3, t_loop / t_new, len(res)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# Per frame allocation and latency of the ring candidate masks in detect_rings.py.
+# "full" are the three full resolution float64 masks per candidate the detector used before,
+# "roi" are the uint8 masks clipped to the bounding box of the ring (delta_perception.ring_masks).
+#
+# run with: python3 benchmarks/bench_ring_masks.py
+
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+
+from delta_perception.ring_masks import make_ring_mask
+
+
+def full_frame_masks(image, rings):
+    stored = []
+    vis_all_masks = np.zeros((image.shape[0], image.shape[1]))
+    for le, se in rings:
+        mask_large = np.zeros((image.shape[0], image.shape[1]))
+        cv2.ellipse(mask_large, le, 1, -1)
+        mask_small = np.zeros((image.shape[0], image.shape[1]))
+        cv2.ellipse(mask_small, se, 1, -1)
+        mask_ring = cv2.subtract(mask_large, mask_small)
+        vis_all_masks += mask_ring
+        np.mean(image[mask_ring.astype(bool)], axis=0)
+        stored.append((mask_ring, mask_large, mask_small))
+    return stored
+
+
+def roi_masks(image, rings):
+    stored = []
+    vis_all_masks = np.zeros((image.shape[0], image.shape[1]), dtype=np.uint8)
+    for le, se in rings:
+        ring_mask = make_ring_mask(le, se, image.shape)
+        ring_mask.paint(vis_all_masks)
+        ring_mask.mean_color(image)
+        stored.append(ring_mask)
+    return stored
+
+
+def stored_bytes(stored):
+    total = 0
+    for s in stored:
+        total += sum(m.nbytes for m in s) if isinstance(s, tuple) else s.nbytes
+    return total
+
+
+def random_rings(rng, n, width, height):
+    rings = []
+    for _ in range(n):
+        cx, cy = rng.uniform(0, width), rng.uniform(0, height)
+        minor = rng.uniform(10, 60)
+        major = minor * rng.uniform(1.0, 1.6)
+        angle = rng.uniform(0, 180)
+        s = rng.uniform(0.5, 0.85)
+        rings.append((((cx, cy), (minor, major), angle),
+                      ((cx, cy), (minor * s, major * s), angle)))
+    return rings
+
+
+def measure(fn, image, rings, repeats=20):
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(image, rings)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    stored = fn(image, rings)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, stored_bytes(stored)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print('%9s %5s | %10s %10s %10s | %10s %10s %10s' % (
+        'frame', 'rings', 'full [ms]', 'peak [kB]', 'kept [kB]', 'roi [ms]', 'peak [kB]', 'kept [kB]'))
+    for width, height in ((320, 240), (640, 480)):
+        image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        for n in (1, 5, 20):
+            rings = random_rings(rng, n, width, height)
+            t_full, p_full, k_full = measure(full_frame_masks, image, rings)
+            t_roi, p_roi, k_roi = measure(roi_masks, image, rings)
+            print('%9s %5d | %10.3f %10.1f %10.1f | %10.3f %10.1f %10.1f' % (
+                '%dx%d' % (width, height), n,
+                t_full * 1e3, p_full / 1024, k_full / 1024,
+                t_roi * 1e3, p_roi / 1024, k_roi / 1024))
+
+
+if __name__ == '__main__':
+    main()
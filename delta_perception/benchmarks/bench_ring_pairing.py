@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Microbenchmark of the concentric ellipse pairing used by the ring detectors.
+# Compares the old nested python loop with delta_perception.ring_pairing on synthetic
+# frames with 10 - 2000 fitted contours and checks that both return the same candidates.
+#
+# run with: python3 benchmarks/bench_ring_pairing.py
+
+import time
+
+import numpy as np
+
+from delta_perception.ring_pairing import find_ring_candidates
+
+
+# the loop that was in RingDetector.image_callback
+def nested_loop_pairs(elps):
+    candidates = []
+    for n in range(len(elps)):
+        for m in range(n + 1, len(elps)):
+            e1 = elps[n]
+            e2 = elps[m]
+            dist = np.sqrt(((e1[0][0] - e2[0][0]) ** 2 + (e1[0][1] - e2[0][1]) ** 2))
+            angle_diff = np.abs(e1[2] - e2[2])
+            if dist >= 5:
+                continue
+            if angle_diff > 4:
+                continue
+            if e1[1][1] >= e2[1][1] and e1[1][0] >= e2[1][0]:
+                pass
+            elif e2[1][1] >= e1[1][1] and e2[1][0] >= e1[1][0]:
+                pass
+            else:
+                continue
+            candidates.append((e1, e2))
+    return candidates
+
+
+# random ellipses on a 320x240 frame, roughly a tenth of them get a concentric partner
+def synthetic_frame(rng, n):
+    elps = []
+    while len(elps) < n:
+        cx, cy = rng.uniform(0, 320), rng.uniform(0, 240)
+        minor = rng.uniform(3, 60)
+        major = minor * rng.uniform(1.0, 2.0)
+        angle = rng.uniform(0, 180)
+        elps.append(((cx, cy), (minor, major), angle))
+        if rng.random() < 0.1 and len(elps) < n:
+            s = rng.uniform(0.5, 0.9)
+            elps.append(((cx + rng.normal(0, 1.5), cy + rng.normal(0, 1.5)),
+                         (minor * s, major * s), angle + rng.normal(0, 1.5)))
+    return elps
+
+
+def best_time(fn, arg, repeats):
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print('%8s %12s %12s %9s %6s' % ('contours', 'loop [ms]', 'engine [ms]', 'speedup', 'pairs'))
+    for n in (10, 50, 100, 250, 500, 1000, 2000):
+        elps = synthetic_frame(rng, n)
+        repeats = 3 if n >= 1000 else 10
+        t_loop, ref = best_time(nested_loop_pairs, elps, 1 if n >= 1000 else repeats)
+        t_new, res = best_time(find_ring_candidates, elps, repeats)
+        assert ref == res, 'candidate lists differ for %d contours' % n
+        print('%8d %12.3f %12.3f %8.1fx %6d' % (n, t_loop * 1e3, t_new * 1e3, t_loop / t_new, len(res)))
+
+
+if __name__ == '__main__':
+    main()
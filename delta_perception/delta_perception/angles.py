@@ -0,0 +1,6 @@
+import math
+
+
+# wraps an angle to [-pi, pi)
+def wrap_angle(angle):
+    return (angle + math.pi) % (2.0 * math.pi) - math.pi
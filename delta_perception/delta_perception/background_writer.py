@@ -0,0 +1,61 @@
+import queue
+import time
+import traceback
+from threading import Thread
+
+
+# Runs disk writes (any 'fn(*args)') in order on a worker thread, so a subscription callback that
+# saves images never waits for the disk. The queue holds at most 'max_pending' writes, when it is
+# full new writes are dropped and counted instead of blocking the callback.
+class BackgroundWriter:
+    def __init__(self, max_pending=256, name='background_writer'):
+        self.queue = queue.Queue(max_pending)
+
+        # statistics
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self.thread = Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    # returns False if the write was dropped
+    def submit(self, fn, *args):
+        try:
+            self.queue.put_nowait((fn, args))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    @property
+    def pending(self):
+        return self.queue.qsize()
+
+    # writes everything still queued, then stops the thread. Waits at most 'timeout' seconds in
+    # total, returns False if the writes did not finish in time (the daemon thread is left behind)
+    def stop(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put((None, ()), timeout=timeout)
+        except queue.Full:
+            return False
+        self.thread.join(max(deadline - time.monotonic(), 0.0))
+        return not self.thread.is_alive()
+
+    def _run(self):
+        while True:
+            fn, args = self.queue.get()
+            if fn is None:
+                return
+            try:
+                fn(*args)
+                self.written += 1
+            except Exception:
+                self.failed += 1
+                traceback.print_exc()
+
+    # statistics as a short string for logging
+    def stats(self):
+        return 'written: %d, pending: %d, dropped: %d, failed: %d' % (
+            self.written, self.pending, self.dropped, self.failed)
@@ -0,0 +1,65 @@
+import time
+
+import cv2
+from sensor_msgs.msg import CompressedImage
+from rclpy.qos import qos_profile_sensor_data
+
+
+# Debug output of a detector node.
+# With the parameter 'headless' set the OpenCV GUI is never touched. Annotated frames are then only
+# drawn when something subscribes to ~/debug_image/compressed, and published at most
+# 'debug_image_rate' times per second as jpeg.
+class DebugView:
+    def __init__(self, node, topic='~/debug_image/compressed'):
+        self.node = node
+        node.declare_parameter('headless', False)
+        node.declare_parameter('debug_image_rate', 2.0)
+        self.headless = node.get_parameter('headless').get_parameter_value().bool_value
+        rate = node.get_parameter('debug_image_rate').get_parameter_value().double_value
+        self.period = 1.0 / rate if rate > 0 else 0.0
+
+        self.publisher = node.create_publisher(CompressedImage, topic, qos_profile_sensor_data)
+        self.last_publish = 0.0
+        self.publish_now = False
+
+    # call once at the start of every frame, returns True if annotations should be drawn
+    def begin_frame(self):
+        self.publish_now = (self.publisher.get_subscription_count() > 0
+                            and time.monotonic() - self.last_publish >= self.period)
+        return self.active
+
+    # True if somebody looks at the annotated frames (GUI or subscriber)
+    @property
+    def active(self):
+        return not self.headless or self.publish_now
+
+    def named_window(self, name):
+        if not self.headless:
+            cv2.namedWindow(name, cv2.WINDOW_NORMAL)
+
+    # shows an image in a window, returns the pressed key like cv2.waitKey (-1 when headless)
+    def show(self, name, image):
+        if self.headless:
+            return -1
+        cv2.imshow(name, image)
+        return cv2.waitKey(1)
+
+    # publishes the annotated frame if it is due, 'image' is a bgr8 or mono8 image
+    def publish(self, image, header=None):
+        if not self.publish_now:
+            return
+        ok, buf = cv2.imencode('.jpg', image)
+        if not ok:
+            return
+        msg = CompressedImage()
+        if header is not None:
+            msg.header = header
+        msg.format = 'jpeg'
+        msg.data = buf.tobytes()
+        self.publisher.publish(msg)
+        self.last_publish = time.monotonic()
+        self.publish_now = False
+
+    def close(self):
+        if not self.headless:
+            cv2.destroyAllWindows()
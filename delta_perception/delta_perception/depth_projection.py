@@ -0,0 +1,57 @@
+import numpy as np
+
+
+# Back-projects pixels of a depth image to 3D points with the intrinsics of a CameraInfo message.
+# This replaces subscribing to the full PointCloud2 when only a few points per frame are needed.
+# By default the points are returned like in the simulated point clouds the nodes used so far
+# (x forward, y left, z up), with optical=True in the optical frame (x right, y down, z forward).
+class DepthProjector:
+    def __init__(self, optical=False):
+        self.optical = optical
+        self.fx = self.fy = self.cx = self.cy = None
+        self.frame_id = None
+
+    def set_camera_info(self, msg):
+        k = msg.k
+        self.fx, self.fy, self.cx, self.cy = k[0], k[4], k[2], k[5]
+        self.frame_id = msg.header.frame_id
+
+    @property
+    def ready(self):
+        return self.fx is not None
+
+    # 3D points for the pixels (cols[i], rows[i]) of 'depth' (32FC1 in meters or 16UC1 in millimeters).
+    # The depth of a pixel is the median of the valid depths in the (2*radius+1)^2 window around it,
+    # pixels without any valid depth get a row of NaN. Returns an (N, 3) float64 array.
+    def points(self, depth, cols, rows, radius=2):
+        cols = np.asarray(cols, dtype=np.intp).reshape(-1)
+        rows = np.asarray(rows, dtype=np.intp).reshape(-1)
+        z = window_median_depth(depth, cols, rows, radius)
+
+        x = (cols - self.cx) * z / self.fx
+        y = (rows - self.cy) * z / self.fy
+        if self.optical:
+            return np.stack((x, y, z), axis=1)
+        return np.stack((z, -x, -y), axis=1)
+
+
+# median of the valid (finite, > 0) depths in the window around every pixel, NaN if there is none
+def window_median_depth(depth, cols, rows, radius=2):
+    h, w = depth.shape[:2]
+    offsets = np.arange(-radius, radius + 1)
+    win_rows = np.clip(rows[:, None, None] + offsets[None, :, None], 0, h - 1)
+    win_cols = np.clip(cols[:, None, None] + offsets[None, None, :], 0, w - 1)
+    values = depth[win_rows, win_cols].reshape(len(rows), -1).astype(np.float64)
+    if depth.dtype == np.uint16:
+        values *= 0.001
+
+    valid = np.isfinite(values) & (values > 0)
+    count = valid.sum(axis=1)
+    # invalid depths are sorted to the end, the median is taken from the first 'count' values
+    values = np.sort(np.where(valid, values, np.inf), axis=1)
+    idx = np.arange(len(rows))
+    lo = values[idx, np.maximum(count - 1, 0) // 2]
+    hi = values[idx, np.maximum(count, 1) // 2]
+    # with a single valid depth hi is the inf of the first invalid one
+    median = np.where(count > 1, (lo + hi) / 2, lo)
+    return np.where(count > 0, median, np.nan)
@@ -0,0 +1,84 @@
+import time
+
+import cv2
+import numpy as np
+from nav_msgs.msg import Odometry
+from rclpy.qos import qos_profile_sensor_data
+
+
+# Skips the expensive part of a detector for frames that look like the last processed one.
+# Every frame is shrunk to a small grayscale thumbnail and compared to the thumbnail of the last
+# processed frame. If the mean absolute difference is below 'frame_gate_thresh' (gray levels) the
+# frame is skipped, but at least every 'frame_gate_max_skip' seconds a frame is processed anyway.
+# With 'frame_gate_use_odom' the odometry is watched as well and frames are never skipped while
+# the robot moves. The skip rate since the start is logged every 'frame_gate_log_period' seconds.
+class FrameGate:
+    THUMBNAIL_SIZE = (32, 24)
+    LINEAR_VEL_THRESH = 0.02    # m/s
+    ANGULAR_VEL_THRESH = 0.05   # rad/s
+    ODOM_TIMEOUT = 0.5          # s
+
+    def __init__(self, node, name='frame gate'):
+        self.node = node
+        self.name = name
+        node.declare_parameter('frame_gate', True)
+        node.declare_parameter('frame_gate_thresh', 2.0)
+        node.declare_parameter('frame_gate_max_skip', 0.5)
+        node.declare_parameter('frame_gate_use_odom', False)
+        node.declare_parameter('frame_gate_log_period', 30.0)
+        self.enabled = node.get_parameter('frame_gate').get_parameter_value().bool_value
+        self.thresh = node.get_parameter('frame_gate_thresh').get_parameter_value().double_value
+        self.max_skip = node.get_parameter('frame_gate_max_skip').get_parameter_value().double_value
+        use_odom = node.get_parameter('frame_gate_use_odom').get_parameter_value().bool_value
+        log_period = node.get_parameter('frame_gate_log_period').get_parameter_value().double_value
+
+        self.last_thumbnail = None
+        self.last_processed = 0.0
+        self.last_moving = None     # time the odometry last said the robot moves
+
+        # statistics
+        self.frames = 0
+        self.skipped = 0
+        self.start = time.monotonic()
+
+        if use_odom:
+            self.odom_sub = node.create_subscription(Odometry, '/odom', self.odom_callback, qos_profile_sensor_data)
+        if log_period > 0:
+            self.log_timer = node.create_timer(log_period, self.log_stats)
+
+    def odom_callback(self, msg):
+        twist = msg.twist.twist
+        if abs(twist.linear.x) > self.LINEAR_VEL_THRESH or abs(twist.angular.z) > self.ANGULAR_VEL_THRESH:
+            self.last_moving = time.monotonic()
+
+    @property
+    def moving(self):
+        return self.last_moving is not None and time.monotonic() - self.last_moving < self.ODOM_TIMEOUT
+
+    # returns True if the frame (bgr8 or mono8) should be processed
+    def should_process(self, image):
+        self.frames += 1
+        if not self.enabled:
+            return True
+
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        thumbnail = cv2.resize(gray, self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        now = time.monotonic()
+
+        if (self.last_thumbnail is not None
+                and not self.moving
+                and now - self.last_processed < self.max_skip
+                and np.mean(cv2.absdiff(thumbnail, self.last_thumbnail)) < self.thresh):
+            self.skipped += 1
+            return False
+
+        self.last_thumbnail = thumbnail
+        self.last_processed = now
+        return True
+
+    def skip_rate(self):
+        return self.skipped / self.frames if self.frames > 0 else 0.0
+
+    def log_stats(self):
+        self.node.get_logger().info('%s: skipped %d of %d frames (%.1f %%) in %.0f s' % (
+            self.name, self.skipped, self.frames, 100.0 * self.skip_rate(), time.monotonic() - self.start))
@@ -0,0 +1,113 @@
+import os
+import threading
+
+import numpy as np
+
+
+# Hamming distance of two hashes stored as ints.
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+# cv2.img_hash result (a (1, n) uint8 array) as int, so it can be xor'ed and stored as hex.
+def hash_to_int(image_hash):
+    return int.from_bytes(np.asarray(image_hash, dtype=np.uint8).tobytes(), 'big')
+
+
+# BK-tree over the Hamming distance. A lookup of all hashes within 'radius' only visits the
+# children whose edge distance is within 'radius' of the distance to the current node, which is
+# a small part of the tree for the small radii used for near duplicates.
+class BKTree:
+    def __init__(self):
+        self.root = None    # [hash, value, {distance: child}]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, image_hash, value=None):
+        self.size += 1
+        if self.root is None:
+            self.root = [image_hash, value, {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(image_hash, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [image_hash, value, {}]
+                return
+            node = child
+
+    # all (distance, hash, value) within 'radius', closest first
+    def search(self, image_hash, radius):
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(image_hash, node[0])
+            if d <= radius:
+                found.append((d, node[0], node[1]))
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        found.sort(key=lambda f: f[0])
+        return found
+
+    # the closest (distance, hash, value) within 'radius' or None
+    def nearest(self, image_hash, radius):
+        found = self.search(image_hash, radius)
+        return found[0] if found else None
+
+
+# BK-tree of the image hashes of a dataset directory, persisted as 'index_file' in it with one
+# "<hex hash> <file name>" line per image. Appending goes through 'write' (e.g. the submit of a
+# BackgroundWriter) so adding never blocks on the disk. A line that 'write' drops (returns False)
+# is only in memory, those are counted in 'unsaved'.
+class HashIndex:
+    def __init__(self, index_file, write=None):
+        self.index_file = index_file
+        self.write = write if write is not None else (lambda fn, *args: fn(*args))
+        self.tree = BKTree()
+        self.lock = threading.Lock()
+        self.unsaved = 0
+        if os.path.exists(index_file):
+            with open(index_file) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        self.tree.add(int(parts[0], 16), parts[1])
+
+    def __len__(self):
+        return len(self.tree)
+
+    @classmethod
+    def build(cls, index_file, image_files, hash_image, write=None):
+        # hashes the images of a dataset that has no index yet, e.g. one saved before the index existed
+        lines = []
+        for path in image_files:
+            image_hash = hash_image(path)
+            if image_hash is not None:
+                lines.append('%x %s\n' % (image_hash, os.path.basename(path)))
+        with open(index_file, 'w') as f:
+            f.writelines(lines)
+        return cls(index_file, write)
+
+    # (distance, file name) of the closest indexed image within 'radius' or None
+    def find(self, image_hash, radius):
+        with self.lock:
+            match = self.tree.nearest(image_hash, radius)
+        return None if match is None else (match[0], match[2])
+
+    # returns False if the line for the index file was dropped
+    def add(self, image_hash, name):
+        with self.lock:
+            self.tree.add(image_hash, name)
+        if self.write(self._append, '%x %s\n' % (image_hash, name)) is False:
+            self.unsaved += 1
+            return False
+        return True
+
+    def _append(self, line):
+        with open(self.index_file, 'a') as f:
+            f.write(line)
@@ -0,0 +1,80 @@
+import time
+import traceback
+from collections import deque
+from threading import Condition, Thread
+
+
+# Mean and maximum of the last 'window' samples of a duration in seconds.
+class LatencyStats:
+    def __init__(self, window=100):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def __str__(self):
+        if not self.samples:
+            return 'n/a'
+        return 'mean %.1f ms, max %.1f ms' % (
+            1e3 * sum(self.samples) / len(self.samples), 1e3 * max(self.samples))
+
+
+# Runs 'process(item)' on a worker thread for the newest submitted item only.
+# The buffer has a single slot: an item that is still waiting when a newer one is submitted
+# is dropped, so the worker never falls behind the camera and the subscription callbacks
+# return immediately.
+class LatestFrameWorker:
+    def __init__(self, process, name='latest_frame_worker'):
+        self.process = process
+        self.pending = None
+        self.running = True
+        self.condition = Condition()
+
+        # statistics
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latency = LatencyStats()
+
+        self.thread = Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        with self.condition:
+            self.submitted += 1
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = item
+            self.condition.notify()
+
+    def stop(self, timeout=1.0):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                item, self.pending = self.pending, None
+
+            t0 = time.monotonic()
+            try:
+                self.process(item)
+            except Exception:
+                # one broken frame must not stop the worker, the next one gets a new chance
+                self.failed += 1
+                traceback.print_exc()
+            self.latency.add(time.monotonic() - t0)
+            self.processed += 1
+
+    # statistics as a short string for logging
+    def stats(self):
+        with self.condition:
+            return 'processed: %d/%d, dropped: %d, failed: %d, latency: %s' % (
+                self.processed, self.submitted, self.dropped, self.failed, self.latency)
@@ -0,0 +1,135 @@
+import os
+
+import numpy as np
+import yaml
+
+
+# reads a binary (P5) pgm image as a 2D uint8 array
+def read_pgm(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    # header: magic, width, height, maxval, separated by whitespace, '#' starts a comment
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            pos = data.index(b'\n', pos) + 1
+            continue
+        end = pos
+        while not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    if fields[0] != b'P5':
+        raise ValueError('%s is not a binary pgm image' % path)
+    width, height, maxval = int(fields[1]), int(fields[2]), int(fields[3])
+    if maxval > 255:
+        raise ValueError('%s: 16 bit pgm images are not supported' % path)
+    return np.frombuffer(data, dtype=np.uint8, count=width * height, offset=pos + 1).reshape(height, width)
+
+
+# Occupancy grid of the map frame with the values of nav_msgs/OccupancyGrid: 0 free, 100 occupied,
+# -1 unknown. grid[iy, ix] is the cell at x = origin_x + (ix + 0.5) * resolution (same for y),
+# rows go up in y like in the OccupancyGrid message (not down like in the map image).
+class OccupancyMap:
+    FREE = 0
+    OCCUPIED = 100
+    UNKNOWN = -1
+
+    def __init__(self, grid, resolution, origin_x, origin_y):
+        self.grid = np.asarray(grid, dtype=np.int8)
+        self.resolution = float(resolution)
+        self.origin_x = float(origin_x)
+        self.origin_y = float(origin_y)
+
+    # the map of a map_server yaml file (e.g. dis_tutorial3/maps/map.yaml)
+    @classmethod
+    def from_yaml(cls, path):
+        with open(path) as f:
+            info = yaml.safe_load(f)
+        image = read_pgm(os.path.join(os.path.dirname(path), info['image']))
+        p = image.astype(np.float64) / 255.0
+        if not info.get('negate', 0):
+            p = 1.0 - p
+        grid = np.full(image.shape, cls.UNKNOWN, dtype=np.int8)
+        grid[p > info.get('occupied_thresh', 0.65)] = cls.OCCUPIED
+        grid[p < info.get('free_thresh', 0.25)] = cls.FREE
+        origin = info.get('origin', [0.0, 0.0, 0.0])
+        return cls(grid[::-1], info['resolution'], origin[0], origin[1])
+
+    # the map of a nav_msgs/OccupancyGrid message (e.g. /map of slam_toolbox or map_server), cell
+    # probabilities are reduced to free, occupied and unknown with the map_server thresholds
+    @classmethod
+    def from_msg(cls, msg, occupied_thresh=65, free_thresh=25):
+        data = np.asarray(msg.data, dtype=np.int8).reshape(msg.info.height, msg.info.width)
+        grid = np.full(data.shape, cls.UNKNOWN, dtype=np.int8)
+        grid[data >= occupied_thresh] = cls.OCCUPIED
+        grid[(data >= 0) & (data <= free_thresh)] = cls.FREE
+        origin = msg.info.origin.position
+        return cls(grid, msg.info.resolution, origin.x, origin.y)
+
+    @property
+    def height(self):
+        return self.grid.shape[0]
+
+    @property
+    def width(self):
+        return self.grid.shape[1]
+
+    # cell indices (ix, iy) of world coordinates, also for arrays
+    def world_to_cell(self, x, y):
+        ix = np.floor((np.asarray(x) - self.origin_x) / self.resolution).astype(np.int64)
+        iy = np.floor((np.asarray(y) - self.origin_y) / self.resolution).astype(np.int64)
+        return ix, iy
+
+    # world coordinates of the cell centers
+    def cell_to_world(self, ix, iy):
+        return (self.origin_x + (np.asarray(ix) + 0.5) * self.resolution,
+                self.origin_y + (np.asarray(iy) + 0.5) * self.resolution)
+
+    # values of the cells at the world coordinates, UNKNOWN outside of the map
+    def value_at(self, x, y):
+        ix, iy = self.world_to_cell(x, y)
+        inside = (ix >= 0) & (ix < self.width) & (iy >= 0) & (iy < self.height)
+        values = np.full(np.shape(ix), self.UNKNOWN, dtype=np.int8)
+        values[inside] = self.grid[iy[inside], ix[inside]]
+        return values
+
+    def is_free(self, x, y):
+        return self.value_at(x, y) == self.FREE
+
+    # True if all cells within 'radius' of (x, y) are free, e.g. room for the robot
+    def is_free_disk(self, x, y, radius):
+        n = int(np.ceil(radius / self.resolution))
+        offsets = np.arange(-n, n + 1) * self.resolution
+        dx, dy = np.meshgrid(offsets, offsets)
+        inside = dx * dx + dy * dy <= radius * radius
+        return bool(self.is_free(x + dx[inside], y + dy[inside]).all())
+
+    # (N, 2) centers of the free cells within 'radius' of (x, y)
+    def free_cells_within(self, x, y, radius):
+        (ix0, ix1), (iy0, iy1) = self.world_to_cell([x - radius, x + radius], [y - radius, y + radius])
+        ix0, iy0 = max(ix0, 0), max(iy0, 0)
+        ix1, iy1 = min(ix1, self.width - 1), min(iy1, self.height - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.empty((0, 2))
+        iy, ix = np.nonzero(self.grid[iy0:iy1 + 1, ix0:ix1 + 1] == self.FREE)
+        cx, cy = self.cell_to_world(ix + ix0, iy + iy0)
+        keep = (cx - x) ** 2 + (cy - y) ** 2 <= radius * radius
+        return np.stack([cx[keep], cy[keep]], axis=1)
+
+    # for every point of the (N, 2) array, True if the straight line from (x, y) to it only crosses
+    # free cells (sampled every half cell, so the line can not jump over a wall)
+    def line_of_sight(self, x, y, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0:
+            return np.zeros(0, dtype=bool)
+        d = points - (x, y)
+        lengths = np.hypot(d[:, 0], d[:, 1])
+        samples = max(int(np.ceil(lengths.max() / (0.5 * self.resolution))), 1)
+        t = np.linspace(0.0, 1.0, samples + 1)
+        xs = x + d[:, 0, None] * t
+        ys = y + d[:, 1, None] * t
+        return (self.value_at(xs, ys) == self.FREE).all(axis=1)
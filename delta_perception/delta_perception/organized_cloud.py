@@ -0,0 +1,70 @@
+import numpy as np
+
+
+# sensor_msgs/PointField.FLOAT32
+FLOAT32 = 7
+
+
+# Organized (height x width) PointCloud2 decoded once per message.
+# xyz is a (height, width, 3) float32 array. When x, y and z are stored next to each other
+# (as in the OAK-D clouds) it is a strided view over msg.data and nothing is copied.
+class OrganizedCloud:
+    def __init__(self, msg):
+        self.header = msg.header
+        self.height = msg.height
+        self.width = msg.width
+        self.xyz = _xyz_array(msg)
+
+    @property
+    def shape(self):
+        return (self.height, self.width)
+
+    # the point at pixel (row, col), the pixel is clipped to the cloud
+    def at(self, row, col):
+        row = min(max(int(row), 0), self.height - 1)
+        col = min(max(int(col), 0), self.width - 1)
+        return self.xyz[row, col]
+
+    # the points at many pixels at once, returns a (N, 3) array
+    def at_many(self, rows, cols):
+        rows = np.clip(np.asarray(rows, dtype=np.intp), 0, self.height - 1)
+        cols = np.clip(np.asarray(cols, dtype=np.intp), 0, self.width - 1)
+        return self.xyz[rows, cols]
+
+    # the (h, w, 3) view of the box [row_min, row_max) x [col_min, col_max), clipped to the cloud
+    def roi(self, row_min, row_max, col_min, col_max):
+        row_min = min(max(int(row_min), 0), self.height)
+        row_max = min(max(int(row_max), row_min), self.height)
+        col_min = min(max(int(col_min), 0), self.width)
+        col_max = min(max(int(col_max), col_min), self.width)
+        return self.xyz[row_min:row_max, col_min:col_max]
+
+    # points with a finite, non zero depth out of an (..., 3) array of points
+    @staticmethod
+    def valid(points):
+        points = points.reshape(-1, 3)
+        z = points[:, 2]
+        return points[np.isfinite(z) & (z != 0)]
+
+
+def _xyz_array(msg):
+    fields = {f.name: f for f in msg.fields}
+    for name in ('x', 'y', 'z'):
+        if name not in fields or fields[name].datatype != FLOAT32:
+            raise ValueError('point cloud has no float32 field "%s"' % name)
+
+    buf = np.frombuffer(msg.data, dtype=np.uint8)
+    order = '>' if msg.is_bigendian else '<'
+    ox, oy, oz = fields['x'].offset, fields['y'].offset, fields['z'].offset
+
+    if oy == ox + 4 and oz == ox + 8:
+        return np.ndarray(shape=(msg.height, msg.width, 3), dtype=np.dtype(order + 'f4'),
+                          buffer=buf, offset=ox,
+                          strides=(msg.row_step, msg.point_step, 4))
+
+    # fields are not next to each other, fall back to one copy of the three fields
+    point = np.dtype({'names': ['x', 'y', 'z'], 'formats': [order + 'f4'] * 3,
+                      'offsets': [ox, oy, oz], 'itemsize': msg.point_step})
+    points = np.ndarray(shape=(msg.height, msg.width), dtype=point, buffer=buf,
+                        strides=(msg.row_step, msg.point_step))
+    return np.stack((points['x'], points['y'], points['z']), axis=-1)
@@ -0,0 +1,191 @@
+from abc import ABC, abstractmethod
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+
+# Person detection with YOLOv8 on different inference backends.
+#   torch        ultralytics with PyTorch, as the nodes did before
+#   onnxruntime  the model exported once to ONNX and run with ONNX Runtime
+#   openvino     the same ONNX file compiled by OpenVINO for the CPU
+# The exported (and optionally int8 quantized) models are cached in 'cache_dir', so only the
+# first start on a machine pays for the export. All backends return the person boxes in image
+# pixels as an (N, 4) xyxy array sorted by confidence, the best box first.
+BACKENDS = ('torch', 'onnxruntime', 'openvino')
+
+PERSON_CLASS = 0
+DEFAULT_IMGSZ = (256, 320)
+DEFAULT_CACHE_DIR = os.path.expanduser('~/.cache/delta_perception')
+
+# same defaults as ultralytics predict
+CONF_THRESH = 0.25
+IOU_THRESH = 0.7
+
+
+class PersonDetector(ABC):
+    def __init__(self, imgsz=DEFAULT_IMGSZ, conf=CONF_THRESH, iou=IOU_THRESH):
+        self.imgsz = tuple(imgsz)
+        self.conf = conf
+        self.iou = iou
+
+    # returns (boxes, scores) of the persons in a bgr8 image
+    @abstractmethod
+    def detect(self, image):
+        pass
+
+
+class TorchPersonDetector(PersonDetector):
+    def __init__(self, model='yolov8n.pt', imgsz=DEFAULT_IMGSZ, device='', threads=0, **kwargs):
+        super().__init__(imgsz, **kwargs)
+        from ultralytics import YOLO
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = YOLO(model)
+        self.device = device
+
+    def detect(self, image):
+        res = self.model.predict(image, imgsz=self.imgsz, show=False, verbose=False, classes=[PERSON_CLASS],
+                                 conf=self.conf, iou=self.iou, device=self.device)
+        boxes = res[0].boxes
+        return boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy()
+
+
+# pre- and postprocessing of an exported YOLOv8 model with a fixed input size,
+# subclasses only run the network
+class ExportedPersonDetector(PersonDetector):
+
+    # (1, 84, N) raw network output for a (1, 3, h, w) float32 blob
+    @abstractmethod
+    def infer(self, blob):
+        pass
+
+    def detect(self, image):
+        blob, gain, pad = letterbox(image, self.imgsz)
+        out = self.infer(blob)[0]
+
+        scores = out[4 + PERSON_CLASS]
+        keep = scores > self.conf
+        if not keep.any():
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        cx, cy, w, h = out[:4, keep]
+        scores = scores[keep]
+        boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+        keep = nms(boxes, scores, self.iou)
+        boxes, scores = boxes[keep], scores[keep]
+
+        # back to image pixels
+        boxes[:, [0, 2]] -= pad[0]
+        boxes[:, [1, 3]] -= pad[1]
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image.shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image.shape[0])
+        return boxes, scores
+
+
+class OnnxRuntimePersonDetector(ExportedPersonDetector):
+    def __init__(self, onnx_path, imgsz=DEFAULT_IMGSZ, threads=0, **kwargs):
+        super().__init__(imgsz, **kwargs)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINOPersonDetector(ExportedPersonDetector):
+    def __init__(self, onnx_path, imgsz=DEFAULT_IMGSZ, threads=0, **kwargs):
+        super().__init__(imgsz, **kwargs)
+        import openvino as ov
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads > 0:
+            config['INFERENCE_NUM_THREADS'] = threads
+        core = ov.Core()
+        self.model = core.compile_model(core.read_model(onnx_path), 'CPU', config)
+        self.request = self.model.create_infer_request()
+
+    def infer(self, blob):
+        return self.request.infer([blob])[self.model.output(0)]
+
+
+# exports 'model' to ONNX for input size 'imgsz' unless it is already in 'cache_dir',
+# with int8 the weights are additionally quantized, returns the path of the .onnx file
+def export_onnx(model='yolov8n.pt', imgsz=DEFAULT_IMGSZ, int8=False, cache_dir=DEFAULT_CACHE_DIR):
+    name = os.path.splitext(os.path.basename(model))[0]
+    fp32_path = os.path.join(cache_dir, '%s_%dx%d.onnx' % (name, imgsz[0], imgsz[1]))
+    int8_path = os.path.join(cache_dir, '%s_%dx%d_int8.onnx' % (name, imgsz[0], imgsz[1]))
+
+    if not os.path.exists(fp32_path):
+        from ultralytics import YOLO
+        os.makedirs(cache_dir, exist_ok=True)
+        exported = YOLO(model).export(format='onnx', imgsz=list(imgsz), dynamic=False, simplify=True)
+        # written next to the .pt file, move it into the cache
+        shutil.move(exported, fp32_path + '.tmp')
+        os.replace(fp32_path + '.tmp', fp32_path)
+
+    if not int8:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, int8_path + '.tmp', weight_type=QuantType.QUInt8)
+        os.replace(int8_path + '.tmp', int8_path)
+    return int8_path
+
+
+def load_person_detector(backend='torch', model='yolov8n.pt', imgsz=DEFAULT_IMGSZ, device='', threads=0,
+                         int8=False, cache_dir=DEFAULT_CACHE_DIR):
+    if backend == 'torch':
+        return TorchPersonDetector(model, imgsz, device, threads)
+    if backend == 'onnxruntime':
+        return OnnxRuntimePersonDetector(export_onnx(model, imgsz, int8, cache_dir), imgsz, threads)
+    if backend == 'openvino':
+        return OpenVINOPersonDetector(export_onnx(model, imgsz, int8, cache_dir), imgsz, threads)
+    raise ValueError('unknown detector backend "%s", use one of %s' % (backend, ', '.join(BACKENDS)))
+
+
+# resizes and pads a bgr8 image to 'imgsz' (h, w) like ultralytics' LetterBox,
+# returns the normalized (1, 3, h, w) rgb blob, the scale and the (x, y) padding
+def letterbox(image, imgsz):
+    h, w = image.shape[:2]
+    gain = min(imgsz[0] / h, imgsz[1] / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+    dw, dh = (imgsz[1] - new_w) / 2, (imgsz[0] - new_h) / 2
+
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+    blob = image[:, :, ::-1].transpose(2, 0, 1)[np.newaxis]
+    blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+    return blob, gain, (left, top)
+
+
+# greedy non maximum suppression, returns the indices of the kept boxes by descending score
+def nms(boxes, scores, iou_thresh):
+    order = np.argsort(-scores, kind='stable')
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thresh]
+    return np.array(keep, dtype=np.intp)
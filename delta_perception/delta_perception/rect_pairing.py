@@ -0,0 +1,128 @@
+import numpy as np
+import cv2
+
+
+# default thresholds, the same dev_detect_people used in its nested loop
+CORNER_DIST_THRESH = 50     # px between the top left corners
+MIN_SIZE_RATIO = 0.8        # smaller / larger, for width and height
+
+
+# bounding rectangles (x, y, w, h) of the contours with at least min_points points that
+# approxPolyDP reduces to 4 corners. Contours whose bounding box is smaller than min_size
+# in width or height are dropped before the (expensive) polygon approximation.
+def find_rectangles(contours, min_points=20, epsilon=0.01, min_size=0):
+    rects = []
+    for cnt in contours:
+        if cnt.shape[0] < min_points:
+            continue
+        x, y, w, h = cv2.boundingRect(cnt)
+        if w < min_size or h < min_size:
+            continue
+        approx = cv2.approxPolyDP(cnt, epsilon * cv2.arcLength(cnt, True), True)
+        if len(approx) == 4:
+            rects.append((x, y, w, h))
+    return rects
+
+
+# returns the index pairs (i, j), i < j, of nested rectangles: top left corners closer than
+# max_dist (but not equal), one rectangle at least as large as the other in both dimensions and
+# not more than 1 / min_ratio times larger. The pairs are ordered like the nested loop
+# "for n: for m in range(n + 1, ...)" would produce them.
+def nested_pair_indices(rects, max_dist=CORNER_DIST_THRESH, min_ratio=MIN_SIZE_RATIO):
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    n = rects.shape[0]
+    empty = np.empty(0, dtype=np.intp)
+    if n < 2:
+        return empty, empty
+
+    # uniform grid of max_dist cells over the top left corners, corners closer than max_dist
+    # are at most one cell apart, so only the 3x3 neighbouring cells have to be compared
+    cells = np.floor(rects[:, :2] / max_dist).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    rows = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * rows + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    pairs_a, pairs_b = [], []
+    for offset in (-rows - 1, -rows, -rows + 1, -1, 0, 1, rows - 1, rows, rows + 1):
+        start = np.searchsorted(sorted_keys, keys + offset, side='left')
+        counts = np.searchsorted(sorted_keys, keys + offset, side='right') - start
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        # expand the cell ranges into flat (a, b) index pairs
+        a = np.repeat(np.arange(n), counts)
+        b = order[np.repeat(start, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)]
+        pairs_a.append(a)
+        pairs_b.append(b)
+    if not pairs_a:
+        return empty, empty
+
+    # every pair was found from both sides, keep it once with the smaller index first
+    i = np.concatenate(pairs_a)
+    j = np.concatenate(pairs_b)
+    keep = i < j
+    i = i[keep]
+    j = j[keep]
+
+    # same checks as in the original loop
+    d = rects[i, :2] - rects[j, :2]
+    dist = np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2)
+    keep = (dist < max_dist) & (dist != 0)
+
+    # the larger rectangle has both sides larger, i wins ties like in the loop
+    wi, hi, wj, hj = rects[i, 2], rects[i, 3], rects[j, 2], rects[j, 3]
+    i_larger = (wi >= wj) & (hi >= hj)
+    j_larger = ~i_larger & (wj >= wi) & (hj >= hi)
+    keep &= i_larger | j_larger
+    large_w = np.where(i_larger, wi, wj)
+    large_h = np.where(i_larger, hi, hj)
+    small_w = np.where(i_larger, wj, wi)
+    small_h = np.where(i_larger, hj, hi)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        keep &= (small_w / large_w >= min_ratio) & (small_h / large_h >= min_ratio)
+
+    i = i[keep]
+    j = j[keep]
+    sort = np.lexsort((j, i))
+    return i[sort], j[sort]
+
+
+# below this many rectangles the plain pair loop is faster than setting up the grid
+SMALL_COUNT = 16
+
+
+def _larger_of_pair(r1, r2, max_dist, min_ratio):
+    dist = np.hypot(r1[0] - r2[0], r1[1] - r2[1])
+    if dist >= max_dist or dist == 0:
+        return None
+    if r1[2] >= r2[2] and r1[3] >= r2[3]:
+        larger, smaller = r1, r2
+    elif r2[2] >= r1[2] and r2[3] >= r1[3]:
+        larger, smaller = r2, r1
+    else:
+        return None
+    if smaller[2] / larger[2] < min_ratio or smaller[3] / larger[3] < min_ratio:
+        return None
+    return larger
+
+
+# the larger rectangle of every nested pair, e.g. the outer edge of a painting frame
+def find_frame_candidates(rects, max_dist=CORNER_DIST_THRESH, min_ratio=MIN_SIZE_RATIO):
+    if len(rects) < SMALL_COUNT:
+        candidates = []
+        for n in range(len(rects)):
+            for m in range(n + 1, len(rects)):
+                larger = _larger_of_pair(rects[n], rects[m], max_dist, min_ratio)
+                if larger is not None:
+                    candidates.append(tuple(larger))
+        return candidates
+
+    i, j = nested_pair_indices(rects, max_dist, min_ratio)
+    if len(i) == 0:
+        return []
+    r = np.asarray(rects).reshape(-1, 4)
+    i_larger = (r[i, 2] >= r[j, 2]) & (r[i, 3] >= r[j, 3])
+    larger = np.where(i_larger, i, j)
+    return [tuple(rects[k]) for k in larger.tolist()]
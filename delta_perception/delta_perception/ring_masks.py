@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+import cv2
+
+
+# Masks of one ring candidate, only as large as the bounding box of the larger ellipse.
+# ring, large and small are uint8 (0/1) arrays of shape (h, w), the box starts at (x0, y0)
+# in image coordinates (x0 = column, y0 = row).
+class RingMask:
+    def __init__(self, x0, y0, ring, large, small):
+        self.x0 = x0
+        self.y0 = y0
+        self.ring = ring
+        self.large = large
+        self.small = small
+
+    @property
+    def shape(self):
+        return self.ring.shape
+
+    # slices of the box in a full size image (rows, columns)
+    @property
+    def roi(self):
+        h, w = self.ring.shape
+        return slice(self.y0, self.y0 + h), slice(self.x0, self.x0 + w)
+
+    # the part of a full size image (or point cloud) that is covered by the box
+    def crop(self, image):
+        rows, cols = self.roi
+        return image[rows, cols]
+
+    # values of a full size image under the given mask ('ring', 'large' or 'small')
+    def select(self, image, which='ring'):
+        mask = getattr(self, which)
+        return self.crop(image)[mask.astype(bool)]
+
+    def mean_color(self, image):
+        return np.mean(self.select(image, 'ring'), axis=0)
+
+    # rows of the ring mask in column 'col', starting at row 'row', relative to 'row'.
+    # Same as np.where(mask_ring[row::, col] != 0) on a full size mask.
+    def rows_below(self, row, col):
+        h, w = self.ring.shape
+        c = col - self.x0
+        if c < 0 or c >= w:
+            return np.empty(0, dtype=np.intp)
+        r = row - self.y0
+        column = self.ring[max(r, 0):, c]
+        return np.nonzero(column)[0] + max(r, 0) - r
+
+    # draws the ring mask into a full size image (for visualization)
+    def paint(self, canvas, value=255):
+        self.crop(canvas)[self.ring.astype(bool)] = value
+
+    # size of the stored masks in bytes
+    @property
+    def nbytes(self):
+        return self.ring.nbytes + self.large.nbytes + self.small.nbytes
+
+
+# bounding box (x_min, y_min, x_max, y_max) of an ellipse from cv2.fitEllipse, not clipped
+def ellipse_bounding_box(ellipse):
+    (cx, cy), (w, h), angle = ellipse
+    t = math.radians(angle)
+    a = w / 2
+    b = h / 2
+    half_x = math.sqrt((a * math.cos(t)) ** 2 + (b * math.sin(t)) ** 2)
+    half_y = math.sqrt((a * math.sin(t)) ** 2 + (b * math.cos(t)) ** 2)
+    # one pixel margin for the rounding of cv2.ellipse
+    return (int(math.floor(cx - half_x)) - 1, int(math.floor(cy - half_y)) - 1,
+            int(math.ceil(cx + half_x)) + 1, int(math.ceil(cy + half_y)) + 1)
+
+
+# builds the ROI local masks of a ring given by its larger (le) and smaller (se) ellipse
+def make_ring_mask(le, se, image_shape):
+    height, width = image_shape[:2]
+    x_min, y_min, x_max, y_max = ellipse_bounding_box(le)
+    x0 = min(max(x_min, 0), width)
+    y0 = min(max(y_min, 0), height)
+    x1 = min(max(x_max + 1, x0), width)
+    y1 = min(max(y_max + 1, y0), height)
+
+    shape = (y1 - y0, x1 - x0)
+    large = np.zeros(shape, dtype=np.uint8)
+    small = np.zeros(shape, dtype=np.uint8)
+    if shape[0] == 0 or shape[1] == 0:
+        return RingMask(x0, y0, large, large, small)
+
+    cv2.ellipse(large, _shift(le, x0, y0), 1, -1)
+    cv2.ellipse(small, _shift(se, x0, y0), 1, -1)
+    ring = cv2.subtract(large, small)
+    return RingMask(x0, y0, ring, large, small)
+
+
+def _shift(ellipse, x0, y0):
+    (cx, cy), axes, angle = ellipse
+    return ((cx - x0, cy - y0), axes, angle)
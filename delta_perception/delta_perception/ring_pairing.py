@@ -0,0 +1,102 @@
+import numpy as np
+import cv2
+
+
+# default thresholds, the same the ring detectors used in their nested loop
+CENTER_DIST_THRESH = 5
+ANGLE_DIFF_THRESH = 4
+
+
+# fits an ellipse to every contour that has at least min_points points
+def fit_ellipses(contours, min_points):
+    elps = []
+    for cnt in contours:
+        if cnt.shape[0] >= min_points:
+            elps.append(cv2.fitEllipse(cnt))
+    return elps
+
+
+# ellipses as returned by cv2.fitEllipse stored as numpy arrays
+# e[0] is the center (x,y), e[1] are the axes (minor, major), e[2] is the rotation in degrees
+class EllipseArrays:
+    def __init__(self, ellipses):
+        self.ellipses = ellipses
+        flat = np.array([(e[0][0], e[0][1], e[1][0], e[1][1], e[2]) for e in ellipses],
+                        dtype=np.float64).reshape(-1, 5)
+        self.centers = flat[:, 0:2]
+        self.axes = flat[:, 2:4]
+        self.angles = flat[:, 4]
+
+    def __len__(self):
+        return len(self.ellipses)
+
+
+# returns the index pairs (i, j), i < j, of concentric ellipses where one contains the other.
+# The pairs are ordered like the nested loop "for n: for m in range(n + 1, ...)" would produce them.
+def concentric_pair_indices(centers, axes, angles,
+                            max_center_dist=CENTER_DIST_THRESH,
+                            max_angle_diff=ANGLE_DIFF_THRESH):
+    n = centers.shape[0]
+    if n < 2:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+
+    # sort by the x coordinate of the center, so only a small window after each ellipse
+    # has to be checked (|dx| < max_center_dist is necessary for dist < max_center_dist)
+    order = np.argsort(centers[:, 0], kind='stable')
+    xs = centers[order, 0]
+    window_end = np.searchsorted(xs, xs + max_center_dist, side='left')
+    starts = np.arange(1, n + 1)
+    counts = np.maximum(window_end - starts, 0)
+
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+
+    # expand the windows into flat (a, b) index pairs in sorted order
+    a = np.repeat(np.arange(n), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    b = a + 1 + offsets
+
+    # back to the original indices, smaller index first
+    a = order[a]
+    b = order[b]
+    i = np.minimum(a, b)
+    j = np.maximum(a, b)
+
+    # same checks as in the original loop
+    d = centers[i] - centers[j]
+    dist = np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2)
+    keep = dist < max_center_dist
+    keep &= np.abs(angles[i] - angles[j]) <= max_angle_diff
+
+    # the larger ellipse should have both axis larger
+    i_larger = (axes[i, 1] >= axes[j, 1]) & (axes[i, 0] >= axes[j, 0])
+    j_larger = (axes[j, 1] >= axes[i, 1]) & (axes[j, 0] >= axes[i, 0])
+    keep &= i_larger | j_larger
+
+    i = i[keep]
+    j = j[keep]
+    sort = np.lexsort((j, i))
+    return i[sort], j[sort]
+
+
+# finds pairs of ellipses with the same centers, returns the list of (e1, e2) candidates
+def find_ring_candidates(ellipses,
+                         max_center_dist=CENTER_DIST_THRESH,
+                         max_angle_diff=ANGLE_DIFF_THRESH):
+    arrays = ellipses if isinstance(ellipses, EllipseArrays) else EllipseArrays(ellipses)
+    i, j = concentric_pair_indices(arrays.centers, arrays.axes, arrays.angles,
+                                   max_center_dist, max_angle_diff)
+    elps = arrays.ellipses
+    return [(elps[n], elps[m]) for n, m in zip(i.tolist(), j.tolist())]
+
+
+# returns (larger ellipse, smaller ellipse) of a candidate, or (None, None) if neither contains the other
+def split_larger_smaller(e1, e2):
+    if e1[1][1] >= e2[1][1] and e1[1][0] >= e2[1][0]:
+        return e1, e2
+    elif e2[1][1] >= e1[1][1] and e2[1][0] >= e1[1][0]:
+        return e2, e1
+    return None, None
@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+
+
+# colour names the ring detector votes for, "Unknown" detections don't vote
+RING_COLORS = ('Black', 'Red', 'Green', 'Blue')
+
+
+# A ring in the map frame. The position is the running mean of all associated detections,
+# color_votes counts how often every colour in RING_COLORS was detected for it.
+class RingTrack:
+    def __init__(self, track_id, position, stamp):
+        self.id = track_id
+        self.position = np.asarray(position, dtype=np.float64).copy()
+        self.color_votes = np.zeros(len(RING_COLORS), dtype=np.int64)
+        self.detections = 1     # associated detections, used as weight of the running mean
+        self.hits = 1           # frames the ring was seen in
+        self.first_seen = stamp
+        self.last_seen = stamp
+        self.confirmed = False
+
+    @property
+    def color(self):
+        if not self.color_votes.any():
+            return 'Unknown'
+        return RING_COLORS[int(np.argmax(self.color_votes))]
+
+    def vote(self, color_name):
+        if color_name in RING_COLORS:
+            self.color_votes[RING_COLORS.index(color_name)] += 1
+
+
+# Keeps track of the rings in the map frame.
+# The tracks are stored in a uniform grid over x and y with cells as large as the association
+# distance, so a detection is only compared to the tracks in the 3x3 cells around it.
+# A track is confirmed after it was seen in 'confirm_hits' different frames, tentative tracks that
+# are not seen again within 'tentative_timeout' seconds are removed. Confirmed tracks are kept.
+class RingTracker:
+    def __init__(self, association_dist=1.0, confirm_hits=3, tentative_timeout=5.0):
+        self.association_dist = association_dist
+        self.confirm_hits = confirm_hits
+        self.tentative_timeout = tentative_timeout
+        self.tracks = {}
+        self.grid = {}
+        self.next_id = 0
+
+    def _cell(self, position):
+        return (math.floor(position[0] / self.association_dist),
+                math.floor(position[1] / self.association_dist))
+
+    # the closest track within the association distance or None
+    def nearest(self, position):
+        position = np.asarray(position, dtype=np.float64)
+        cx, cy = self._cell(position)
+        best, best_dist = None, self.association_dist
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for track_id in self.grid.get((cx + dx, cy + dy), ()):
+                    track = self.tracks[track_id]
+                    dist = float(np.linalg.norm(track.position - position))
+                    if dist <= best_dist:
+                        best, best_dist = track, dist
+        return best
+
+    # adds a detection at 'position' (map frame) seen at 'stamp' (seconds),
+    # returns the track it was associated with and True if that track got confirmed by it
+    def update(self, position, color_name, stamp):
+        position = np.asarray(position, dtype=np.float64)
+        if not np.isfinite(position).all():
+            return None, False
+
+        track = self.nearest(position)
+        if track is None:
+            track = RingTrack(self.next_id, position, stamp)
+            self.next_id += 1
+            self.tracks[track.id] = track
+            self.grid.setdefault(self._cell(position), []).append(track.id)
+        else:
+            old_cell = self._cell(track.position)
+            track.detections += 1
+            track.position += (position - track.position) / track.detections
+            new_cell = self._cell(track.position)
+            if new_cell != old_cell:
+                self._remove_from_grid(track.id, old_cell)
+                self.grid.setdefault(new_cell, []).append(track.id)
+
+            # several detections of the same frame count as one hit
+            if stamp != track.last_seen:
+                track.hits += 1
+            track.last_seen = stamp
+
+        track.vote(color_name)
+
+        newly_confirmed = not track.confirmed and track.hits >= self.confirm_hits
+        if newly_confirmed:
+            track.confirmed = True
+        return track, newly_confirmed
+
+    # removes tentative tracks not seen since 'tentative_timeout' seconds, returns them
+    def expire(self, now):
+        expired = [t for t in self.tracks.values()
+                   if not t.confirmed and now - t.last_seen > self.tentative_timeout]
+        for track in expired:
+            del self.tracks[track.id]
+            self._remove_from_grid(track.id, self._cell(track.position))
+        return expired
+
+    def confirmed(self):
+        return [t for t in self.tracks.values() if t.confirmed]
+
+    def _remove_from_grid(self, track_id, cell):
+        ids = self.grid[cell]
+        ids.remove(track_id)
+        if not ids:
+            del self.grid[cell]
@@ -0,0 +1,99 @@
+import math
+import time
+from collections import namedtuple
+
+from rclpy.time import Time
+from tf2_ros import TransformException
+
+from delta_perception.angles import wrap_angle
+
+
+# planar pose of the robot in the map frame. 'stamp' is the (rclpy) stamp of the transform and
+# 'received' the time.monotonic() at which tf first had a transform with this stamp. Freshness is
+# measured on the receiving side, so it does not depend on the node clock and the tf stamps using
+# the same time source (e.g. a node without use_sim_time next to Gazebo).
+class RobotPose(namedtuple('RobotPose', ['x', 'y', 'yaw', 'stamp', 'received'])):
+    __slots__ = ()
+
+    # seconds since the stamp of the transform last advanced, grows when tf stops updating even
+    # though the pose is read again every tick
+    def age(self):
+        return time.monotonic() - self.received
+
+    # point given in the robot frame (x forward, y left) in the map frame
+    def to_map(self, x, y):
+        c, s = math.cos(self.yaw), math.sin(self.yaw)
+        return self.x + c * x - s * y, self.y + s * x + c * y
+
+    # angle from the robot heading to the map point (x, y), positive is to the left
+    def bearing_to(self, x, y):
+        return wrap_angle(math.atan2(y - self.y, x - self.x) - self.yaw)
+
+    def distance_squared_to(self, x, y):
+        dx = x - self.x
+        dy = y - self.y
+        return dx * dx + dy * dy
+
+
+# Reads the transform 'target' <- 'base' once per timer tick into a RobotPose, so code that needs
+# the robot position (often several times per loop iteration) reads a cached value instead of
+# doing a tf lookup each time. get() never blocks, wait() is meant for worker threads that can not
+# continue without a pose. Takes the buffer of a TransformCache (or any tf2 Buffer).
+class RobotPoseCache:
+    def __init__(self, node, buffer, period=0.1, target='map', base='base_link'):
+        self.node = node
+        self.buffer = getattr(buffer, 'buffer', buffer)
+        self.target = target
+        self.base = base
+        self.pose = None
+
+        # statistics
+        self.updates = 0
+        self.failures = 0
+
+        self.timer = node.create_timer(period, self.update)
+
+    # timer callback, reads the latest transform
+    def update(self):
+        try:
+            transform = self.buffer.lookup_transform(self.target, self.base, Time())
+        except TransformException:
+            self.failures += 1
+            return
+        t = transform.transform.translation
+        q = transform.transform.rotation
+        yaw = math.atan2(2.0 * (q.w * q.z + q.x * q.y), 1.0 - 2.0 * (q.y * q.y + q.z * q.z))
+        stamp = Time.from_msg(transform.header.stamp)
+        last = self.pose
+        received = last.received if last is not None and stamp <= last.stamp else time.monotonic()
+        # a single assignment, readers in other threads see either the old or the new pose
+        self.pose = RobotPose(t.x, t.y, yaw, stamp, received)
+        self.updates += 1
+
+    # the cached pose, None if there is none yet or it is older than max_age seconds
+    def get(self, max_age=None):
+        pose = self.pose
+        if pose is None or (max_age is not None and pose.age() > max_age):
+            return None
+        return pose
+
+    # blocks until a pose not older than max_age is available, raises a TimeoutError after
+    # 'timeout' seconds. Do not call from a callback of the same executor, the timer that updates
+    # the pose would never run.
+    def wait(self, max_age=None, timeout=10.0, poll=0.05, log_period=1.0):
+        start = last_log = time.monotonic()
+        while True:
+            pose = self.get(max_age)
+            if pose is not None:
+                return pose
+            now = time.monotonic()
+            if timeout is not None and now - start > timeout:
+                raise TimeoutError('no robot pose in the %s frame for %.1f s (%s)' % (self.target, timeout, self.stats()))
+            if now - last_log > log_period:
+                self.node.get_logger().info('failed to get robot map position. trying again')
+                last_log = now
+            time.sleep(poll)
+
+    # statistics as a short string for logging
+    def stats(self):
+        return 'pose updates: %d, failed lookups: %d' % (self.updates, self.failures)
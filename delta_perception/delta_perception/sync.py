@@ -0,0 +1,82 @@
+from collections import deque
+from threading import Lock
+
+
+def stamp_to_sec(stamp):
+    return stamp.sec + stamp.nanosec * 1e-9
+
+
+# Approximate time synchronizer in the style of message_filters.ApproximateTimeSynchronizer.
+# Every input has a bounded queue, when a queue is full its oldest message is dropped.
+# As soon as every input has a message within 'slop' seconds of a newly received one,
+# the matched messages are passed to the registered callbacks (in input order) and everything
+# older than them is discarded.
+class ApproximateTimeSynchronizer:
+    def __init__(self, num_inputs, queue_size=10, slop=0.1):
+        self.num_inputs = num_inputs
+        self.queue_size = queue_size
+        self.slop = slop
+        self.queues = [deque() for _ in range(num_inputs)]
+        self.callbacks = []
+        self.lock = Lock()
+
+        # statistics
+        self.received = [0] * num_inputs
+        self.dropped = [0] * num_inputs
+        self.matched = 0
+
+    def register_callback(self, callback):
+        self.callbacks.append(callback)
+
+    # returns a function that can be used as a subscription callback for input 'index'
+    def input(self, index):
+        return lambda msg: self.add(index, msg)
+
+    def add(self, index, msg, stamp=None):
+        if stamp is None:
+            stamp = stamp_to_sec(msg.header.stamp)
+
+        with self.lock:
+            self.received[index] += 1
+            queue = self.queues[index]
+            if len(queue) >= self.queue_size:
+                queue.popleft()
+                self.dropped[index] += 1
+            queue.append((stamp, msg))
+            matched = self._match(index, stamp)
+
+        if matched is not None:
+            for callback in self.callbacks:
+                callback(*matched)
+
+    def _match(self, index, stamp):
+        picks = []
+        for i, queue in enumerate(self.queues):
+            if i == index:
+                picks.append(len(queue) - 1)
+                continue
+            if not queue:
+                return None
+            best = min(range(len(queue)), key=lambda k: abs(queue[k][0] - stamp))
+            picks.append(best)
+
+        stamps = [self.queues[i][k][0] for i, k in enumerate(picks)]
+        if max(stamps) - min(stamps) > self.slop:
+            return None
+
+        msgs = []
+        for i, k in enumerate(picks):
+            queue = self.queues[i]
+            # messages older than the matched one will never be used
+            for _ in range(k):
+                queue.popleft()
+                self.dropped[i] += 1
+            msgs.append(queue.popleft()[1])
+        self.matched += 1
+        return msgs
+
+    # statistics as a short string for logging
+    def stats(self):
+        with self.lock:
+            return 'matched: %d, received: %s, dropped: %s' % (
+                self.matched, self.received, self.dropped)
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+
+import numpy as np
+from rclpy.duration import Duration
+from rclpy.time import Time
+from tf2_ros import TransformException
+from tf2_ros.buffer import Buffer
+from tf2_ros.transform_listener import TransformListener
+
+
+# rotation matrix of a geometry_msgs Quaternion
+def quaternion_matrix(q):
+    x, y, z, w = q.x, q.y, q.z, q.w
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+# Looks up transforms at the stamp of the observation instead of the latest one and remembers
+# them in an LRU cache, so all detections of one frame (and every node callback with the same
+# stamp) cost a single lookup. Only a stamp that is newer than the newest transform waits, at most
+# 'timeout' seconds. The own listener spins on its own thread, so /tf keeps arriving while a
+# callback of the (single threaded) node waits. With a 'buffer' of the caller its listener is spun
+# by the node's executor and nothing can arrive while a callback waits, so there is no waiting.
+# If the transform at the stamp is not available (too old or still missing after the timeout) the
+# latest transform is used, like before, and counted as fallback. The statistics are logged every
+# 'log_period' seconds.
+# Points are transformed as (N, 3) arrays with NumPy, not one PointStamped at a time.
+class TransformCache:
+    def __init__(self, node, buffer=None, max_size=64, timeout=0.05, fallback_to_latest=True, log_period=60.0):
+        self.node = node
+        if buffer is None:
+            buffer = Buffer()
+            self.listener = TransformListener(buffer, node, spin_thread=True)
+        else:
+            timeout = 0.0
+        self.buffer = buffer
+        self.max_size = max_size
+        self.timeout = Duration(seconds=timeout)
+        self.fallback_to_latest = fallback_to_latest
+        self.cache = OrderedDict()
+
+        # statistics
+        self.hits = 0
+        self.lookups = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+        if log_period > 0:
+            self.log_timer = node.create_timer(log_period, self.log_stats)
+
+    # (rotation 3x3, translation 3) from 'source' to 'target' at 'stamp' (a builtin_interfaces Time,
+    # an rclpy Time or None/zero for the latest transform), None if there is none
+    def lookup(self, target, source, stamp=None):
+        if stamp is not None and not isinstance(stamp, Time):
+            stamp = Time.from_msg(stamp)
+        latest = stamp is None or stamp.nanoseconds == 0
+
+        if not latest:
+            key = (target, source, stamp.nanoseconds)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        self.lookups += 1
+        try:
+            if latest:
+                return self._to_matrix(self.buffer.lookup_transform(target, source, Time()))
+            # can_transform with a zero timeout returns at once instead of raising after a wait
+            if not self.buffer.can_transform(target, source, stamp, self.timeout):
+                raise TransformException(f"no transform from {source} to {target} at the stamp")
+            transform = self._to_matrix(self.buffer.lookup_transform(target, source, stamp))
+        except TransformException as te:
+            if latest or not self.fallback_to_latest:
+                self.failures += 1
+                self.node.get_logger().info(f"Cound not get the transform: {te}")
+                return None
+            try:
+                transform = self._to_matrix(self.buffer.lookup_transform(target, source, Time()))
+                self.fallbacks += 1
+            except TransformException as te:
+                self.failures += 1
+                self.node.get_logger().info(f"Cound not get the transform: {te}")
+                return None
+            # not cached, the transform at the stamp may still arrive
+            return transform
+
+        self.cache[key] = transform
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return transform
+
+    @staticmethod
+    def _to_matrix(transform_stamped):
+        t = transform_stamped.transform
+        rotation = quaternion_matrix(t.rotation)
+        translation = np.array([t.translation.x, t.translation.y, t.translation.z])
+        return rotation, translation
+
+    # (N, 3) points from 'source' to 'target' frame, None if the transform is not available
+    def transform_points(self, points, target, source, stamp=None):
+        transform = self.lookup(target, source, stamp)
+        if transform is None:
+            return None
+        rotation, translation = transform
+        return np.asarray(points, dtype=np.float64).reshape(-1, 3) @ rotation.T + translation
+
+    # a single point as [x, y, z] list, None if the transform is not available
+    def transform_point(self, x, y, z, target, source, stamp=None):
+        points = self.transform_points((x, y, z), target, source, stamp)
+        return None if points is None else points[0].tolist()
+
+    # statistics as a short string for logging
+    def stats(self):
+        return 'lookups: %d, cache hits: %d, fallbacks to latest: %d, failures: %d' % (
+            self.lookups, self.hits, self.fallbacks, self.failures)
+
+    def log_stats(self):
+        if self.lookups + self.hits > 0:
+            self.node.get_logger().info(f"Transforms: {self.stats()}")
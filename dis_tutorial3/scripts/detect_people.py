@@ -3,19 +3,26 @@
 import rclpy
 from rclpy.node import Node
 from rclpy.qos import qos_profile_sensor_data, QoSReliabilityPolicy
-
-from sensor_msgs.msg import Image, PointCloud2
-from sensor_msgs_py import point_cloud2 as pc2
+from rclpy.time import Time
+
+from sensor_msgs.msg import Image, PointCloud2, CameraInfo
+from delta_perception.organized_cloud import OrganizedCloud
+from delta_perception.depth_projection import DepthProjector
+from delta_perception.debug_image import DebugView
+from delta_perception.frame_gate import FrameGate
+from delta_perception.latest_frame import LatestFrameWorker, LatencyStats
+from delta_perception.sync import ApproximateTimeSynchronizer, stamp_to_sec
 from builtin_interfaces.msg import Duration
 
 import os
+from threading import Lock
 from visualization_msgs.msg import Marker
 
 from cv_bridge import CvBridge, CvBridgeError
 import cv2
 import numpy as np
 
-from ultralytics import YOLO
+from delta_perception.person_detector import load_person_detector
 
 # from rclpy.parameter import Parameter
 # from rcl_interfaces.msg import SetParametersResult
@@ -29,6 +36,12 @@ class detect_faces(Node):
 			namespace='',
 			parameters=[
 				('device', ''),
+				('backend', 'torch'),
+				('backend_threads', 0),
+				('backend_int8', False),
+				('depth_source', 'pointcloud'),
+				('sync_queue_size', 10),
+				('sync_slop', 0.02),
 		])
 
 		marker_topic = "/people_marker"
@@ -40,16 +53,57 @@ class detect_faces(Node):
 		self.scan = None
 
 		self.rgb_image_sub = self.create_subscription(Image, "/oakd/rgb/preview/image_raw", self.rgb_callback, qos_profile_sensor_data)
-		self.pointcloud_sub = self.create_subscription(PointCloud2, "/oakd/rgb/preview/depth/points", self.pointcloud_callback, qos_profile_sensor_data)
+
+		# the detections of image t are matched with the point cloud / depth frame of the same stamp,
+		# the last 'sync_queue_size' frames are kept because inference finishes after the frame arrived.
+		# Input 0: (image stamp, faces, monalisas) of an inference, input 1: the depth frames
+		self.sync = ApproximateTimeSynchronizer(
+			2,
+			self.get_parameter('sync_queue_size').get_parameter_value().integer_value,
+			self.get_parameter('sync_slop').get_parameter_value().double_value)
+		self.sync.register_callback(self.synced_callback)
+
+		# 3D positions of the detections either from the point cloud or, much lighter, from the depth image
+		self.depth_source = self.get_parameter('depth_source').get_parameter_value().string_value
+		if self.depth_source == 'depth':
+			self.depth_projector = DepthProjector()
+			self.camera_info_sub = self.create_subscription(CameraInfo, "/oakd/rgb/preview/camera_info", self.camera_info_callback, qos_profile_sensor_data)
+			self.depth_sub = self.create_subscription(Image, "/oakd/rgb/preview/depth", self.sync.input(1), qos_profile_sensor_data)
+		else:
+			self.pointcloud_sub = self.create_subscription(PointCloud2, "/oakd/rgb/preview/depth/points", self.sync.input(1), qos_profile_sensor_data)
 
 		self.marker_pub = self.create_publisher(Marker, marker_topic, QoSReliabilityPolicy.BEST_EFFORT)
 
-		self.model = YOLO("yolov8n.pt")
+		# OpenCV windows (not in headless mode) and the ~/debug_image topic
+		self.debug_view = DebugView(self)
+
+		# YOLO person detector on the selected backend (torch, onnxruntime or openvino)
+		self.detector = load_person_detector(
+			self.get_parameter('backend').get_parameter_value().string_value,
+			"yolov8n.pt",
+			device=self.device,
+			threads=self.get_parameter('backend_threads').get_parameter_value().integer_value,
+			int8=self.get_parameter('backend_int8').get_parameter_value().bool_value)
 
-		self.faces = []
-		self.monalisas = []
+		# synced_callback runs on the worker or the executor thread, whichever added the later message
+		self.marker_lock = Lock()
 		self.marker_id = 0
 
+		# skips frames that look like the last processed one
+		self.frame_gate = FrameGate(self, 'Person detector')
+
+		# YOLO runs on its own thread and always takes the newest image
+		self.inference = LatestFrameWorker(self.run_inference, 'yolo_inference')
+		self.marker_delay = LatencyStats()
+		self.metrics_timer = self.create_timer(10.0, self.log_metrics)
+
+		# HighGUI is not thread safe, the worker only hands its images over and the windows are
+		# drawn on the executor thread
+		self.gui_images = {}
+		self.gui_lock = Lock()
+		if not self.debug_view.headless:
+			self.gui_timer = self.create_timer(0.03, self.show_debug_windows)
+
 		script_dir = os.path.dirname(__file__)
 		print(script_dir)
 		print(script_dir)
@@ -74,37 +128,51 @@ class detect_faces(Node):
 
 
 
+	# only hands the image to the inference worker, so the point clouds are not blocked by YOLO
 	def rgb_callback(self, data):
+		try:
+			cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
+		except CvBridgeError as e:
+			print(e)
+			return
+
+		# nothing changed since the last processed frame
+		if not self.frame_gate.should_process(cv_image):
+			return
+
+		self.inference.submit((data.header, cv_image))
+
+	# runs on the inference worker thread for the newest image
+	def run_inference(self, frame):
 
-		self.faces = []
-		self.monalisas = []
+		header, cv_image = frame
+		faces = []
+		monalisas = []
 
 		try:
-			cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
+			# annotations are only drawn if somebody is watching, on a copy so they don't affect the histograms
+			debug = self.debug_view.begin_frame()
+			vis_image = cv_image.copy() if debug else None
 
 			self.get_logger().info(f"Running inference on image...")
 
 			# run inference
-			res = self.model.predict(cv_image, imgsz=(256, 320), show=False, verbose=False, classes=[0], device=self.device)
+			boxes, _ = self.detector.detect(cv_image)
 
-			# iterate over results
-			for x in res:
-				bbox = x.boxes.xyxy
-				if bbox.nelement() == 0: # skip if empty
-					continue
+			# only the most confident person is used
+			for bbox in boxes[:1]:
 
 				self.get_logger().info(f"Person has been detected!")
 
-				bbox = bbox[0]
-
-				# draw rectangle
-				cv_image = cv2.rectangle(cv_image, (int(bbox[0]), int(bbox[1])), (int(bbox[2]), int(bbox[3])), self.detection_color, 3)
-
 				cx = int((bbox[0]+bbox[2])/2)
 				cy = int((bbox[1]+bbox[3])/2)
 
-				# draw the center of bounding box
-				cv_image = cv2.circle(cv_image, (cx,cy), 5, self.detection_color, -1)
+				if debug:
+					# draw rectangle
+					vis_image = cv2.rectangle(vis_image, (int(bbox[0]), int(bbox[1])), (int(bbox[2]), int(bbox[3])), self.detection_color, 3)
+
+					# draw the center of bounding box
+					vis_image = cv2.circle(vis_image, (cx,cy), 5, self.detection_color, -1)
 
 				
 				roi = cv_image[int(bbox[1]):int(bbox[3]), int(bbox[0]):int(bbox[2])]
@@ -132,110 +200,114 @@ class detect_faces(Node):
 				avg_rgb = (avg_r + avg_g + avg_b) / 3
 				self.get_logger().info(f"Average R: {avg_r}, G: {avg_g}, B: {avg_b}, RGB: {avg_rgb}")
 
-				cv2.imshow("ROI", roi)
+				if debug:
+					self.show_later("ROI", roi)
 
 				if similarity > 0.85:
-					self.monalisas.append((cx,cy))
+					monalisas.append((cx,cy))
 				elif similarity < 0.58:
-					self.faces.append((cx,cy))
+					faces.append((cx,cy))
+
+			# located in the depth frame with the stamp of the image
+			if len(faces) > 0 or len(monalisas) > 0:
+				self.sync.add(0, (header.stamp, faces, monalisas), stamp_to_sec(header.stamp))
 		
-			cv2.imshow("image", cv_image)
-			key = cv2.waitKey(1)
-			if key==27:
-				print("exiting")
-				exit()
+			if debug:
+				self.debug_view.publish(vis_image, header)
+				self.show_later("image", vis_image)
 			
 		except CvBridgeError as e:
 			print(e)
 
-	def pointcloud_callback(self, data):
-
-		# get point cloud attributes
-		height = data.height
-		width = data.width
-		point_step = data.point_step
-		row_step = data.row_step		
-
-		# iterate over face coordinates
-		for x,y in self.faces:
-
-			# get 3-channel representation of the poitn cloud in numpy format
-			a = pc2.read_points_numpy(data, field_names= ("x", "y", "z"))
-			a = a.reshape((height,width,3))
-
-			# read center coordinates
-			d = a[y,x,:]
-
-			# create marker
-			marker = Marker()
-
-			marker.header.frame_id = "/base_link"
-			marker.header.stamp = data.header.stamp
-
-			marker.type = 2
-			marker.id = self.marker_id
-			self.marker_id += 1
-			marker.lifetime = Duration(sec=10000, nanosec=0)
-
-			# Set the scale of the marker
-			scale = 0.1
-			marker.scale.x = scale
-			marker.scale.y = scale
-			marker.scale.z = scale
-
-			# Set the color
-			marker.color.r = 1.0
-			marker.color.g = 1.0
-			marker.color.b = 1.0
-			marker.color.a = 1.0
-
-			# Set the pose of the marker
-			marker.pose.position.x = float(d[0])
-			marker.pose.position.y = float(d[1])
-			marker.pose.position.z = float(d[2])
-			
+	# called on the inference worker thread, the image is shown by show_debug_windows
+	def show_later(self, name, image):
+		if self.debug_view.headless:
+			return
+		with self.gui_lock:
+			self.gui_images[name] = image
+
+	# draws the images of the worker on the executor thread, ESC stops the node
+	def show_debug_windows(self):
+		with self.gui_lock:
+			images, self.gui_images = self.gui_images, {}
+		key = -1
+		for name, image in images.items():
+			key = max(key, self.debug_view.show(name, image))
+		if key==27:
+			print("exiting")
+			rclpy.shutdown()
+
+	def log_metrics(self):
+		self.get_logger().info(f"Inference: {self.inference.stats()}, image to marker delay: {self.marker_delay}, sync: {self.sync.stats()}")
+
+	# detections and the point cloud or depth image with the same stamp
+	def synced_callback(self, detections, frame):
+		image_stamp, faces, monalisas = detections
+		pixels = np.array(faces + monalisas).reshape(-1, 2)
+
+		if self.depth_source == 'depth':
+			if not self.depth_projector.ready:
+				return
+			try:
+				depth_image = self.bridge.imgmsg_to_cv2(frame, "passthrough")
+			except CvBridgeError as e:
+				print(e)
+				return
+			# 3D points of all detections at once, from the median depth around each of them
+			points = self.depth_projector.points(depth_image, pixels[:, 0], pixels[:, 1])
+		else:
+			# get 3-channel representation of the point cloud in numpy format, decoded once for all detections
+			cloud = OrganizedCloud(frame)
+			points = cloud.at_many(pixels[:, 1], pixels[:, 0])
+
+		# stamped like the frame the points come from, object_identifier transforms them with the tf at that stamp
+		self.publish_markers(frame.header.stamp, image_stamp, points[:len(faces)], points[len(faces):])
+
+	def camera_info_callback(self, data):
+		self.depth_projector.set_camera_info(data)
+
+	def publish_markers(self, stamp, image_stamp, face_points, monalisa_points):
+
+		# faces are white, mona lisas red
+		for points, color in ((face_points, (1.0, 1.0, 1.0)), (monalisa_points, (1.0, 0.0, 0.0))):
+			for d in points:
+
+				# no depth at the detection
+				if not np.isfinite(d).all():
+					continue
 
-			self.marker_pub.publish(marker)
-		
-		for x,y in self.monalisas:
-
-			# get 3-channel representation of the poitn cloud in numpy format
-			a = pc2.read_points_numpy(data, field_names= ("x", "y", "z"))
-			a = a.reshape((height,width,3))
-
-			# read center coordinates
-			d = a[y,x,:]
-
-			# create marker
-			marker = Marker()
-
-			marker.header.frame_id = "/base_link"
-			marker.header.stamp = data.header.stamp
-
-			marker.type = 2
-			marker.id = self.marker_id
-			self.marker_id += 1
-			marker.lifetime = Duration(sec=10000, nanosec=0)
-
-			# Set the scale of the marker
-			scale = 0.1
-			marker.scale.x = scale
-			marker.scale.y = scale
-			marker.scale.z = scale
-
-			# Set the color
-			marker.color.r = 1.0
-			marker.color.g = 0.0
-			marker.color.b = 0.0
-			marker.color.a = 1.0
-
-			# Set the pose of the marker
-			marker.pose.position.x = float(d[0])
-			marker.pose.position.y = float(d[1])
-			marker.pose.position.z = float(d[2])
-			
+				# create marker
+				marker = Marker()
+
+				marker.header.frame_id = "/base_link"
+				marker.header.stamp = stamp
+
+				marker.type = 2
+				with self.marker_lock:
+					marker.id = self.marker_id
+					self.marker_id += 1
+				marker.lifetime = Duration(sec=10000, nanosec=0)
+
+				# Set the scale of the marker
+				scale = 0.1
+				marker.scale.x = scale
+				marker.scale.y = scale
+				marker.scale.z = scale
+
+				# Set the color
+				marker.color.r = color[0]
+				marker.color.g = color[1]
+				marker.color.b = color[2]
+				marker.color.a = 1.0
+
+				# Set the pose of the marker
+				marker.pose.position.x = float(d[0])
+				marker.pose.position.y = float(d[1])
+				marker.pose.position.z = float(d[2])
+				
 
-			self.marker_pub.publish(marker)
+				self.marker_pub.publish(marker)
+				self.marker_delay.add((self.get_clock().now() - Time.from_msg(image_stamp)).nanoseconds * 1e-9)
 
 def main():
 	print('Face detection node starting.')
@@ -243,8 +315,12 @@ def main():
 	rclpy.init(args=None)
 	node = detect_faces()
 	rclpy.spin(node)
+	node.inference.stop()
+	node.debug_view.close()
 	node.destroy_node()
-	rclpy.shutdown()
+	# ESC in the image window already shut down rclpy
+	if rclpy.ok():
+		rclpy.shutdown()
 
 if __name__ == '__main__':
 	main()
@@ -9,17 +9,21 @@ from rclpy.node import Node
 from rclpy.qos import qos_profile_sensor_data, QoSReliabilityPolicy
 
 from sensor_msgs.msg import Image, PointCloud2
-from sensor_msgs_py import point_cloud2 as pc2
+from delta_perception.organized_cloud import OrganizedCloud
 from builtin_interfaces.msg import Duration
 
 import os
+import glob
 from visualization_msgs.msg import Marker
 
 from cv_bridge import CvBridge, CvBridgeError
 import cv2
 import numpy as np
 
-from ultralytics import YOLO
+from delta_perception.person_detector import load_person_detector
+from delta_perception.hash_index import HashIndex, hash_to_int
+from delta_perception.background_writer import BackgroundWriter
+from delta_perception.rect_pairing import find_rectangles, find_frame_candidates
 
 # from rclpy.parameter import Parameter
 # from rcl_interfaces.msg import SetParametersResult
@@ -34,6 +38,10 @@ class detect_faces(Node):
 			namespace='',
 			parameters=[
 				('device', ''),
+				('backend', 'torch'),
+				('backend_threads', 0),
+				('backend_int8', False),
+				('dedup_distance', 6),
 		])
 
 		marker_topic = "/people_marker"
@@ -49,7 +57,13 @@ class detect_faces(Node):
 
 		self.marker_pub = self.create_publisher(Marker, marker_topic, QoSReliabilityPolicy.BEST_EFFORT)
 
-		self.model = YOLO("yolov8n.pt")
+		# YOLO person detector on the selected backend (torch, onnxruntime or openvino)
+		self.detector = load_person_detector(
+			self.get_parameter('backend').get_parameter_value().string_value,
+			"yolov8n.pt",
+			device=self.device,
+			threads=self.get_parameter('backend_threads').get_parameter_value().integer_value,
+			int8=self.get_parameter('backend_int8').get_parameter_value().bool_value)
 
 		self.faces = []
 		self.monalisas = []
@@ -72,9 +86,40 @@ class detect_faces(Node):
 		self.dist_thresh = 50
 		self.save_path = "/home/delta/colcon_ws/src/dis-delta-team/data/monalisa/"
 		self.save_img_count = int(np.loadtxt(self.save_path + "img_count.txt")) + 1
-		self.hasher = cv2.img_hash.AverageHash_create()
-		self.already_saved = []
 
+		# perceptual hashes of the saved crops in a BK-tree, a crop within 'dedup_distance' bits of a saved
+		# one is a near duplicate and not saved. The index is kept next to the images.
+		self.hasher = cv2.img_hash.PHash_create()
+		self.dedup_distance = self.get_parameter('dedup_distance').get_parameter_value().integer_value
+		self.duplicates = 0
+		# images, index lines and the image count are written on this thread, not in the camera callback
+		self.writer = BackgroundWriter()
+		index_file = self.save_path + "phash_index.txt"
+		if os.path.exists(index_file):
+			self.hash_index = HashIndex(index_file, self.writer.submit)
+		else:
+			images = sorted(glob.glob(self.save_path + "mona_*.png"))
+			self.hash_index = HashIndex.build(index_file, images, self.hash_file, self.writer.submit)
+		self.get_logger().info(f"{len(self.hash_index)} saved images in the hash index {index_file}")
+		self.stats_timer = self.create_timer(30.0, self.log_stats)
+
+
+	def hash_image(self, image):
+		return hash_to_int(self.hasher.compute(image))
+
+	def hash_file(self, path):
+		image = cv2.imread(path)
+		return None if image is None else self.hash_image(image)
+
+	# runs on the writer thread
+	def save_image(self, filename, image, count):
+		if not cv2.imwrite(filename, image):
+			raise IOError(f"Could not write {filename}")
+		np.savetxt(self.save_path + "img_count.txt", [count], fmt="%d")
+
+	def log_stats(self):
+		self.get_logger().info(f"saved: {len(self.hash_index)}, near duplicates: {self.duplicates}, "
+			f"not in the index file: {self.hash_index.unsaved}, writer: {self.writer.stats()}")
 
 	def calculate_histogram(self, image):
 		hist = cv2.calcHist([image], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
@@ -97,7 +142,7 @@ class detect_faces(Node):
 			self.get_logger().info(f"Running inference on image...")
 
 			# run inference
-			res = self.model.predict(cv_image, imgsz=(256, 320), show=False, verbose=False, classes=[0], device=self.device)
+			boxes, _ = self.detector.detect(cv_image)
 
 
 			# extract contours and fit rectangles
@@ -114,53 +159,15 @@ class detect_faces(Node):
 				cv2.imshow("Detected contours", gray)
 				cv2.waitKey(1)
 
-			rectangles = []
-			for cnt in contours:
-				if cnt.shape[0] >= 20:
-					# (x,y,w,h) = cv2.boundingRect(cnt)
-					# cv2.rectangle(thresh, (x,y), (x+w,y+h), (0,255,0), 2)
-					# cv2.rectangle(cv_image, (x,y), (x+w,y+h), (0,255,0), 2)
-					# cv2.rectangle(gray, (x,y), (x+w,y+h), (0,255,0), 2)
-					approx = cv2.approxPolyDP(cnt, 0.01*cv2.arcLength(cnt, True), True)
-					if len(approx) == 4:
-						x, y, w, h = cv2.boundingRect(cnt)
-						rectangles.append((x, y, w, h))
-
-						# cv2.rectangle(thresh, (x,y), (x+w,y+h), (0,0,250), 2)
-						# cv2.rectangle(cv_image, (x,y), (x+w,y+h), (0,0,250), 2)
-						# cv2.rectangle(gray, (x,y), (x+w,y+h), (0,0,250), 2)
-			
+			# rectangles (4 corner polygons) and the larger of every nested pair, a painting has an inner and an outer frame
+			rectangles = find_rectangles(contours)
+
 			# debug
 			# cv2.putText(cv_image, f"num of rect.: {len(rectangles)}", (20, 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0 ,255), 1)
-			
-			
-			candidates = []
-			for n in range(len(rectangles)):
-				for m in range(n + 1, len(rectangles)):
-					
-					r1 = rectangles[n]
-					r2 = rectangles[m]
-					dist = np.sqrt(((r1[0] - r2[0]) ** 2 + (r1[1] - r2[1]) ** 2))
-
-					# if the two rectangles are not close enough, skip - ADJUST threshold based on image size
-					if dist >= self.dist_thresh or dist == 0:
-						continue
-
-					if r1[2]>=r2[2] and r1[3]>=r2[3]:
-						larger = r1
-						smaller = r2
-					elif r2[2]>=r1[2] and r2[3]>=r1[3]:
-						larger = r2
-						smaller = r1
-					else:
-						continue
-
-					# if smaller rectangle is much smaller than the bigger rectangle - ADJUST threshold based on image size
-					if smaller[2]/larger[2] < 0.8 or smaller[3]/larger[3] < 0.8:
-						continue
-						
-					candidates.append(larger)
-			
+
+			# ADJUST thresholds based on image size
+			candidates = find_frame_candidates(rectangles, self.dist_thresh)
+
 			# for n in range(len(rectangles)):
 			# 	r1 = rectangles[n]
 			# 	# print(f"r1: {r1}")
@@ -211,24 +218,17 @@ class detect_faces(Node):
 					cv2.waitKey(1)
 
 				# ... and save to file
-				# hash the image and keep a list of hashes to prevent saving duplicate images
-				img_hash = self.hasher.compute(cropped_image)
-				duplicate = False
-				for h in self.already_saved:
-					# print(img_hash, type(img_hash))
-					# print(h, type(h))
-					# print(np.array_equal(img_hash, h))
-					# print(self.already_saved)
-					if np.array_equal(img_hash, h):
-						duplicate = True
-						break
-				if not duplicate:
-					save_filename = self.save_path + "mona_" + str(self.save_img_count) + ".png"
-					save_status = cv2.imwrite(save_filename, cropped_image)
-					print(f"Save status for [{self.save_img_count}]: {save_status}")
-					# print(os.getcwd())
-					self.already_saved.append(img_hash)
-					np.savetxt(self.save_path + "img_count.txt", [self.save_img_count], fmt="%d")
+				# hash the image and look for a near duplicate among the saved images
+				img_hash = self.hash_image(cropped_image)
+				match = self.hash_index.find(img_hash, self.dedup_distance)
+				if match is not None:
+					self.duplicates += 1
+					continue
+				save_name = "mona_" + str(self.save_img_count) + ".png"
+				if self.writer.submit(self.save_image, self.save_path + save_name, cropped_image.copy(), self.save_img_count):
+					print(f"Saving [{self.save_img_count}]")
+					if not self.hash_index.add(img_hash, save_name):
+						self.get_logger().warn(f"{save_name} is missing in the hash index file, the writer queue is full")
 					self.save_img_count += 1
 
 
@@ -295,19 +295,12 @@ class detect_faces(Node):
 
 	def pointcloud_callback(self, data):
 
-		# get point cloud attributes
-		height = data.height
-		width = data.width
-		point_step = data.point_step
-		row_step = data.row_step		
+		# get 3-channel representation of the point cloud in numpy format, decoded once for all detections
+		a = OrganizedCloud(data).xyz
 
 		# iterate over face coordinates
 		for x,y in self.faces:
 
-			# get 3-channel representation of the poitn cloud in numpy format
-			a = pc2.read_points_numpy(data, field_names= ("x", "y", "z"))
-			a = a.reshape((height,width,3))
-
 			# read center coordinates
 			d = a[y,x,:]
 
@@ -344,10 +337,6 @@ class detect_faces(Node):
 		
 		for x,y in self.monalisas:
 
-			# get 3-channel representation of the poitn cloud in numpy format
-			a = pc2.read_points_numpy(data, field_names= ("x", "y", "z"))
-			a = a.reshape((height,width,3))
-
 			# read center coordinates
 			d = a[y,x,:]
 
@@ -387,7 +376,13 @@ def main():
 
 	rclpy.init(args=None)
 	node = detect_faces()
-	rclpy.spin(node)
+	try:
+		rclpy.spin(node)
+	except KeyboardInterrupt:
+		pass
+	# the images still in the queue are written before exiting
+	if not node.writer.stop():
+		print(f"Not all images were written before exiting ({node.writer.stats()})")
 	node.destroy_node()
 	rclpy.shutdown()
 
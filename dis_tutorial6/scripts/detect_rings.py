@@ -4,12 +4,7 @@ import rclpy
 from rclpy.node import Node
 import cv2
 import numpy as np
-from tf2_ros.buffer import Buffer
-from tf2_ros import TransformException
-from tf2_ros.transform_listener import TransformListener
 from rclpy.duration import Duration
-from geometry_msgs.msg import PointStamped
-import tf2_geometry_msgs as tfg
 
 from sensor_msgs.msg import Image
 from geometry_msgs.msg import PointStamped, Vector3, Pose
@@ -20,9 +15,18 @@ from rclpy.qos import QoSDurabilityPolicy, QoSHistoryPolicy
 from rclpy.qos import QoSProfile, QoSReliabilityPolicy
 
 from sensor_msgs.msg import Image, PointCloud2
-from sensor_msgs_py import point_cloud2 as pc2
+
+from delta_perception.ring_pairing import fit_ellipses, find_ring_candidates
+from delta_perception.ring_masks import make_ring_mask
+from delta_perception.organized_cloud import OrganizedCloud
+from delta_perception.sync import ApproximateTimeSynchronizer, stamp_to_sec
+from delta_perception.ring_tracker import RingTracker
+from delta_perception.debug_image import DebugView
+from delta_perception.frame_gate import FrameGate
+from delta_perception.transform_cache import TransformCache
 
 from visualization_msgs.msg import Marker
+from delta_interfaces.msg import RingObjects
 
 qos_profile = QoSProfile(
           durability=QoSDurabilityPolicy.TRANSIENT_LOCAL,
@@ -31,7 +35,7 @@ qos_profile = QoSProfile(
           depth=1)
 
 PCL_Z_THRESH = 0.25
-DIST_EXST_THRESH = 1
+RING_ASSOCIATION_DIST = 1.0
 WIDTH_DIFF_THRESH = 5
 
 def rgb_to_color_name(rgb):
@@ -54,7 +58,7 @@ class RingObject:
         self.center = center # center of the ring
         self.ref_point = ref_point
         self.ellipses = ellipses # the ellipses objects
-        self.masks = masks # ring mask, large mask, small (center) mask
+        self.masks = masks # RingMask with the ring mask, large mask and small (center) mask
         self.color_num = color_num # color of the ring - numeric
         self.color_name = color_name # name of the color of the ring
         self.corners = corners # bounding corners (left top and bottom right)
@@ -80,31 +84,75 @@ class RingDetector(Node):
         self.marker_array = MarkerArray()
         self.marker_num = 1
 
+        self.declare_parameters(
+            namespace='',
+            parameters=[
+                ('sync_queue_size', 10),
+                ('sync_slop', 0.1),
+                ('ring_association_dist', RING_ASSOCIATION_DIST),
+                ('ring_confirm_hits', 3),
+                ('ring_tentative_timeout', 5.0),
+        ])
+
+        # Image, depth and point cloud are matched by their timestamps and processed together
+        self.sync = ApproximateTimeSynchronizer(
+            3,
+            self.get_parameter('sync_queue_size').get_parameter_value().integer_value,
+            self.get_parameter('sync_slop').get_parameter_value().double_value)
+        self.sync.register_callback(self.synced_callback)
+
         # Subscribe to the image and/or depth topic
-        self.image_sub = self.create_subscription(Image, "/oakd/rgb/preview/image_raw", self.image_callback, 1)
-        self.depth_sub = self.create_subscription(Image, "/oakd/rgb/preview/depth", self.depth_callback, 1)
-        self.pcl_sub = self.create_subscription(PointCloud2, "/oakd/rgb/preview/depth/points", self.pcl_callback, 1)
+        self.image_sub = self.create_subscription(Image, "/oakd/rgb/preview/image_raw", self.sync.input(0), 1)
+        self.depth_sub = self.create_subscription(Image, "/oakd/rgb/preview/depth", self.sync.input(1), 1)
+        self.pcl_sub = self.create_subscription(PointCloud2, "/oakd/rgb/preview/depth/points", self.sync.input(2), 1)
+
+        # log how many frames were matched and dropped
+        self.sync_stats_timer = self.create_timer(10.0, self.log_sync_stats)
 
         self.marker_pub = self.create_publisher(Marker, marker_topic, QoSReliabilityPolicy.BEST_EFFORT)
 
         self.next_ring_id = 0
-        self.rings_candidates = []
-        self.rings_detected = []
+
+        # confirmed rings in the map frame, published as RingObjects
+        self.ring_tracker = RingTracker(
+            self.get_parameter('ring_association_dist').get_parameter_value().double_value,
+            self.get_parameter('ring_confirm_hits').get_parameter_value().integer_value,
+            self.get_parameter('ring_tentative_timeout').get_parameter_value().double_value)
+        self.ring_objects_pub = self.create_publisher(RingObjects, 'ring_objects', 1)
+        self.ring_objects_timer = self.create_timer(1.0, self.publish_ring_objects)
 
         # Publiser for the visualization markers
         # self.marker_pub = self.create_publisher(Marker, "/ring", QoSReliabilityPolicy.BEST_EFFORT)
 
         # Object we use for transforming between coordinate frames
-        self.tf_buffer = Buffer()
-        self.tf_listener = TransformListener(self.tf_buffer, self)
+        self.tf_cache = TransformCache(self)
+
+        # skips frames that look like the last processed one
+        self.frame_gate = FrameGate(self, 'Ring detector')
+
+        # OpenCV windows (not in headless mode) and the ~/debug_image topic
+        self.debug_view = DebugView(self)
+        self.debug_view.named_window("Binary Image")
+        self.debug_view.named_window("Detected contours")
+        self.debug_view.named_window("Detected rings")
+        self.debug_view.named_window("Depth window")
+        self.debug_view.named_window("Detected ring mask")
 
-        cv2.namedWindow("Binary Image", cv2.WINDOW_NORMAL)
-        cv2.namedWindow("Detected contours", cv2.WINDOW_NORMAL)
-        cv2.namedWindow("Detected rings", cv2.WINDOW_NORMAL)
-        cv2.namedWindow("Depth window", cv2.WINDOW_NORMAL)
-        cv2.namedWindow("Detected ring mask", cv2.WINDOW_NORMAL)
 
+    def synced_callback(self, image_data, depth_data, pcl_data):
+        # all three messages belong to the same frame
+        rings_candidates = self.image_callback(image_data)
+        if len(rings_candidates) > 0:
+            self.depth_callback(depth_data, rings_candidates)
+            self.pcl_callback(pcl_data, rings_candidates)
 
+        # tentative rings that were not seen again are forgotten
+        self.ring_tracker.expire(stamp_to_sec(image_data.header.stamp))
+
+    def log_sync_stats(self):
+        self.get_logger().info(f"Frame synchronization: {self.sync.stats()}")
+
+    # finds the ring candidates in the image and returns them
     def image_callback(self, data): #sig for use with ROS2
 
         # ROS2 overhead #
@@ -114,11 +162,16 @@ class RingDetector(Node):
             cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
         except CvBridgeError as e:
             print(e)
+            return []
         ################
 
-        blue = cv_image[:,:,0]
-        green = cv_image[:,:,1]
-        red = cv_image[:,:,2]
+        # nothing changed since the last processed frame
+        if not self.frame_gate.should_process(cv_image):
+            return []
+
+        # annotations are only drawn if somebody is watching, on a copy so they don't affect the colors
+        debug = self.debug_view.begin_frame()
+        vis_image = cv_image.copy() if debug else None
 
         # Tranform image to grayscale
         gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
@@ -134,74 +187,28 @@ class RingDetector(Node):
         #ret, thresh = cv2.threshold(img, 50, 255, 0)
         #ret, thresh = cv2.threshold(img, 70, 255, cv2.THRESH_BINARY)
         thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 15, 30)
-        cv2.imshow("Binary Image", thresh)
-        cv2.waitKey(1)
+        self.debug_view.show("Binary Image", thresh)
 
         # Extract contours
         contours, hierarchy = cv2.findContours(thresh, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
 
         # Example of how to draw the contours, only for visualization purposes
-        cv2.drawContours(gray, contours, -1, (255, 0, 0), 3)
-        cv2.imshow("Detected contours", gray)
-        cv2.waitKey(1)
+        if not self.debug_view.headless:
+            cv2.drawContours(gray, contours, -1, (255, 0, 0), 3)
+            self.debug_view.show("Detected contours", gray)
 
         # Fit elipses to all extracted contours
-        elps = []
-        for cnt in contours:
-            #     print cnt
-            #     print cnt.shape
-            if cnt.shape[0] >= 11:
-                ellipse = cv2.fitEllipse(cnt)
-                elps.append(ellipse)
-
+        elps = fit_ellipses(contours, 11)
 
         # Find two elipses with same centers
-        candidates = []
-        for n in range(len(elps)):
-            for m in range(n + 1, len(elps)):
-                # e[0] is the center of the ellipse (x,y), e[1] are the lengths of major and minor axis (major, minor), e[2] is the rotation in degrees
-                
-                e1 = elps[n]
-                e2 = elps[m]
-                dist = np.sqrt(((e1[0][0] - e2[0][0]) ** 2 + (e1[0][1] - e2[0][1]) ** 2))
-                angle_diff = np.abs(e1[2] - e2[2])
-
-                # The centers of the two elipses should be within 5 pixels of each other (is there a better treshold?)
-                if dist >= 5:
-                    continue
-
-                # The rotation of the elipses should be whitin 4 degrees of eachother
-                if angle_diff>4:
-                    continue
-
-                e1_minor_axis = e1[1][0]
-                e1_major_axis = e1[1][1]
-
-                e2_minor_axis = e2[1][0]
-                e2_major_axis = e2[1][1]
-
-                if e1_major_axis>=e2_major_axis and e1_minor_axis>=e2_minor_axis: # the larger ellipse should have both axis larger
-                    le = e1 # e1 is larger ellipse
-                    se = e2 # e2 is smaller ellipse
-                elif e2_major_axis>=e1_major_axis and e2_minor_axis>=e1_minor_axis:
-                    le = e2 # e2 is larger ellipse
-                    se = e1 # e1 is smaller ellipse
-                else:
-                    continue # if one ellipse does not contain the other, it is not a ring
-                
-                # # The widths of the ring along the major and minor axis should be roughly the same
-                # border_major = (le[1][1]-se[1][1])/2
-                # border_minor = (le[1][0]-se[1][0])/2
-                # border_diff = np.abs(border_major - border_minor)
-
-                # if border_diff>WIDTH_DIFF_THRESH:
-                #     continue
-                    
-                candidates.append((e1,e2))
+        # (centers within 5 pixels, rotation within 4 degrees, the larger ellipse has both axis larger)
+        candidates = find_ring_candidates(elps)
 
         # print("Processing is done! found", len(candidates), "candidates for rings")
 
-        vis_all_masks = np.zeros((cv_image.shape[0], cv_image.shape[1]))
+        rings_candidates = []
+        if debug:
+            vis_all_masks = np.zeros((cv_image.shape[0], cv_image.shape[1]), dtype=np.uint8)
 
         # Plot the rings on the image
         for c in candidates:
@@ -211,8 +218,9 @@ class RingDetector(Node):
             e2 = c[1]
 
             # drawing the ellipses on the image
-            cv2.ellipse(cv_image, e1, (0, 255, 0), 2)
-            cv2.ellipse(cv_image, e2, (0, 255, 0), 2)
+            if debug:
+                cv2.ellipse(vis_image, e1, (0, 255, 0), 2)
+                cv2.ellipse(vis_image, e2, (0, 255, 0), 2)
 
             # larger and smaller ellipse
             e1_minor_axis = e1[1][0]
@@ -230,15 +238,11 @@ class RingDetector(Node):
             else:
                 le = se = None
 
-            # ellipse masks
-            mask_large = np.zeros((cv_image.shape[0], cv_image.shape[1]))
-            cv2.ellipse(mask_large, le, 1, -1)
-            mask_small = np.zeros((cv_image.shape[0], cv_image.shape[1]))
-            cv2.ellipse(mask_small, se, 1, -1)
-
-            mask_ring = cv2.subtract(mask_large, mask_small)
+            # ellipse masks, only as large as the bounding box of the larger ellipse
+            ring_mask = make_ring_mask(le, se, cv_image.shape)
 
-            vis_all_masks += mask_ring
+            if debug:
+                ring_mask.paint(vis_all_masks)
 
 
             # Get a bounding box, around the first ellipse ('average' of both elipsis)
@@ -255,43 +259,44 @@ class RingDetector(Node):
             y_min = y1 if y1 > 0 else 0
             y_max = y2 if y2 < cv_image.shape[1] else cv_image.shape[1]
 
-            cv2.circle(cv_image, (y_min, x_min), radius=3, color=(255, 0, 0), thickness=-1)
-            cv2.circle(cv_image, (y_max, x_max), radius=3, color=(255, 0, 0), thickness=-1)
-            cv2.rectangle(cv_image, (y_min, x_min), (y_max, x_max), (0, 0, 250), 2)
+            if debug:
+                cv2.circle(vis_image, (y_min, x_min), radius=3, color=(255, 0, 0), thickness=-1)
+                cv2.circle(vis_image, (y_max, x_max), radius=3, color=(255, 0, 0), thickness=-1)
+                cv2.rectangle(vis_image, (y_min, x_min), (y_max, x_max), (0, 0, 250), 2)
 
             # print(f"\nDetected ring [{self.next_ring_id}] with center {center}")
 
             # colours
-            bool_mask = mask_ring.astype(bool)
-            average_color = np.mean(cv_image[bool_mask], axis=0)
+            average_color = ring_mask.mean_color(cv_image)
             avg_color_name = rgb_to_color_name(average_color)
             # print(f"Ring color: {avg_color_name} {average_color}")
             if(avg_color_name != "Unknown"):
                 pass
 
 
-            label = avg_color_name
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.6
-            font_color = (0, 0, 255)  # Red
-            thickness = 1
-            line_type = cv2.LINE_AA
-            text_x = x_min + 25
-            text_y = y_min - 100
-            cv2.putText(cv_image, label, (text_y, text_x), font, font_scale, font_color, thickness, line_type)
+            if debug:
+                label = avg_color_name
+                font = cv2.FONT_HERSHEY_SIMPLEX
+                font_scale = 0.6
+                font_color = (0, 0, 255)  # Red
+                thickness = 1
+                line_type = cv2.LINE_AA
+                text_x = x_min + 25
+                text_y = y_min - 100
+                cv2.putText(vis_image, label, (text_y, text_x), font, font_scale, font_color, thickness, line_type)
 
 
-            rows = np.where(mask_ring[int(center[0])::, int(center[1])] != 0)
+            rows = ring_mask.rows_below(int(center[0]), int(center[1]))
             ref_point = [np.median(rows), int(center[0])]
 
-            self.rings_candidates.append(
+            rings_candidates.append(
                 RingObject(
                     self.next_ring_id, #id
                     center, #center
                     ref_point,
                     ((y_min, x_min), (y_max, x_max)), #corners
                     c, #ellipses
-                    (mask_ring, mask_large, mask_small), #masks
+                    ring_mask, #masks
                     average_color,
                     avg_color_name
                 )
@@ -299,13 +304,15 @@ class RingDetector(Node):
             self.next_ring_id += 1
 
 
-        if len(candidates)>0:
-                cv2.imshow("Detected rings",cv_image)
-                cv2.imshow("Detected ring mask", vis_all_masks)
-                cv2.waitKey(1)
+        if debug:
+            self.debug_view.publish(vis_image, data.header)
+            if len(candidates)>0:
+                self.debug_view.show("Detected rings", vis_image)
+                self.debug_view.show("Detected ring mask", vis_all_masks)
 
+        return rings_candidates
 
-    def depth_callback(self,data):
+    def depth_callback(self, data, rings_candidates):
 
         try:
             depth_image = self.bridge.imgmsg_to_cv2(data, "32FC1")
@@ -324,54 +331,36 @@ class RingDetector(Node):
         #cv2.waitKey(1)
         
 
-        for ring_candidate in self.rings_candidates:
+        for ring_candidate in rings_candidates:
 
-            contains_inf = np.any(depth_image[ring_candidate.masks[2].astype(bool)]) # mask with inner mask of the ring and check if there is an infinite depth pixel
+            contains_inf = np.any(ring_candidate.masks.select(depth_image, 'small')) # mask with inner mask of the ring and check if there is an infinite depth pixel
             ring_candidate.hollow = contains_inf
 
             # print(f"Ring {ring_candidate.id} [{ring_candidate.center}] hollow is {contains_inf}")
     
-    def pcl_callback(self, data):
+    def pcl_callback(self, data, rings_candidates):
 
-        height = data.height
-        width = data.width
-        point_step = data.point_step
-        row_step = data.row_step
+        # decode the point cloud once for all ring candidates
+        cloud = OrganizedCloud(data)
+        pcl = cloud.xyz
 
-        for ring_candidate in self.rings_candidates:
-            x_min, y_min = ring_candidate.corners[0]
-            x_max, y_max = ring_candidate.corners[1]
+        rings_on_frame = []
 
+        for ring_candidate in rings_candidates:
             x, y = ring_candidate.center
             y, x = int(y), int(x)
 
-            pcl = pc2.read_points_numpy(data, field_names=("x", "y", "z"))
-            pcl = pcl.reshape((height, width, 3))
-
-            y = min(y, pcl.shape[0] - 1)
-            x = min(x, pcl.shape[1] - 1)
-
-            pcl_center = pcl[y, x, :]
+            pcl_center = cloud.at(y, x)
 
             if np.isinf(pcl_center).any():
                 ring_candidate.hollow = True
             else: continue
 
-            x_min = int(x_min + 0.1 * x_min)
-            y_min = int(y_min + 0.1 * y_min)
-            x_max = int(x_max + 0.1 * x_max)
-            y_max = int(y_max + 0.1 * y_max)
-
-            x_min = max(x_min, 0)
-            y_min = max(y_min, 0)
-            x_max = min(x_max, width - 1)
-            y_max = min(y_max, height - 1)
-
-            # Extract the point cloud data within the bounding box
-            region_pcl = pcl[y_min:y_max + 1, x_min:x_max + 1, :]
+            # Extract the point cloud data under the ring mask
+            region_pcl = ring_candidate.masks.select(pcl, 'ring')
 
             # Filter out points with z as inf or 0
-            valid_points = region_pcl[(region_pcl[:, :, 2] != np.inf) & (region_pcl[:, :, 2] != 0)]
+            valid_points = region_pcl[(region_pcl[:, 2] != np.inf) & (region_pcl[:, 2] != 0)]
             
             if valid_points.size == 0:
                 continue
@@ -380,86 +369,69 @@ class RingDetector(Node):
 
             ring_candidate.pcl_coords = closest_point
 
-            newring = False
-
             if closest_point[2] > PCL_Z_THRESH and ring_candidate.hollow:
-                for det_ring in self.rings_detected:
-                    distance = np.linalg.norm(
-                        ring_candidate.pcl_coords 
-                        - 
-                        det_ring.pcl_coords
-                    )
-
-                    print(f"Distance between {ring_candidate.pcl_coords} and {det_ring.pcl_coords} is {distance}")
-
-                    if not np.isinf(distance) and not np.isnan(distance) and distance > DIST_EXST_THRESH:
-                        self.rings_detected.append(ring_candidate)
-                        newring = True
-                        print(f"Confirmed ring {ring_candidate.id} with: \n\t center: {ring_candidate.center} \n\t color: {ring_candidate.color_name} {ring_candidate.color_num} \n\t hollow: {ring_candidate.hollow} \n\t pcl coords: {ring_candidate.pcl_coords}")
-                    else:
-                        if ring_candidate.color_name == "Unknown": continue
-                        elif ring_candidate.color_name not in det_ring.color_voting.keys():
-                            det_ring.color_voting[ring_candidate.color_name] = 1
-                        else:
-                            det_ring.color_voting[ring_candidate.color_name] += 1
-                    
-                if len(self.rings_detected) == 0:
-                    if ring_candidate.color_name != "Unknown":
-                        ring_candidate.color_voting[ring_candidate.color_name] = 1
-                    self.rings_detected.append(ring_candidate)
-                    newring = True
-                    print(f"Confirmed ring {ring_candidate.id} with: \n\t center: {ring_candidate.center} \n\t color: {ring_candidate.color_name} {ring_candidate.color_num} \n\t hollow: {ring_candidate.hollow} \n\t pcl coords: {ring_candidate.pcl_coords}")
-
-
-                if newring:
-                    print("putting ring on map", ring_candidate.color_num)
-                    time_now = rclpy.time.Time()
-                    timeout = rclpy.duration.Duration(seconds=0.1)
-
-                    point_on_ring = PointStamped()
-                    point_on_ring.header.frame_id = "/base_link"
-                    point_on_ring.header.stamp = time_now.to_msg()
-                    point_on_ring.point.x = float(closest_point[0])
-                    point_on_ring.point.y = float(closest_point[1])
-                    point_on_ring.point.z = float(closest_point[2])
-
-                    try:
-                        trans = self.tf_buffer.lookup_transform("map", "base_link", time_now, timeout)
-                        point_in_map_frame = tfg.do_transform_point(point_on_ring, trans)
-                        map_frame_x = point_in_map_frame.point.x
-                        map_frame_y = point_in_map_frame.point.y
-                        map_frame_z = point_in_map_frame.point.z
-                    except TransformException as te:
-                        self.get_logger().info(f"Cound not get the transform: {te}")
-                        return
-                    
-                    marker = Marker()
-                    marker.header.frame_id = "map"
-                    marker.header.stamp = self.get_clock().now().to_msg()
-                    marker.type = Marker.SPHERE
-                    marker.id = ring_candidate.id
-
-                    marker.scale.x = 0.1
-                    marker.scale.y = 0.1
-                    marker.scale.z = 0.1
-
-                    marker.color.r = 0.0
-                    marker.color.g = 0.0
-                    marker.color.b = 1.0
-                    marker.color.a = 1.0
-
-                    marker.pose.position.x = float(map_frame_x)
-                    marker.pose.position.y = float(map_frame_y)
-                    marker.pose.position.z = float(map_frame_z)
-
-                    self.marker_pub.publish(marker)
-                    newring = False
-
-        self.rings_candidates = []
+                rings_on_frame.append(ring_candidate)
+
+        if len(rings_on_frame) > 0:
+            self.track_rings(rings_on_frame, data.header.stamp)
+
+    # associates the rings of one frame with the ring tracks in the map frame, using the transform
+    # at the time of the frame for all of its rings
+    def track_rings(self, rings, header_stamp):
+        robot_points = np.array([ring_candidate.pcl_coords[:3] for ring_candidate in rings], dtype=np.float64)
+        map_points = self.tf_cache.transform_points(robot_points, "map", "base_link", header_stamp)
+        if map_points is None:
+            return
+        stamp = stamp_to_sec(header_stamp)
+
+        updated = False
+        for ring_candidate, map_point in zip(rings, map_points.tolist()):
+            track, newly_confirmed = self.ring_tracker.update(map_point, ring_candidate.color_name, stamp)
+            if track is None or not track.confirmed:
+                continue
+
+            if newly_confirmed:
+                print(f"Confirmed ring {track.id} with: \n\t color: {track.color} {track.color_votes} \n\t hits: {track.hits} \n\t map coords: {track.position}")
+
+            self.publish_ring_marker(track)
+            updated = True
+
+        if updated:
+            self.publish_ring_objects()
+
+    def publish_ring_marker(self, track):
+        marker = Marker()
+        marker.header.frame_id = "map"
+        marker.header.stamp = self.get_clock().now().to_msg()
+        marker.type = Marker.SPHERE
+        marker.id = track.id
+
+        marker.scale.x = 0.1
+        marker.scale.y = 0.1
+        marker.scale.z = 0.1
+
+        marker.color.r = 0.0
+        marker.color.g = 0.0
+        marker.color.b = 1.0
+        marker.color.a = 1.0
 
+        marker.pose.position.x = float(track.position[0])
+        marker.pose.position.y = float(track.position[1])
+        marker.pose.position.z = float(track.position[2])
 
+        self.marker_pub.publish(marker)
 
+    # publishes all confirmed rings
+    def publish_ring_objects(self):
+        tracks = self.ring_tracker.confirmed()
 
+        msg = RingObjects()
+        msg.position_x = [float(t.position[0]) for t in tracks]
+        msg.position_y = [float(t.position[1]) for t in tracks]
+        msg.position_z = [float(t.position[2]) for t in tracks]
+        msg.color = [t.color.lower() for t in tracks]
+        msg.id = ["ring_" + str(t.id) for t in tracks]
+        self.ring_objects_pub.publish(msg)
 
 
 def main():
@@ -469,7 +441,7 @@ def main():
 
     rclpy.spin(rd_node)
 
-    cv2.destroyAllWindows()
+    rd_node.debug_view.close()
 
 
 if __name__ == '__main__':
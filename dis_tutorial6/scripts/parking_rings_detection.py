@@ -4,12 +4,7 @@ import rclpy
 from rclpy.node import Node
 import cv2
 import numpy as np
-from tf2_ros.buffer import Buffer
-from tf2_ros import TransformException
-from tf2_ros.transform_listener import TransformListener
 from rclpy.duration import Duration
-from geometry_msgs.msg import PointStamped
-import tf2_geometry_msgs as tfg
 
 from sensor_msgs.msg import Image
 from geometry_msgs.msg import PointStamped, Vector3, Pose
@@ -20,7 +15,12 @@ from rclpy.qos import QoSDurabilityPolicy, QoSHistoryPolicy
 from rclpy.qos import qos_profile_sensor_data, QoSProfile, QoSReliabilityPolicy
 from std_msgs.msg import String
 from sensor_msgs.msg import Image, PointCloud2
-from sensor_msgs_py import point_cloud2 as pc2
+
+from delta_perception.ring_pairing import fit_ellipses, find_ring_candidates
+from delta_perception.organized_cloud import OrganizedCloud
+from delta_perception.debug_image import DebugView
+from delta_perception.frame_gate import FrameGate
+from delta_perception.transform_cache import TransformCache
 
 qos_profile = QoSProfile(
           durability=QoSDurabilityPolicy.TRANSIENT_LOCAL,
@@ -67,29 +67,37 @@ class RingDetector(Node):
         self.marker_pub = self.create_publisher(Marker, "/parking", QoSReliabilityPolicy.BEST_EFFORT)
 
         # Object we use for transforming between coordinate frames
-        self.tf_buffer = Buffer()
-        self.tf_listener = TransformListener(self.tf_buffer, self)
+        self.tf_cache = TransformCache(self)
+
+        # skips frames that look like the last processed one
+        self.frame_gate = FrameGate(self, 'Parking detector')
 
-        #cv2.namedWindow("Binary Image", cv2.WINDOW_NORMAL)
-        cv2.namedWindow("Detected contours", cv2.WINDOW_NORMAL)
-        cv2.namedWindow("Detected rings", cv2.WINDOW_NORMAL)
-        #cv2.namedWindow("Depth window", cv2.WINDOW_NORMAL)    
+        # OpenCV windows (not in headless mode) and the ~/debug_image topic
+        self.debug_view = DebugView(self)
+        #self.debug_view.named_window("Binary Image")
+        self.debug_view.named_window("Detected contours")
+        self.debug_view.named_window("Detected rings")
+        #self.debug_view.named_window("Depth window")
 
         self.parkings = []    
 
     def image_callback(self, data):
         self.get_logger().info(f"I got a new image! Will try to find rings...")
 
-        self.parkings = []
-
         try:
             cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
         except CvBridgeError as e:
             print(e)
+            return
+
+        # nothing changed since the last processed frame, the parkings found in it are still valid
+        if not self.frame_gate.should_process(cv_image):
+            return
+
+        self.parkings = []
 
-        blue = cv_image[:,:,0]
-        green = cv_image[:,:,1]
-        red = cv_image[:,:,2]
+        # annotations are only drawn if somebody is watching
+        debug = self.debug_view.begin_frame()
 
         # Tranform image to grayscale
         gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
@@ -105,70 +113,22 @@ class RingDetector(Node):
         #ret, thresh = cv2.threshold(img, 50, 255, 0)
         #ret, thresh = cv2.threshold(img, 70, 255, cv2.THRESH_BINARY)
         thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 15, 30)
-        #cv2.imshow("Binary Image", thresh)
-        cv2.waitKey(1)
+        #self.debug_view.show("Binary Image", thresh)
 
         # Extract contours
         contours, hierarchy = cv2.findContours(thresh, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
 
         # Example of how to draw the contours, only for visualization purposes
-        cv2.drawContours(gray, contours, -1, (0, 255, 0), 3)
-        cv2.imshow("Detected contours", gray)
-        cv2.waitKey(1)
+        if not self.debug_view.headless:
+            cv2.drawContours(gray, contours, -1, (0, 255, 0), 3)
+            self.debug_view.show("Detected contours", gray)
 
         # Fit elipses to all extracted contours
-        elps = []
-        for cnt in contours:
-            #     print cnt
-            #     print cnt.shape
-            if cnt.shape[0] >= 15:
-                ellipse = cv2.fitEllipse(cnt)
-                elps.append(ellipse)
-
+        elps = fit_ellipses(contours, 15)
 
         # Find two elipses with same centers
-        candidates = []
-        for n in range(len(elps)):
-            for m in range(n + 1, len(elps)):
-                # e[0] is the center of the ellipse (x,y), e[1] are the lengths of major and minor axis (major, minor), e[2] is the rotation in degrees
-                
-                e1 = elps[n]
-                e2 = elps[m]
-                dist = np.sqrt(((e1[0][0] - e2[0][0]) ** 2 + (e1[0][1] - e2[0][1]) ** 2))
-                angle_diff = np.abs(e1[2] - e2[2])
-
-                # The centers of the two elipses should be within 5 pixels of each other (is there a better treshold?)
-                if dist >= 5:
-                    continue
-
-                # The rotation of the elipses should be whitin 4 degrees of eachother
-                if angle_diff>4:
-                    continue
-
-                e1_minor_axis = e1[1][0]
-                e1_major_axis = e1[1][1]
-
-                e2_minor_axis = e2[1][0]
-                e2_major_axis = e2[1][1]
-
-                if e1_major_axis>=e2_major_axis and e1_minor_axis>=e2_minor_axis: # the larger ellipse should have both axis larger
-                    le = e1 # e1 is larger ellipse
-                    se = e2 # e2 is smaller ellipse
-                elif e2_major_axis>=e1_major_axis and e2_minor_axis>=e1_minor_axis:
-                    le = e2 # e2 is larger ellipse
-                    se = e1 # e1 is smaller ellipse
-                else:
-                    continue # if one ellipse does not contain the other, it is not a ring
-                
-                # # The widths of the ring along the major and minor axis should be roughly the same
-                # border_major = (le[1][1]-se[1][1])/2
-                # border_minor = (le[1][0]-se[1][0])/2
-                # border_diff = np.abs(border_major - border_minor)
-
-                # if border_diff>4:
-                #     continue
-                    
-                candidates.append((e1,e2))
+        # (centers within 5 pixels, rotation within 4 degrees, the larger ellipse has both axis larger)
+        candidates = find_ring_candidates(elps)
 
         print("Processing is done! found", len(candidates), "candidates for rings")
 
@@ -180,8 +140,9 @@ class RingDetector(Node):
             e2 = c[1]
 
             # drawing the ellipses on the image
-            cv2.ellipse(cv_image, e1, (0, 255, 0), 2)
-            cv2.ellipse(cv_image, e2, (0, 255, 0), 2)
+            if debug:
+                cv2.ellipse(cv_image, e1, (0, 255, 0), 2)
+                cv2.ellipse(cv_image, e2, (0, 255, 0), 2)
 
             # Get a bounding box, around the first ellipse ('average' of both elipsis)
             size = (e1[1][0]+e1[1][1])/2
@@ -200,13 +161,18 @@ class RingDetector(Node):
             self.parkings.append(intcenter)
 
 
-        if len(candidates)>0:
-                cv2.imshow("Detected rings",cv_image)
-                cv2.waitKey(1)
+        if debug:
+            self.debug_view.publish(cv_image, data.header)
+            if len(candidates)>0:
+                self.debug_view.show("Detected rings", cv_image)
 
 
     def depth_callback(self,data):
 
+        # the depth image is only used for visualization
+        if self.debug_view.headless:
+            return
+
         try:
             depth_image = self.bridge.imgmsg_to_cv2(data, "32FC1")
         except CvBridgeError as e:
@@ -220,59 +186,27 @@ class RingDetector(Node):
 
         image_viz = np.array(image_1, dtype= np.uint8)
 
-        #cv2.imshow("Depth window", image_viz)
-        cv2.waitKey(1)
+        #self.debug_view.show("Depth window", image_viz)
 
 
     def pointcloud_callback(self, data):
 
-            # get point cloud attributes
-            height = data.height
-            width = data.width
-            point_step = data.point_step
-            row_step = data.row_step		
+            # decode the point cloud once for all parking rings
+            point_cloud = OrganizedCloud(data)
 
             # iterate over face coordinates
             for x,y in self.parkings:
 
-                # get 3-channel representation of the poitn cloud in numpy format
-                point_cloud = pc2.read_points_numpy(data, field_names= ("x", "y", "z"))
-                point_cloud = point_cloud.reshape((height,width,3))
-
                 # read center coordinates
-                point = point_cloud[x,y,:]
+                point = point_cloud.at(x, y)
                 #point = point_cloud[min(y,239),x,:]
 
-                time_now = rclpy.time.Time()
-
-                point_in_arm_camera_frame = PointStamped()
-                point_in_arm_camera_frame.header.frame_id = "/top_camera_link"
-                point_in_arm_camera_frame.header.stamp = time_now.to_msg()
-                point_in_arm_camera_frame.point.x = float(point[0])
-                point_in_arm_camera_frame.point.y = float(point[1])
-                point_in_arm_camera_frame.point.z = float(point[2])
-            
-                
-                
-                timeout = rclpy.duration.Duration(seconds=0.1)
-                
-                
-                #point_in_robot_frame = PointStamped()
-                #point_in_robot_frame.header.frame_id = "/top_camera_link"
-                #point_in_robot_frame.header.stamp = header_stamp
-                #point_in_robot_frame.point.x = robot_frame_x
-                #point_in_robot_frame.point.y = robot_frame_y
-                #point_in_robot_frame.point.z = robot_frame_z
-
-                try:
-                    trans = self.tf_buffer.lookup_transform("map", "top_camera_link", time_now, timeout)
-                    point_in_map_frame = tfg.do_transform_point(point_in_arm_camera_frame, trans)
-                    map_frame_x = point_in_map_frame.point.x
-                    map_frame_y = point_in_map_frame.point.y
-                    map_frame_z = point_in_map_frame.point.z
-                except TransformException as te:
-                    self.get_logger().info(f"Cound not get the transform: {te}")
+                # transform of the time the cloud was taken, looked up once per cloud
+                map_point = self.tf_cache.transform_point(float(point[0]), float(point[1]), float(point[2]),
+                                                          "map", "top_camera_link", data.header.stamp)
+                if map_point is None:
                     return
+                map_frame_x, map_frame_y, map_frame_z = map_point
                     
                 if float(map_frame_z ) > 0.1:
                     return
@@ -333,7 +267,7 @@ def main():
 
     rclpy.spin(rd_node)
 
-    cv2.destroyAllWindows()
+    rd_node.debug_view.close()
 
 
 if __name__ == '__main__':
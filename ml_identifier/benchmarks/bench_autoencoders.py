@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Size, CPU latency and REAL/FAKE separation of the Mona Lisa autoencoders.
+# "weights" is the number of parameters, "memory" the size of the weights plus the peak of the NumPy
+# allocations of one forward pass (tracemalloc, NumPy models only). The latency is per crop, for single
+# crops and for a batch of --batch crops (the node classifies classification_frames crops at once).
+# The separation is measured on the labeled images of calibrate_threshold: median error of the real and
+# the fake paintings, ROC AUC and the accuracy at the Youden threshold.
+# Models that do not exist or cannot be loaded are skipped, the SavedModel only runs if TensorFlow is installed.
+#
+# run from the workspace source directory (src/dis-delta-team) with:
+#   python3 ml_identifier/benchmarks/bench_autoencoders.py [--model NAME=PATH ...]
+
+import argparse
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from ml_identifier.calibrate_threshold import DEFAULT_LABELS, calibrate, parse_source, prepare_image, read_labels
+from ml_identifier.numpy_autoencoder import load_autoencoder
+from ml_identifier.train_autoencoder import keras_module
+
+DEFAULT_MODELS = (
+    'saved_model=anomaly_detection/anomaly_detection_model',
+    'dense=anomaly_detection/anomaly_detection_model.npz',
+    'conv=anomaly_detection/conv_autoencoder.npz',
+)
+# held out images only, the training images would favour the model that overfits most
+DEFAULT_SOURCES = (
+    'anomaly_detection/dataset/test_raw:camera',
+    'anomaly_detection/dataset/test:prepared',
+)
+
+
+# the Keras SavedModel with the interface of the NumPy autoencoders
+class KerasAutoencoder:
+
+    def __init__(self, path):
+        self.model = keras_module().models.load_model(path)
+
+    def weights(self):
+        return [w.numpy() for w in self.model.weights]
+
+    def reconstruct(self, images):
+        return self.model(np.asarray(images, dtype=np.float32)).numpy()
+
+    def reconstruction_errors(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        diff = (self.reconstruct(images) - images).reshape(len(images), -1)
+        return np.mean(diff * diff, axis=1)
+
+
+def load(path):
+    if os.path.isdir(path):
+        return KerasAutoencoder(path)
+    return load_autoencoder(path)
+
+
+def latency_per_crop(model, crops, repeats):
+    model.reconstruction_errors(crops)    # warm up
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model.reconstruction_errors(crops)
+        times.append(time.perf_counter() - t0)
+    return np.median(times) / len(crops)
+
+
+def forward_peak_bytes(model, crop):
+    tracemalloc.start()
+    model.reconstruction_errors(crop)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def labeled_crops(sources, labels_path):
+    file_labels = read_labels(labels_path)
+    crops, labels = [], []
+    for directory, mode, label in sources:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.endswith('.png'):
+                continue
+            crop = prepare_image((path, mode))
+            if crop is not None:
+                crops.append(crop)
+                labels.append(file_labels.get(os.path.normpath(os.path.abspath(path)), label))
+    return np.array(crops), np.array(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', action='append', help='NAME=PATH of an .npz or a SavedModel, can be repeated')
+    parser.add_argument('--source', action='append', type=parse_source, help='labeled images, like calibrate_threshold')
+    parser.add_argument('--labels', default=DEFAULT_LABELS)
+    parser.add_argument('--batch', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    sources = args.source or [parse_source(s) for s in DEFAULT_SOURCES]
+    crops, labels = labeled_crops(sources, args.labels)
+    print('%d labeled crops (%d real, %d fake), batch %d' % (
+        len(crops), np.sum(labels == 'real'), np.sum(labels == 'fake'), args.batch))
+
+    print('%-12s | %9s %9s | %9s %9s | %10s %10s %6s %6s' % (
+        'model', 'weights', 'memory', '1 [ms]', 'batch [ms]', 'real med', 'fake med', 'auc', 'acc'))
+    for spec in args.model or DEFAULT_MODELS:
+        name, path = spec.split('=', 1)
+        if not os.path.exists(path):
+            print('%-12s | skipped (no %s)' % (name, path))
+            continue
+        try:
+            model = load(path)
+        except Exception as e:
+            # TensorFlow missing or a SavedModel without its variables (git lfs)
+            print('%-12s | skipped (%s: %s)' % (name, type(e).__name__, e))
+            continue
+
+        weights = model.weights()
+        n_weights = sum(w.size for w in weights)
+        weight_bytes = sum(w.nbytes for w in weights)
+        memory = weight_bytes + (0 if isinstance(model, KerasAutoencoder) else forward_peak_bytes(model, crops[:1]))
+        single = latency_per_crop(model, crops[:1], args.repeats)
+        batch = latency_per_crop(model, crops[:args.batch], args.repeats)
+
+        errors = model.reconstruction_errors(crops)
+        result = calibrate(errors, labels)
+        auc, accuracy = (result['roc_auc'], result['accuracy']) if result else (float('nan'), float('nan'))
+        print('%-12s | %9d %7.1fMB | %9.3f %9.3f | %10.5f %10.5f %6.3f %6.3f' % (
+            name, n_weights, memory / 2**20, single * 1e3, batch * 1e3,
+            np.median(errors[labels == 'real']), np.median(errors[labels == 'fake']), auc, accuracy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from ml_identifier.numpy_autoencoder import load_autoencoder
+from ml_identifier.preprocessing import color_prepare, size_prepare
+
+
+# Calibrates real_ml_thresh of the ml_identifier node.
+# Every source is a directory of images with a preprocessing mode:
+#   camera    camera image through color_prepare(test=True) + size_prepare, like the node does
+#   train     rgb image through color_prepare(test=False) + size_prepare, like the training set
+#   prepared  already prepared 128x128 image, only scaled to [0, 1]
+# and the label of its images ("real", "fake", "training" or "unlabeled"), a labels csv overrides it
+# per image. Only the "real" and "fake" images take part in the ROC and the threshold selection, the
+# images the autoencoder was trained on ("training") are only reported as a separate group, they
+# have lower errors than any new painting and would pull the threshold down.
+# The images are prepared in a process pool and scored in batches. The threshold file only has the
+# threshold with the best Youden index (highest TPR - FPR, with "fake" as positive class) and its
+# scores. With --report the full report is written as well: reconstruction error distributions,
+# ROC and PR curves and the throughput. It is not kept in git, regenerate it with e.g.
+#   ros2 run ml_identifier calibrate_threshold --report /tmp/report.json
+#
+# run from the workspace source directory (src/dis-delta-team) with:
+#   ros2 run ml_identifier calibrate_threshold
+# the node loads the threshold file written next to the weights of the autoencoder it uses at startup
+
+DEFAULT_SOURCES = [
+	'data/monalisa:train:training',
+	'anomaly_detection/dataset/test_raw:camera',
+	'anomaly_detection/dataset/test:prepared',
+]
+LABELS = ('real', 'fake', 'training', 'unlabeled')
+DEFAULT_LABELS = 'anomaly_detection/dataset/labels.csv'
+DEFAULT_WEIGHTS = 'anomaly_detection/conv_autoencoder.npz'
+RESOLUTION = 128
+BATCH_SIZE = 64
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+THRESHOLD_KEYS = ('weights', 'created', 'threshold', 'method', 'tpr', 'fpr', 'accuracy', 'roc_auc',
+	'average_precision', 'best_f1')
+
+
+# the default threshold file of the weights 'weights_path'
+def threshold_path(weights_path):
+	return os.path.splitext(weights_path)[0] + '_threshold.json'
+
+
+# loads and prepares one image, returns None if it could not be prepared
+def prepare_image(job):
+	path, mode = job
+	image = cv2.imread(path)
+	if image is None:
+		return None
+	try:
+		rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+		if mode == 'camera':
+			prepared = size_prepare(color_prepare(rgb, test=True), RESOLUTION)
+		elif mode == 'train':
+			prepared = size_prepare(color_prepare(rgb), RESOLUTION)
+		else:
+			prepared = rgb / 255
+	except Exception:
+		# e.g. the painting was not found by color_prepare
+		return None
+	return prepared.astype(np.float32)
+
+
+def write_json(path, data):
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	with open(path, 'w') as f:
+		json.dump(data, f, indent=2)
+		f.write('\n')
+
+
+def parse_source(spec):
+	parts = spec.split(':')
+	if len(parts) not in (2, 3) or parts[1] not in ('camera', 'train', 'prepared') or parts[2:3] and parts[2] not in LABELS:
+		raise argparse.ArgumentTypeError(f"source must be PATH:camera|train|prepared[:real|fake|training], got '{spec}'")
+	return parts[0], parts[1], parts[2] if len(parts) == 3 else 'unlabeled'
+
+
+def read_labels(path):
+	labels = {}
+	if path is None or not os.path.exists(path):
+		return labels
+	base = os.path.dirname(os.path.abspath(path))
+	with open(path) as f:
+		for row in csv.DictReader(f):
+			labels[os.path.normpath(os.path.join(base, row['image']))] = row['label']
+	return labels
+
+
+def distribution(errors):
+	if len(errors) == 0:
+		return {'count': 0}
+	return {
+		'count': int(len(errors)),
+		'mean': float(np.mean(errors)),
+		'std': float(np.std(errors)),
+		'min': float(np.min(errors)),
+		'max': float(np.max(errors)),
+		'percentiles': {str(p): float(v) for p, v in zip(PERCENTILES, np.percentile(errors, PERCENTILES))},
+	}
+
+
+# ROC and PR curves of the rule "fake if error > threshold", one point per distinct error
+def curves(errors, is_fake):
+	order = np.argsort(-errors, kind='stable')
+	errors, is_fake = errors[order], is_fake[order]
+	tp = np.cumsum(is_fake)
+	fp = np.cumsum(~is_fake)
+	last = np.r_[np.nonzero(np.diff(errors))[0], len(errors) - 1]
+	tp, fp, lowest_fake = tp[last], fp[last], errors[last]
+
+	# a threshold half way to the next lower error classifies exactly these as fake
+	next_lower = np.r_[errors[last[:-1] + 1], 0.0]
+	thresholds = (lowest_fake + next_lower) / 2
+
+	positives, negatives = tp[-1], fp[-1]
+	tpr = tp / positives
+	fpr = fp / negatives
+	precision = tp / (tp + fp)
+
+	roc_x, roc_y = np.r_[0.0, fpr], np.r_[0.0, tpr]
+	auc = float(np.sum(np.diff(roc_x) * (roc_y[1:] + roc_y[:-1]) / 2))
+	average_precision = float(np.sum(np.diff(np.r_[0.0, tpr]) * precision))
+	return thresholds, tpr, fpr, precision, auc, average_precision
+
+
+# the threshold from the held out "real" and "fake" images, the other labels are ignored
+def calibrate(errors, labels):
+	labeled = (labels == 'real') | (labels == 'fake')
+	errors, is_fake = errors[labeled], labels[labeled] == 'fake'
+	if is_fake.all() or not is_fake.any():
+		return None
+
+	thresholds, tpr, fpr, precision, auc, average_precision = curves(errors, is_fake)
+	best = int(np.argmax(tpr - fpr))
+	f1 = 2 * precision * tpr / np.maximum(precision + tpr, 1e-12)
+	best_f1 = int(np.argmax(f1))
+	return {
+		'threshold': float(thresholds[best]),
+		'method': 'youden',
+		'tpr': float(tpr[best]),
+		'fpr': float(fpr[best]),
+		'accuracy': float(np.mean((errors > thresholds[best]) == is_fake)),
+		'roc_auc': auc,
+		'average_precision': average_precision,
+		'best_f1': {'threshold': float(thresholds[best_f1]), 'f1': float(f1[best_f1]),
+			'precision': float(precision[best_f1]), 'recall': float(tpr[best_f1])},
+		'roc': {'fpr': fpr.tolist(), 'tpr': tpr.tolist(), 'thresholds': thresholds.tolist()},
+		'pr': {'precision': precision.tolist(), 'recall': tpr.tolist(), 'thresholds': thresholds.tolist()},
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Calibrate the Mona Lisa anomaly threshold")
+	parser.add_argument('--source', action='append', type=parse_source,
+		help="PATH:camera|train|prepared[:real|fake|training], can be repeated (default: %s)" % ' '.join(DEFAULT_SOURCES))
+	parser.add_argument('--labels', default=DEFAULT_LABELS, help="csv with image,label rows, paths relative to the csv")
+	parser.add_argument('--weights', default=DEFAULT_WEIGHTS)
+	parser.add_argument('--output', help="threshold file, default: <weights>_threshold.json")
+	parser.add_argument('--report', help="also write the full report (distributions, ROC and PR curves) here")
+	parser.add_argument('--workers', type=int, default=os.cpu_count())
+	args = parser.parse_args()
+	output = args.output or threshold_path(args.weights)
+
+	sources = args.source or [parse_source(s) for s in DEFAULT_SOURCES]
+	file_labels = read_labels(args.labels)
+	autoencoder = load_autoencoder(args.weights, os.path.splitext(args.weights)[0])
+
+	paths, modes, labels, source_names = [], [], [], []
+	for directory, mode, label in sources:
+		for path in sorted(glob.glob(os.path.join(directory, '*.png'))):
+			paths.append(path)
+			modes.append(mode)
+			# the training images stay a group of their own whatever the csv says
+			if label != 'training':
+				label = file_labels.get(os.path.normpath(os.path.abspath(path)), label)
+			labels.append(label)
+			source_names.append(directory)
+	print(f"Scoring {len(paths)} images from {len(sources)} sources with {args.workers} workers")
+
+	t_start = time.perf_counter()
+	with ProcessPoolExecutor(args.workers) as pool:
+		prepared = list(pool.map(prepare_image, zip(paths, modes), chunksize=16))
+	t_prepared = time.perf_counter()
+
+	ok = np.array([p is not None for p in prepared], dtype=bool)
+	crops = [p for p in prepared if p is not None]
+	errors = np.concatenate([autoencoder.reconstruction_errors(np.stack(crops[i:i + BATCH_SIZE]))
+		for i in range(0, len(crops), BATCH_SIZE)]) if crops else np.zeros(0)
+	t_scored = time.perf_counter()
+
+	not_prepared = [p for p, o in zip(paths, ok) if not o]
+	paths = np.array(paths)[ok]
+	labels = np.array(labels)[ok]
+	source_names = np.array(source_names)[ok]
+
+	report = {
+		'weights': args.weights,
+		'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+		'images': int(len(ok)),
+		'not_prepared': len(not_prepared),
+		'not_prepared_images': not_prepared,
+		'distributions': {
+			'by_label': {l: distribution(errors[labels == l]) for l in sorted(set(labels))},
+			'by_source': {s: distribution(errors[source_names == s]) for s in sorted(set(source_names))},
+		},
+		'throughput': {
+			'workers': args.workers,
+			'prepare_seconds': t_prepared - t_start,
+			'score_seconds': t_scored - t_prepared,
+			'images_per_sec': len(ok) / max(t_scored - t_start, 1e-9),
+		},
+	}
+
+	calibration = calibrate(errors, labels)
+	if calibration is None:
+		# only one class: the threshold is the 99th percentile of the real images
+		real = errors[labels == 'real']
+		if len(real) > 0:
+			report.update({'threshold': float(np.percentile(real, 99)), 'method': 'real_p99'})
+	else:
+		report.update(calibration)
+
+	# the threshold file only keeps the scalars the node and a reviewer need
+	summary = {key: report[key] for key in THRESHOLD_KEYS if key in report}
+	summary['images'] = {l: d['count'] for l, d in report['distributions']['by_label'].items()}
+	write_json(output, summary)
+	if args.report:
+		write_json(args.report, report)
+
+	print(f"{report['images']} images, {report['not_prepared']} could not be prepared, "
+		f"{report['throughput']['images_per_sec']:.1f} images/s")
+	for label, d in report['distributions']['by_label'].items():
+		if d['count'] > 0:
+			print(f"  {label:10s} n={d['count']:4d} median={d['percentiles']['50']:.5f} p95={d['percentiles']['95']:.5f}")
+	if 'threshold' in report:
+		extra = f", ROC AUC {report['roc_auc']:.3f}, TPR {report['tpr']:.2f}, FPR {report['fpr']:.2f}" if 'roc_auc' in report else ''
+		print(f"Threshold ({report['method']}): {report['threshold']:.6f}{extra}")
+	print(f"Threshold written to {output}" + (f", report to {args.report}" if args.report else ''))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,114 @@
+from concurrent.futures import Future
+from threading import Lock, Timer
+
+
+# the capture timed out, 'items' are the ones added before
+class CaptureTimeout(TimeoutError):
+
+	def __init__(self, items):
+		super().__init__("no frame was captured in time")
+		self.items = items
+
+
+# A capture that a job arms and a camera callback completes.
+# arm() returns a future, the callback that gets the frame takes the future with take() (so no other
+# frame can complete it) and sets its result. If nobody completes it within 'timeout' seconds the
+# future fails with a TimeoutError. Waiting costs no CPU, nothing polls.
+# A job that needs several frames add()s them to the capture and completes it with complete_items(),
+# the items are kept under the capture's lock, so a timeout can hand over the ones collected so far.
+# The done callbacks of the future run on the thread that completes it. With a 'node' the timeout is a
+# timer of the node, so like the camera callbacks it runs on the executor (e.g. OpenCV windows in the
+# callbacks stay on one thread), without one (tests) it runs on a threading.Timer thread.
+class FrameCapture:
+
+	def __init__(self, node=None):
+		self.node = node
+		self.lock = Lock()
+		self.future = None
+		self.timer = None
+		self.items = []
+
+	@property
+	def armed(self):
+		return self.future is not None
+
+	def arm(self, timeout=None):
+		future = Future()
+		with self.lock:
+			self._cancel_timer()
+			if self.future is not None:
+				self.future.cancel()
+			self.future = future
+			self.items = []
+			if timeout is not None and timeout > 0:
+				self.timer = self._start_timer(timeout, future)
+		return future
+
+	# the armed future or None, the capture is disarmed afterwards
+	def take(self):
+		with self.lock:
+			future, self.future = self.future, None
+			self.items = []
+			self._cancel_timer()
+		return future
+
+	# completes the armed future with 'result', returns False if nothing was armed
+	def complete(self, result):
+		future = self.take()
+		if future is None:
+			return False
+		future.set_result(result)
+		return True
+
+	# adds an item to the armed job, returns the number of items it has (0 if nothing was armed)
+	def add(self, item):
+		with self.lock:
+			if self.future is None:
+				return 0
+			self.items.append(item)
+			return len(self.items)
+
+	# completes the armed future with the list of added items, returns False if nothing was armed
+	def complete_items(self):
+		with self.lock:
+			future, items = self.future, self.items
+			self.future = None
+			self.items = []
+			self._cancel_timer()
+		if future is None:
+			return False
+		future.set_result(items)
+		return True
+
+	def cancel(self):
+		future = self.take()
+		if future is not None:
+			future.cancel()
+
+	def _expire(self, future):
+		with self.lock:
+			if self.future is not future:
+				return
+			items = self.items
+			self.future = None
+			self.items = []
+			# node timers repeat
+			self._cancel_timer()
+		future.set_exception(CaptureTimeout(items))
+
+	def _start_timer(self, timeout, future):
+		if self.node is not None:
+			return self.node.create_timer(timeout, lambda: self._expire(future))
+		timer = Timer(timeout, self._expire, (future,))
+		timer.daemon = True
+		timer.start()
+		return timer
+
+	def _cancel_timer(self):
+		if self.timer is None:
+			return
+		if self.node is not None:
+			self.node.destroy_timer(self.timer)
+		else:
+			self.timer.cancel()
+		self.timer = None
@@ -5,7 +5,8 @@ from rclpy.node import Node
 from rclpy.qos import qos_profile_sensor_data, QoSReliabilityPolicy
 
 from sensor_msgs.msg import Image, PointCloud2
-from sensor_msgs_py import point_cloud2 as pc2
+from delta_perception.organized_cloud import OrganizedCloud
+from delta_perception.debug_image import DebugView
 
 from visualization_msgs.msg import Marker
 
@@ -15,89 +16,21 @@ import numpy as np
 from pyzbar import pyzbar
 import requests
 
-from ultralytics import YOLO
-
 from delta_interfaces.msg import MonalisaJob
 from delta_interfaces.msg import JobStatus
-from threading import Thread
 import time
+import os
+import json
 
-import tensorflow as tf
-from tensorflow.keras import layers, losses
-from tensorflow.keras.models import Model
-
-def color_prepare(image_input, debug=False, test=False):
-
-	# Convert the image to RGB color space
-	# rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-	rgb = np.copy(image_input)
-
-	# Define the range for blue color in RGB
-	lower_color_thr = np.array([0, 0, 75])
-	upper_color_thr = np.array([70, 70, 255])
-
-	if test:
-		max_value = np.max(rgb)
-		lower_color_thr = np.array([40, 0, 0])
-		upper_color_thr = np.array([120, 15, 15])
-
-	# Create a mask for the blue color
-	mask = cv2.inRange(rgb, lower_color_thr, upper_color_thr)
-
-	# Set all pixels corresponding to the blue border to black
-	rgb[mask != 0] = [0, 0, 0]
-
-	# Find contours in the mask
-	contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-
-	if contours:
-		# Sort contours by area, largest first
-		contours = sorted(contours, key=cv2.contourArea, reverse=True)
-
-		# Get the second largest contour
-		second_largest_contour = contours[1]
-
-		# Create a mask for the second largest contour
-		contour_mask = np.zeros_like(mask)
-		cv2.drawContours(contour_mask, [second_largest_contour], -1, 255, thickness=cv2.FILLED)
-
-		# Invert the contour mask to get the area outside the contour
-		outside_contour_mask = cv2.bitwise_not(contour_mask)
+from ml_identifier.numpy_autoencoder import load_autoencoder, aggregate_errors
+from ml_identifier.frame_capture import FrameCapture
+from ml_identifier.preprocessing import color_prepare, size_prepare
+from ml_identifier.calibrate_threshold import threshold_path
 
-		# Set all masked pixels to white
-		rgb[outside_contour_mask != 0] = [0, 0, 0]
-
-		# image_yuv = cv2.cvtColor(rgb, cv2.COLOR_RGB2YUV)
-		# # Apply histogram equalization on the Y channel
-		# image_yuv[:, :, 0] = cv2.equalizeHist(image_yuv[:, :, 0])
-		# rgb = cv2.cvtColor(image_yuv, cv2.COLOR_YUV2RGB)
-
-		max_value = np.max(rgb)
-		rgb = rgb.astype(np.float32) / max_value
-
-		return rgb
-	
-def size_prepare(img, new_resolution):
-
-	# Get current image size
-	height, width = img.shape[:2]
-
-	# Calculate the desired width based on the height
-	desired_width = height
-
-	# Calculate padding size
-	pad_width = max(0, desired_width - width)
-	top = 0
-	bottom = 0
-	left = pad_width // 2
-	right = pad_width - left
-
-	# Add black padding to the image
-	padded_img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(0, 0, 0))
-
-	resized_img = cv2.resize(padded_img, (new_resolution, new_resolution), interpolation=cv2.INTER_AREA)
-
-	return resized_img
+AUTOENCODER_FILES = {
+	'dense': "src/dis-delta-team/anomaly_detection/anomaly_detection_model.npz",
+	'conv': "src/dis-delta-team/anomaly_detection/conv_autoencoder.npz",
+}
 
 
 class ml_identifier(Node):
@@ -109,6 +42,13 @@ class ml_identifier(Node):
 			namespace='',
 			parameters=[
 				('device', ''),
+				('classification_timeout', 10.0),
+				('qr_scan_timeout', 60.0),
+				('classification_frames', 5),
+				('classification_window', 2.0),
+				('classification_aggregate', 'median'),
+				('autoencoder', 'conv'),
+				('threshold_file', ''),
 		])
 
 		marker_topic = "/people_marker"
@@ -125,7 +65,8 @@ class ml_identifier(Node):
 
 		self.marker_pub = self.create_publisher(Marker, marker_topic, QoSReliabilityPolicy.BEST_EFFORT)
 
-		self.model = YOLO("yolov8n.pt")
+		# OpenCV windows (not in headless mode) and the ~/debug_image topic
+		self.debug_view = DebugView(self)
 
 		self.faces = []
 		self.qr_monalisa = None
@@ -141,30 +82,48 @@ class ml_identifier(Node):
 		# listen to incoming jobs
 		self.job_subscription = self.create_subscription(MonalisaJob, 'monalisa_job', self.process_incoming_job, 1)
 		self.job_subscription  # prevent unused variable warning
-		
-		self.startScanning = False
 
-		# Mona Lisa classifier stuff
-		# TODO: threshold
-		self.real_ml_thresh = 0.002
+		# a job arms a capture, the camera callback completes it, no thread waits for it
+		self.classification_timeout = self.get_parameter('classification_timeout').get_parameter_value().double_value
+		self.qr_scan_timeout = self.get_parameter('qr_scan_timeout').get_parameter_value().double_value
+		self.classification_capture = FrameCapture(self)
+		self.qr_capture = FrameCapture(self)
+
+		# a Mona Lisa is classified from the crops of several frames at once
+		self.classification_frames = self.get_parameter('classification_frames').get_parameter_value().integer_value
+		self.classification_window = self.get_parameter('classification_window').get_parameter_value().double_value
+		self.classification_aggregate = self.get_parameter('classification_aggregate').get_parameter_value().string_value
+		self.classification_start = None
+		self.confidence = 0.0
+
 		# TODO: make sure dir is correct
-		self.ml_classifier = tf.keras.models.load_model("src/dis-delta-team/anomaly_detection/anomaly_detection_model")
-		# TODO_ will this work...
-		self.current_frame = None # current frame from camera, saved to this by rgb_callback
-		self.do_classification = False
+		# NumPy autoencoder, the small 'conv' one (committed with its calibrated threshold) or 'dense'
+		# (exported from the SavedModel on the first start, needs TensorFlow)
+		autoencoder = self.get_parameter('autoencoder').get_parameter_value().string_value
+		if autoencoder not in AUTOENCODER_FILES:
+			raise ValueError(f"Unknown autoencoder '{autoencoder}', use one of {list(AUTOENCODER_FILES)}")
+		weights_file = AUTOENCODER_FILES[autoencoder]
+		self.ml_classifier = load_autoencoder(weights_file, os.path.splitext(weights_file)[0])
+
+		# Mona Lisa classifier stuff, the threshold comes from the report of calibrate_threshold if there is one,
+		# by default the one calibrated for the selected autoencoder
+		self.real_ml_thresh = 0.002
+		threshold_file = self.get_parameter('threshold_file').get_parameter_value().string_value or threshold_path(weights_file)
+		if os.path.exists(threshold_file):
+			with open(threshold_file) as f:
+				report = json.load(f)
+			if 'threshold' in report:
+				self.real_ml_thresh = report['threshold']
+				self.get_logger().info(f"Loaded threshold {self.real_ml_thresh} ({report.get('method')}) from {threshold_file}")
 
 		self.get_logger().info(f"Node has been initialized! Will publish face markers to {marker_topic}.")
 
-		thread = Thread(target = self.check_mona_lisa)
-		thread.start()
-
-		
-		
 	def publish_job_status(self):
 		msg = JobStatus()
 		msg.acting = self.currently_executing_job
 		msg.job_id = self.id_of_current_job
 		msg.result_bool = self.is_real_monalisa
+		msg.result_float = self.confidence
 		self.job_publisher_.publish(msg)
 		
 	def process_incoming_job(self, msg):
@@ -176,34 +135,41 @@ class ml_identifier(Node):
 		self.publish_job_status()
 		
 		if msg.scan_qr:
-			thread = Thread(target = self.scan_qr_code)
-			thread.start()
+			self.scan_qr_code()
 		else:
-			thread = Thread(target = self.check_mona_lisa)
-			thread.start()
+			self.check_mona_lisa()
 
+	# the top camera looks for the qr code until it is found or the scan times out
 	def scan_qr_code(self):
-	
-		# TODO: scan qr code here
-		self.startScanning = True
-		while self.startScanning:
-			time.sleep(1)
-		
+		future = self.qr_capture.arm(self.qr_scan_timeout)
+		future.add_done_callback(self.qr_code_done)
+
+	def qr_code_done(self, future):
+		if not future.cancelled() and future.exception() is not None:
+			self.get_logger().warning(f"QR code scan failed: {future.exception()}")
+
 		# when qr code scan has finished:
 		self.currently_executing_job = False
 		self.publish_job_status()
 
+	# the next usable frame of the camera is classified
 	def check_mona_lisa(self):
-	
-		# # TODO: check if mona lisa is real and store it like this:
-		# self.is_real_monalisa = True # wow its the real mona lisa!
-		# # or
-		# self.is_real_monalisa = True # oh no, just another fake mona lisa
-		
+		self.classification_start = None
+		future = self.classification_capture.arm(self.classification_timeout)
+		future.add_done_callback(self.check_mona_lisa_done)
 
-		self.do_classification = True
-		
-		while(self.do_classification): pass
+	def check_mona_lisa_done(self, future):
+		if future.cancelled():
+			return
+
+		# after a timeout the crops collected so far are used
+		crops = future.exception().items if future.exception() is not None else future.result()
+		if len(crops) == 0:
+			self.get_logger().warning(f"Mona Lisa check failed: {future.exception()}")
+			self.is_real_monalisa = False
+			self.confidence = 0.0
+		else:
+			self.is_real_monalisa, self.confidence = self.classify_crops(crops)
 
 		# when mona lisa check is finished and answer stored in self.is_real_monalisa, do:
 		self.currently_executing_job = False
@@ -215,7 +181,8 @@ class ml_identifier(Node):
 
 		self.faces = []
 
-		if not self.do_classification:
+		# nothing to do unless a job waits for a frame
+		if not self.classification_capture.armed:
 			return
 		else:
 			
@@ -226,39 +193,28 @@ class ml_identifier(Node):
 
 				# get image
 				# cf_image = self.current_frame
-				cf_image = cv_image
+				# color_prepare and the autoencoder work on rgb images, like in the notebooks
+				cf_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
 				print(cf_image)
-				cv2.imshow("debug test", cf_image)
-				cv2.waitKey(1)
+				debug = self.debug_view.begin_frame()
+				if debug:
+					self.debug_view.show("debug test", cv_image)
 
 				# preprocess the image
 				image_cp = color_prepare(cf_image, test=True) # color-prepared
 				image_sp = size_prepare(image_cp, 128) # size-prepared 
-				
-				test_image = np.array([image_sp])
-
-				# model magic
-				enc_image = self.ml_classifier.encoder(test_image).numpy()
-				dec_image = self.ml_classifier.decoder(enc_image).numpy()
-				recon_error = tf.reduce_mean(tf.square(test_image - dec_image))
-				print(f"Reconstruction error from classifier was: {recon_error}")
-
-				# decision
-				if recon_error > self.real_ml_thresh:
-					self.is_real_monalisa = False
-				else:
-					self.is_real_monalisa = True
-
-				print("Decision: Mona Lisa is {}".format("REAL" if self.is_real_monalisa else "FAKE"))
-
-				# lets visualize...
-				# viz_sep = np.zeros((image_sp.shape[0], 10, 3))
-				viz_combined = np.hstack((image_sp, dec_image[0]))
-				# viz_combined = np.hstack((image_sp, viz_sep, dec_image))
-				cv2.imshow("Original cutout and reconstructed image", viz_combined)
-				cv2.waitKey(1)
-
-				self.do_classification = False
+
+				# collect crops until there are enough or the window is over, a frame that
+				# could not be prepared is skipped and leaves the capture armed for the next one
+				now = time.monotonic()
+				if self.classification_start is None:
+					self.classification_start = now
+				collected = self.classification_capture.add(image_sp)
+				print(f"Collected crop {collected}/{self.classification_frames}")
+
+				if collected > 0 and (collected >= self.classification_frames
+						or now - self.classification_start >= self.classification_window):
+					self.classification_capture.complete_items()
 			
 
 			# #self.get_logger().info(f"Running inference on image...")
@@ -295,7 +251,36 @@ class ml_identifier(Node):
 			
 			except CvBridgeError as e:
 				print(e)
+			except Exception as e:
+				# e.g. the painting was not found in the frame, the next frame is tried
+				self.get_logger().warning(f"Could not classify the frame: {e}")
+
+
+	# decides REAL/FAKE from a batch of crops, returns the decision and its confidence, the
+	# fraction of crops whose own reconstruction error is on the same side of the threshold
+	def classify_crops(self, crops):
+		batch = np.array(crops, dtype=np.float32)
+
+		# model magic, all crops in one forward pass
+		dec_images = self.ml_classifier.reconstruct(batch)
+		errors = np.mean(np.square(batch - dec_images).reshape(len(batch), -1), axis=1)
+		recon_error = aggregate_errors(errors, self.classification_aggregate)
+		print(f"Reconstruction errors from classifier were: {errors}, {self.classification_aggregate}: {recon_error}")
+
+		# decision
+		is_real_monalisa = recon_error <= self.real_ml_thresh
+		confidence = float(np.mean((errors <= self.real_ml_thresh) == is_real_monalisa))
 
+		print("Decision: Mona Lisa is {} (confidence {:.2f})".format("REAL" if is_real_monalisa else "FAKE", confidence))
+
+		# lets visualize the crop closest to the aggregated error...
+		if self.debug_view.begin_frame():
+			i = int(np.argmin(np.abs(errors - recon_error)))
+			viz_combined = np.hstack((batch[i], dec_images[i]))
+			self.debug_view.show("Original cutout and reconstructed image", viz_combined)
+			self.debug_view.publish((np.clip(viz_combined, 0, 1) * 255).astype(np.uint8))
+
+		return is_real_monalisa, confidence
 
 	def download_image(self, url):
 		response = requests.get(url)
@@ -307,10 +292,11 @@ class ml_identifier(Node):
 
 
 	def top_rgb_callback(self, data):
-		if not self.startScanning:
+		if not self.qr_capture.armed:
 			return
 		try:
 			cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
+			debug = self.debug_view.begin_frame()
 			qr_codes = pyzbar.decode(cv_image)
 			for obj in qr_codes:
 				obj_data = obj.data.decode("utf-8")
@@ -319,32 +305,31 @@ class ml_identifier(Node):
 					if self.qr_monalisa is None:
 						self.get_logger().info(f"Saving mona lisa image")
 						self.qr_monalisa = self.download_image(obj_data)
-						cv2.imshow("Downloaded monalisa", self.qr_monalisa)
-						self.startScanning = False
+						if debug:
+							self.debug_view.show("Downloaded monalisa", self.qr_monalisa)
+					# also finishes the job if the image was downloaded by an earlier one
+					self.qr_capture.complete(self.qr_monalisa)
 						
-			cv2.imshow("image", cv_image)
-			key = cv2.waitKey(1)
-			if key==27:
-				print("exiting")
-				exit()
+			if debug:
+				self.debug_view.publish(cv_image, data.header)
+				key = self.debug_view.show("image", cv_image)
+				if key==27:
+					print("exiting")
+					exit()
 		except CvBridgeError as e:
 			print(e)
 
 	def pointcloud_callback(self, data):
 
-		# get point cloud attributes
-		height = data.height
-		width = data.width
-		point_step = data.point_step
-		row_step = data.row_step		
+		if len(self.faces) == 0:
+			return
+
+		# get 3-channel representation of the point cloud in numpy format, decoded once for all detections
+		a = OrganizedCloud(data).xyz
 
 		# iterate over face coordinates
 		for x,y in self.faces:
 
-			# get 3-channel representation of the poitn cloud in numpy format
-			a = pc2.read_points_numpy(data, field_names= ("x", "y", "z"))
-			a = a.reshape((height,width,3))
-
 			# read center coordinates
 			d = a[y,x,:]
 
@@ -382,6 +367,7 @@ def main():
 	rclpy.init(args=None)
 	node = ml_identifier()
 	rclpy.spin(node)
+	node.debug_view.close()
 	node.destroy_node()
 	rclpy.shutdown()
 
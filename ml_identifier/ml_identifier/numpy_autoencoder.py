@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+
+import numpy as np
+
+
+# NumPy version of the Mona Lisa autoencoder from anomaly_detection/dev_ano_det_model.ipynb:
+#   encoder: Flatten -> Dense(latent, relu)
+#   decoder: Dense(prod(shape), sigmoid) -> Reshape(shape)
+# The weights are exported once from the TensorFlow SavedModel to an .npz file, after that
+# neither TensorFlow nor the SavedModel is needed to score images.
+class NumpyAutoencoder:
+
+	def __init__(self, enc_kernel, enc_bias, dec_kernel, dec_bias, shape):
+		self.enc_kernel = np.ascontiguousarray(enc_kernel, dtype=np.float32)
+		self.enc_bias = np.asarray(enc_bias, dtype=np.float32)
+		self.dec_kernel = np.ascontiguousarray(dec_kernel, dtype=np.float32)
+		self.dec_bias = np.asarray(dec_bias, dtype=np.float32)
+		self.shape = tuple(int(s) for s in shape)
+
+	kind = 'dense'
+
+	@classmethod
+	def load(cls, path):
+		with np.load(path) as w:
+			return cls(w['enc_kernel'], w['enc_bias'], w['dec_kernel'], w['dec_bias'], w['shape'])
+
+	def save(self, path):
+		np.savez(path, kind=self.kind, enc_kernel=self.enc_kernel, enc_bias=self.enc_bias,
+			dec_kernel=self.dec_kernel, dec_bias=self.dec_bias, shape=np.array(self.shape))
+
+	def weights(self):
+		return [self.enc_kernel, self.enc_bias, self.dec_kernel, self.dec_bias]
+
+	# a single image or a batch of images as (N, pixels) float32
+	def _flatten(self, images):
+		images = np.asarray(images, dtype=np.float32)
+		if images.shape == self.shape:
+			images = images[np.newaxis]
+		return images.reshape(images.shape[0], -1)
+
+	def encode(self, images):
+		latent = self._flatten(images) @ self.enc_kernel
+		latent += self.enc_bias
+		return np.maximum(latent, 0, out=latent)
+
+	def decode(self, latent):
+		out = np.asarray(latent, dtype=np.float32) @ self.dec_kernel
+		out += self.dec_bias
+		_sigmoid(out)
+		return out.reshape((out.shape[0],) + self.shape)
+
+	def reconstruct(self, images):
+		return self.decode(self.encode(images))
+
+	# mean squared reconstruction error of every image in the batch
+	def reconstruction_errors(self, images):
+		flat = self._flatten(images)
+		diff = self.decode(self.encode(flat)).reshape(flat.shape)
+		diff -= flat
+		return np.einsum('ij,ij->i', diff, diff) / flat.shape[1]
+
+
+def _sigmoid(out):
+	# in place, exp overflows to inf for very negative inputs which correctly gives 0
+	with np.errstate(over='ignore'):
+		np.negative(out, out=out)
+		np.exp(out, out=out)
+		out += 1
+		np.reciprocal(out, out=out)
+	return out
+
+
+# kxk convolution of a (N, H, W, C) batch with a Keras (k, k, C, filters) kernel and padding='same',
+# padded like TensorFlow (the extra row/column for even sizes goes to the bottom/right)
+def conv2d(x, kernel, bias, stride=1):
+	k = kernel.shape[0]
+	n, h, w, c = x.shape
+	out_h, out_w = -(-h // stride), -(-w // stride)
+	pad_h = max((out_h - 1) * stride + k - h, 0)
+	pad_w = max((out_w - 1) * stride + k - w, 0)
+	x = np.pad(x, ((0, 0), (pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)))
+	# all windows as rows of one matrix, so the convolution is a single matrix product
+	columns = np.empty((n, out_h, out_w, k, k, c), dtype=np.float32)
+	for dy in range(k):
+		for dx in range(k):
+			columns[:, :, :, dy, dx] = x[:, dy:dy + stride * (out_h - 1) + 1:stride, dx:dx + stride * (out_w - 1) + 1:stride]
+	out = columns.reshape(-1, k * k * c) @ kernel.reshape(k * k * c, -1)
+	out += bias
+	return out.reshape(n, out_h, out_w, -1)
+
+
+# which 3x3 kernel rows a pixel of the 2x nearest upsampled image reads from the rows -1, 0, +1 of the
+# original image, for even (first) and odd (second) output rows
+_UPSAMPLE_TAPS = np.array([
+	[[1, 0, 0], [0, 1, 1], [0, 0, 0]],
+	[[0, 0, 0], [1, 1, 0], [0, 0, 1]],
+], dtype=np.float32)
+
+
+# UpSampling2D(2) followed by a 3x3 convolution is a 3x3 convolution of the small image with 4 times the
+# filters, one set per output pixel phase. This kernel has 4/9 of the non zero weights, saves the upsampled
+# copy and the matrix product gets more columns.
+def upsample_kernel(kernel):
+	merged = np.einsum('pak,qbl,klcf->abcpqf', _UPSAMPLE_TAPS, _UPSAMPLE_TAPS, kernel)
+	return np.ascontiguousarray(merged.reshape(3, 3, kernel.shape[2], 4 * kernel.shape[3]), dtype=np.float32)
+
+
+def upsample_conv2d(x, merged_kernel, merged_bias):
+	n, h, w, _ = x.shape
+	out = conv2d(x, merged_kernel, merged_bias)
+	out = out.reshape(n, h, w, 2, 2, -1).transpose(0, 1, 3, 2, 4, 5)
+	return out.reshape(n, 2 * h, 2 * w, -1)
+
+
+# NumPy version of the small convolutional autoencoder of train_autoencoder.py:
+#   encoder: Conv2D(stride 2, relu) per entry of 'encoder_filters', 128x128 -> 8x8
+#   decoder: UpSampling2D + Conv2D(relu) per entry of 'decoder_filters', the last to 3 channels with sigmoid
+# A few thousand weights instead of the 12.6 million of the dense autoencoder.
+class NumpyConvAutoencoder:
+	kind = 'conv'
+
+	# layers: list of (kernel, bias, stride, upsample, activation)
+	def __init__(self, layers, shape):
+		self.layers = [(np.ascontiguousarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32),
+			int(stride), int(upsample), str(activation)) for kernel, bias, stride, upsample, activation in layers]
+		self.shape = tuple(int(s) for s in shape)
+		# upsampling + 3x3 convolution layers run as one convolution of the small image
+		self.merged = [(upsample_kernel(kernel), np.tile(bias, 4)) if upsample == 2 and stride == 1 and kernel.shape[:2] == (3, 3)
+			else None for kernel, bias, stride, upsample, _ in self.layers]
+
+	@classmethod
+	def load(cls, path):
+		with np.load(path) as w:
+			layers = [(w[f'kernel_{i}'], w[f'bias_{i}'], stride, upsample, activation)
+				for i, (stride, upsample, activation) in enumerate(zip(w['strides'], w['upsample'], w['activations']))]
+			return cls(layers, w['shape'])
+
+	def save(self, path):
+		arrays = {}
+		for i, (kernel, bias, _, _, _) in enumerate(self.layers):
+			arrays[f'kernel_{i}'] = kernel
+			arrays[f'bias_{i}'] = bias
+		np.savez(path, kind=self.kind, shape=np.array(self.shape),
+			strides=np.array([l[2] for l in self.layers]), upsample=np.array([l[3] for l in self.layers]),
+			activations=np.array([l[4] for l in self.layers]), **arrays)
+
+	def weights(self):
+		return [a for kernel, bias, _, _, _ in self.layers for a in (kernel, bias)]
+
+	def _batch(self, images):
+		images = np.asarray(images, dtype=np.float32)
+		if images.shape == self.shape:
+			images = images[np.newaxis]
+		return images.reshape((-1,) + self.shape)
+
+	def reconstruct(self, images):
+		x = self._batch(images)
+		for (kernel, bias, stride, upsample, activation), merged in zip(self.layers, self.merged):
+			if merged is not None:
+				x = upsample_conv2d(x, *merged)
+			else:
+				if upsample > 1:
+					x = x.repeat(upsample, axis=1).repeat(upsample, axis=2)
+				x = conv2d(x, kernel, bias, stride)
+			if activation == 'relu':
+				np.maximum(x, 0, out=x)
+			elif activation == 'sigmoid':
+				_sigmoid(x)
+		return x
+
+	# mean squared reconstruction error of every image in the batch
+	def reconstruction_errors(self, images):
+		x = self._batch(images)
+		diff = self.reconstruct(x)
+		diff -= x
+		flat = diff.reshape(len(diff), -1)
+		return np.einsum('ij,ij->i', flat, flat) / flat.shape[1]
+
+
+# combines the reconstruction errors of several crops of the same painting into one,
+# 'median' or 'trimmed_mean' (mean without the 'trim' fraction of lowest and highest errors)
+def aggregate_errors(errors, method='median', trim=0.2):
+	errors = np.sort(np.asarray(errors, dtype=np.float64).reshape(-1))
+	if method == 'median':
+		return float(np.median(errors))
+	if method == 'trimmed_mean':
+		k = int(len(errors) * trim)
+		if len(errors) > 2 * k:
+			errors = errors[k:len(errors) - k]
+		return float(np.mean(errors))
+	raise ValueError(f"unknown aggregation '{method}', use 'median' or 'trimmed_mean'")
+
+
+# writes the weights of the TensorFlow SavedModel to an .npz file for NumpyAutoencoder
+def export_saved_model(saved_model_dir, npz_path):
+	try:
+		# the model was saved with Keras 2, which is a separate package since TensorFlow 2.16
+		import tf_keras as keras
+	except ImportError:
+		from tensorflow import keras
+
+	model = keras.models.load_model(saved_model_dir)
+	enc_kernel, enc_bias = [v.numpy() for v in model.encoder.trainable_variables]
+	dec_kernel, dec_bias = [v.numpy() for v in model.decoder.trainable_variables]
+	shape = model.decoder(np.zeros((1, enc_kernel.shape[1]), dtype=np.float32)).shape[1:]
+
+	autoencoder = NumpyAutoencoder(enc_kernel, enc_bias, dec_kernel, dec_bias, shape)
+	autoencoder.save(npz_path)
+	return autoencoder
+
+
+# loads the exported weights of either autoencoder, exporting them first if only the SavedModel exists
+def load_autoencoder(npz_path, saved_model_dir=None):
+	if not os.path.exists(npz_path):
+		if saved_model_dir is None or not os.path.isdir(saved_model_dir):
+			raise FileNotFoundError(f"No autoencoder weights at {npz_path}")
+		return export_saved_model(saved_model_dir, npz_path)
+	with np.load(npz_path) as w:
+		kind = str(w['kind']) if 'kind' in w.files else 'dense'
+	return NumpyConvAutoencoder.load(npz_path) if kind == 'conv' else NumpyAutoencoder.load(npz_path)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Export the anomaly detection SavedModel to an .npz file")
+	parser.add_argument('saved_model_dir')
+	parser.add_argument('npz_path', nargs='?', help="defaults to <saved_model_dir>.npz")
+	args = parser.parse_args()
+
+	npz_path = args.npz_path or args.saved_model_dir.rstrip('/') + '.npz'
+	autoencoder = export_saved_model(args.saved_model_dir, npz_path)
+	print(f"Exported autoencoder with input shape {autoencoder.shape} and {autoencoder.enc_kernel.shape[1]} latent dimensions to {npz_path}")
+
+
+if __name__ == '__main__':
+	main()
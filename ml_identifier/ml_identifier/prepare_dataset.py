@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import hashlib
+import inspect
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from ml_identifier import preprocessing
+from ml_identifier.preprocessing import color_prepare, size_prepare
+
+
+# Prepares the Mona Lisa training images (anomaly_detection/dev_prepare_dataset.ipynb) once and caches them.
+# The cache is a directory with
+#   <name>.npy   all prepared images as one (N, 128, 128, 3) float16 rgb tensor in [0, 1]
+#   <name>.json  the index: for every source image its sha1 and its row in the tensor (or that it failed)
+# Images are prepared in a process pool. On a rebuild only images whose sha1 changed (or that are new) are
+# prepared again, the others are copied from the old tensor. A change of the resolution or of the
+# preprocessing code invalidates the whole cache.
+# Training and evaluation load the tensor memory mapped with load_dataset(), which takes milliseconds.
+#
+# run from the workspace source directory (src/dis-delta-team) with:
+#   ros2 run ml_identifier prepare_dataset
+# and in the notebooks (from anomaly_detection/):
+#   images_array = np.load("dataset/cache/monalisa.npy", mmap_mode='r')
+
+DEFAULT_SOURCE = 'data/monalisa'
+DEFAULT_CACHE = 'anomaly_detection/dataset/cache'
+DEFAULT_NAME = 'monalisa'
+RESOLUTION = 128
+DTYPE = np.float16
+
+
+def natural_key(path):
+	return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', os.path.basename(path))]
+
+
+def file_hash(path):
+	with open(path, 'rb') as f:
+		return hashlib.sha1(f.read()).hexdigest()
+
+
+# hash of everything that changes the output, so the cache notices when the preprocessing changes
+def prepare_hash(resolution):
+	h = hashlib.sha1()
+	h.update(inspect.getsource(preprocessing).encode())
+	h.update(f"{resolution} {np.dtype(DTYPE).name}".encode())
+	return h.hexdigest()
+
+
+# loads and prepares one training image, returns None if it could not be prepared
+def prepare_file(job):
+	path, resolution = job
+	image = cv2.imread(path)
+	if image is None:
+		return None
+	try:
+		prepared = size_prepare(color_prepare(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)), resolution)
+	except Exception:
+		# color_prepare did not find the frame of the painting
+		return None
+	return prepared.astype(DTYPE)
+
+
+def cache_paths(cache_dir, name):
+	return os.path.join(cache_dir, name + '.npy'), os.path.join(cache_dir, name + '.json')
+
+
+def read_index(index_path):
+	if not os.path.exists(index_path):
+		return None
+	with open(index_path) as f:
+		return json.load(f)
+
+
+# builds or updates the cache of 'source_dir', returns the new index
+def build_cache(source_dir, cache_dir=DEFAULT_CACHE, name=DEFAULT_NAME, resolution=RESOLUTION, workers=None, force=False):
+	tensor_path, index_path = cache_paths(cache_dir, name)
+	paths = sorted(glob.glob(os.path.join(source_dir, '*.png')), key=natural_key)
+	hashes = [file_hash(p) for p in paths]
+	version = prepare_hash(resolution)
+
+	# what the old cache already has, by image hash
+	old_index = None if force else read_index(index_path)
+	if old_index is not None and (old_index.get('prepare_hash') != version or not os.path.exists(tensor_path)):
+		old_index = None
+	old_rows, old_failed = {}, set()
+	if old_index is not None:
+		old_rows = {e['sha1']: e['row'] for e in old_index['images'] if e['row'] >= 0}
+		old_failed = {e['sha1'] for e in old_index['images'] if e['row'] < 0}
+
+	todo = [i for i, h in enumerate(hashes) if h not in old_rows and h not in old_failed]
+	if todo:
+		with ProcessPoolExecutor(workers) as pool:
+			prepared = list(pool.map(prepare_file, [(paths[i], resolution) for i in todo], chunksize=8))
+	else:
+		prepared = []
+	new_images = dict(zip(todo, prepared))
+
+	# rows of the new tensor, in the order of the source images
+	entries = []
+	rows = 0
+	for i, (path, h) in enumerate(zip(paths, hashes)):
+		ok = h in old_rows or new_images.get(i) is not None
+		entries.append({'image': os.path.basename(path), 'sha1': h, 'row': rows if ok else -1})
+		rows += ok
+
+	unchanged = old_index is not None and not todo and rows == len(old_rows) \
+		and [e['sha1'] for e in entries] == [e['sha1'] for e in old_index['images']]
+	if not unchanged:
+		os.makedirs(cache_dir, exist_ok=True)
+		# written next to the old tensor and swapped in at the end, so readers never see half a cache
+		tmp_path = tensor_path + '.tmp.npy'
+		tensor = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=DTYPE, shape=(rows, resolution, resolution, 3))
+		old_tensor = np.load(tensor_path, mmap_mode='r') if old_rows else None
+		for i, entry in enumerate(entries):
+			if entry['row'] < 0:
+				continue
+			if entry['sha1'] in old_rows and i not in new_images:
+				tensor[entry['row']] = old_tensor[old_rows[entry['sha1']]]
+			else:
+				tensor[entry['row']] = new_images[i]
+		tensor.flush()
+		del tensor, old_tensor
+		os.replace(tmp_path, tensor_path)
+
+	index = {
+		'source': source_dir,
+		'prepare_hash': version,
+		'resolution': resolution,
+		'dtype': np.dtype(DTYPE).name,
+		'shape': [rows, resolution, resolution, 3],
+		'prepared': len(todo),
+		'reused': len(paths) - len(todo),
+		'failed': sum(e['row'] < 0 for e in entries),
+		'images': entries,
+	}
+	with open(index_path + '.tmp', 'w') as f:
+		json.dump(index, f, indent=1)
+	os.replace(index_path + '.tmp', index_path)
+	return index
+
+
+# the cached images memory mapped (read only) and the names of the source image of every row
+def load_dataset(cache_dir=DEFAULT_CACHE, name=DEFAULT_NAME):
+	tensor_path, index_path = cache_paths(cache_dir, name)
+	index = read_index(index_path)
+	if index is None:
+		raise FileNotFoundError(f"No prepared dataset '{name}' in {cache_dir}, run prepare_dataset first")
+	images = np.load(tensor_path, mmap_mode='r')
+	names = [e['image'] for e in index['images'] if e['row'] >= 0]
+	return images, names
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Prepare the Mona Lisa training images into a cached float16 tensor")
+	parser.add_argument('--source', default=DEFAULT_SOURCE, help="directory with the raw png images")
+	parser.add_argument('--cache', default=DEFAULT_CACHE, help="cache directory")
+	parser.add_argument('--name', default=DEFAULT_NAME, help="name of the cached tensor and index")
+	parser.add_argument('--resolution', type=int, default=RESOLUTION)
+	parser.add_argument('--workers', type=int, default=os.cpu_count())
+	parser.add_argument('--force', action='store_true', help="prepare all images again")
+	args = parser.parse_args()
+
+	t_start = time.perf_counter()
+	index = build_cache(args.source, args.cache, args.name, args.resolution, args.workers, args.force)
+	t_built = time.perf_counter()
+	images, _ = load_dataset(args.cache, args.name)
+	t_loaded = time.perf_counter()
+
+	print(f"{len(index['images'])} images: {index['prepared']} prepared, {index['reused']} reused, "
+		f"{index['failed']} could not be prepared, in {t_built - t_start:.2f} s with {args.workers} workers")
+	print(f"Cached {images.shape} {images.dtype} in {cache_paths(args.cache, args.name)[0]}, "
+		f"loads in {1000 * (t_loaded - t_built):.1f} ms")
+
+
+if __name__ == '__main__':
+	main()
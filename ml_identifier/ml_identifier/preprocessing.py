@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+
+
+# the preprocessing of anomaly_detection/dev_prepare_dataset.ipynb, shared by the node and the calibration tool
+def color_prepare(image_input, debug=False, test=False):
+
+	# Convert the image to RGB color space
+	# rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+	rgb = np.copy(image_input)
+
+	# Define the range for blue color in RGB
+	lower_color_thr = np.array([0, 0, 75])
+	upper_color_thr = np.array([70, 70, 255])
+
+	if test:
+		max_value = np.max(rgb)
+		lower_color_thr = np.array([40, 0, 0])
+		upper_color_thr = np.array([120, 15, 15])
+
+	# Create a mask for the blue color
+	mask = cv2.inRange(rgb, lower_color_thr, upper_color_thr)
+
+	# Set all pixels corresponding to the blue border to black
+	rgb[mask != 0] = [0, 0, 0]
+
+	# Find contours in the mask
+	contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+	if contours:
+		# Sort contours by area, largest first
+		contours = sorted(contours, key=cv2.contourArea, reverse=True)
+
+		# Get the second largest contour
+		second_largest_contour = contours[1]
+
+		# Create a mask for the second largest contour
+		contour_mask = np.zeros_like(mask)
+		cv2.drawContours(contour_mask, [second_largest_contour], -1, 255, thickness=cv2.FILLED)
+
+		# Invert the contour mask to get the area outside the contour
+		outside_contour_mask = cv2.bitwise_not(contour_mask)
+
+		# Set all masked pixels to white
+		rgb[outside_contour_mask != 0] = [0, 0, 0]
+
+		# image_yuv = cv2.cvtColor(rgb, cv2.COLOR_RGB2YUV)
+		# # Apply histogram equalization on the Y channel
+		# image_yuv[:, :, 0] = cv2.equalizeHist(image_yuv[:, :, 0])
+		# rgb = cv2.cvtColor(image_yuv, cv2.COLOR_YUV2RGB)
+
+		max_value = np.max(rgb)
+		rgb = rgb.astype(np.float32) / max_value
+
+		return rgb
+	
+def size_prepare(img, new_resolution):
+
+	# Get current image size
+	height, width = img.shape[:2]
+
+	# Calculate the desired width based on the height
+	desired_width = height
+
+	# Calculate padding size
+	pad_width = max(0, desired_width - width)
+	top = 0
+	bottom = 0
+	left = pad_width // 2
+	right = pad_width - left
+
+	# Add black padding to the image
+	padded_img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(0, 0, 0))
+
+	resized_img = cv2.resize(padded_img, (new_resolution, new_resolution), interpolation=cv2.INTER_AREA)
+
+	return resized_img
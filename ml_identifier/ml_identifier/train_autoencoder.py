@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from ml_identifier.numpy_autoencoder import NumpyAutoencoder, NumpyConvAutoencoder
+from ml_identifier.prepare_dataset import DEFAULT_CACHE, DEFAULT_NAME, load_dataset
+
+
+# Trains an autoencoder on the cached dataset of prepare_dataset and exports it for the node:
+#   conv   the small convolutional autoencoder (NumpyConvAutoencoder)
+#   dense  the autoencoder of anomaly_detection/dev_ano_det_model.ipynb (NumpyAutoencoder)
+# Needs TensorFlow, the node itself does not.
+#
+# run from the workspace source directory (src/dis-delta-team) with:
+#   ros2 run ml_identifier train_autoencoder --model conv
+# and select it in the node with the parameter autoencoder:=conv
+
+ENCODER_FILTERS = (8, 16, 16, 16)   # stride 2 each, 128x128 -> 8x8x16
+DECODER_FILTERS = (16, 16, 8)       # upsampling 2 each, plus the last layer to 3 channels
+LATENT_DIM = 128
+# adam learning rates, the notebook one for the dense autoencoder
+LEARNING_RATES = {
+	'conv': 3e-3,
+	'dense': 1e-3,
+}
+DEFAULT_OUTPUTS = {
+	'conv': 'anomaly_detection/conv_autoencoder.npz',
+	'dense': 'anomaly_detection/anomaly_detection_model.npz',
+}
+
+
+def keras_module():
+	try:
+		import tf_keras as keras
+	except ImportError:
+		from tensorflow import keras
+	return keras
+
+
+def build_conv(keras, shape):
+	layers = keras.layers
+	model = keras.Sequential([keras.Input(shape)])
+	for filters in ENCODER_FILTERS:
+		model.add(layers.Conv2D(filters, 3, strides=2, padding='same', activation='relu'))
+	for filters in DECODER_FILTERS:
+		model.add(layers.UpSampling2D(2))
+		model.add(layers.Conv2D(filters, 3, padding='same', activation='relu'))
+	model.add(layers.UpSampling2D(2))
+	# most pixels are black (outside the frame), starting at sigmoid(-2) instead of 0.5 keeps the
+	# relus from dying in the first epochs, otherwise the output often ends up constant
+	model.add(layers.Conv2D(shape[-1], 3, padding='same', activation='sigmoid',
+		bias_initializer=keras.initializers.Constant(-2.0)))
+	return model
+
+
+def build_dense(keras, shape):
+	layers = keras.layers
+	return keras.Sequential([
+		keras.Input(shape),
+		layers.Flatten(),
+		layers.Dense(LATENT_DIM, activation='relu'),
+		layers.Dense(int(np.prod(shape)), activation='sigmoid'),
+		layers.Reshape(shape),
+	])
+
+
+# the trained Keras model as NumPy autoencoder
+def export(keras, model, kind, shape):
+	if kind == 'dense':
+		dense = [l for l in model.layers if isinstance(l, keras.layers.Dense)]
+		(enc_kernel, enc_bias), (dec_kernel, dec_bias) = [[v.numpy() for v in l.weights] for l in dense]
+		return NumpyAutoencoder(enc_kernel, enc_bias, dec_kernel, dec_bias, shape)
+
+	layers, upsample = [], 1
+	for layer in model.layers:
+		if isinstance(layer, keras.layers.UpSampling2D):
+			upsample = layer.size[0]
+		elif isinstance(layer, keras.layers.Conv2D):
+			kernel, bias = [v.numpy() for v in layer.weights]
+			layers.append((kernel, bias, layer.strides[0], upsample, layer.activation.__name__))
+			upsample = 1
+	return NumpyConvAutoencoder(layers, shape)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Train a Mona Lisa autoencoder on the cached dataset")
+	parser.add_argument('--model', choices=('conv', 'dense'), default='conv')
+	parser.add_argument('--cache', default=DEFAULT_CACHE)
+	parser.add_argument('--name', default=DEFAULT_NAME)
+	parser.add_argument('--output', help="npz file (default: %s)" % ', '.join(f"{k}: {v}" for k, v in DEFAULT_OUTPUTS.items()))
+	parser.add_argument('--epochs', type=int, default=30)
+	parser.add_argument('--batch-size', type=int, default=16)
+	parser.add_argument('--learning-rate', type=float, help="default: %s" % ', '.join(f"{k}: {v}" for k, v in LEARNING_RATES.items()))
+	parser.add_argument('--validation', type=float, default=0.2, help="fraction of the images held out")
+	parser.add_argument('--seed', type=int, default=42)
+	args = parser.parse_args()
+
+	keras = keras_module()
+	keras.utils.set_random_seed(args.seed)
+
+	images, _ = load_dataset(args.cache, args.name)
+	order = np.random.default_rng(args.seed).permutation(len(images))
+	n_val = int(len(images) * args.validation)
+	val = np.asarray(images[np.sort(order[:n_val])], dtype=np.float32)
+	train = np.asarray(images[np.sort(order[n_val:])], dtype=np.float32)
+	shape = images.shape[1:]
+
+	model = build_conv(keras, shape) if args.model == 'conv' else build_dense(keras, shape)
+	model.compile(optimizer=keras.optimizers.Adam(args.learning_rate or LEARNING_RATES[args.model]), loss='mse')
+	model.summary()
+	t_start = time.perf_counter()
+	model.fit(train, train, epochs=args.epochs, batch_size=args.batch_size, shuffle=True,
+		validation_data=(val, val) if n_val > 0 else None, verbose=2)
+	print(f"Trained on {len(train)} images in {time.perf_counter() - t_start:.0f} s")
+
+	autoencoder = export(keras, model, args.model, shape)
+	if n_val > 0:
+		reference = model.predict(val[:8], verbose=0)
+		print(f"Validation reconstruction error {np.mean(autoencoder.reconstruction_errors(val)):.6f}, "
+			f"NumPy vs Keras max difference {np.abs(autoencoder.reconstruct(val[:8]) - reference).max():.2e}")
+
+	output = args.output or DEFAULT_OUTPUTS[args.model]
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+	autoencoder.save(output)
+	print(f"Exported {args.model} autoencoder with {sum(w.size for w in autoencoder.weights())} weights to {output}")
+
+
+if __name__ == '__main__':
+	main()
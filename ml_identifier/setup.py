@@ -20,7 +20,11 @@ setup(
     tests_require=['pytest'],
     entry_points={
         'console_scripts': [
-            'ml_identifier = ml_identifier.ml_identifier:main'
+            'ml_identifier = ml_identifier.ml_identifier:main',
+            'export_autoencoder = ml_identifier.numpy_autoencoder:main',
+            'calibrate_threshold = ml_identifier.calibrate_threshold:main',
+            'prepare_dataset = ml_identifier.prepare_dataset:main',
+            'train_autoencoder = ml_identifier.train_autoencoder:main'
         ],
     },
 )
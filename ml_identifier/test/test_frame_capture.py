@@ -0,0 +1,124 @@
+import threading
+import time
+
+from ml_identifier.frame_capture import FrameCapture
+import pytest
+
+
+def cpu_time_while_idle(seconds):
+    cpu_start = time.process_time()
+    time.sleep(seconds)
+    return time.process_time() - cpu_start
+
+
+def test_idle_job_uses_no_cpu():
+    # a job waiting for a frame must not spin, the old busy wait used a full core
+    capture = FrameCapture()
+    capture.arm(timeout=10.0)
+
+    cpu = cpu_time_while_idle(1.0)
+
+    capture.cancel()
+    assert cpu < 0.1, 'waiting for a frame used %.2f s of CPU in 1 s' % cpu
+
+
+def test_complete_from_callback():
+    capture = FrameCapture()
+    future = capture.arm(timeout=10.0)
+    done = threading.Event()
+    future.add_done_callback(lambda f: done.set())
+
+    threading.Timer(0.05, capture.complete, (True,)).start()
+
+    assert done.wait(1.0)
+    assert future.result() is True
+    assert not capture.armed
+    assert not capture.complete(False)
+
+
+def test_timeout():
+    capture = FrameCapture()
+    future = capture.arm(timeout=0.05)
+
+    with pytest.raises(TimeoutError):
+        future.result(timeout=1.0)
+    assert not capture.armed
+
+
+def test_rearm_cancels_previous_job():
+    capture = FrameCapture()
+    first = capture.arm()
+    second = capture.arm()
+
+    assert first.cancelled()
+    assert capture.complete('frame')
+    assert second.result() == 'frame'
+
+
+def test_timeout_keeps_added_items():
+    capture = FrameCapture()
+    future = capture.arm(timeout=0.05)
+    assert capture.add('crop 1') == 1
+    assert capture.add('crop 2') == 2
+
+    with pytest.raises(TimeoutError) as error:
+        future.result(timeout=1.0)
+    assert error.value.items == ['crop 1', 'crop 2']
+    assert capture.add('late crop') == 0
+
+
+def test_complete_items():
+    capture = FrameCapture()
+    future = capture.arm(timeout=10.0)
+    capture.add('crop')
+
+    assert capture.complete_items()
+    assert future.result() == ['crop']
+    assert not capture.complete_items()
+
+
+class ManualTimerNode:
+    # node whose timers only fire when the test calls fire(), like an executor would
+
+    def __init__(self):
+        self.timers = []
+
+    def create_timer(self, period, callback):
+        timer = [period, callback]
+        self.timers.append(timer)
+        return timer
+
+    def destroy_timer(self, timer):
+        self.timers.remove(timer)
+
+    def fire(self):
+        for _, callback in list(self.timers):
+            callback()
+
+
+def test_node_timer_expires_on_the_executor():
+    node = ManualTimerNode()
+    capture = FrameCapture(node)
+    future = capture.arm(timeout=0.01)
+    capture.add('crop')
+    callback_threads = []
+    future.add_done_callback(lambda f: callback_threads.append(threading.current_thread()))
+
+    time.sleep(0.05)
+    assert not future.done()
+
+    node.fire()
+    assert callback_threads == [threading.current_thread()]
+    assert future.exception().items == ['crop']
+    # the repeating node timer is gone
+    assert node.timers == []
+
+
+def test_node_timer_destroyed_on_complete():
+    node = ManualTimerNode()
+    capture = FrameCapture(node)
+    future = capture.arm(timeout=1.0)
+
+    assert capture.complete('frame')
+    assert node.timers == []
+    assert future.result() == 'frame'
@@ -7,12 +7,7 @@ from delta_interfaces.msg import CylinderObjects
 from visualization_msgs.msg import Marker
 
 # for transforming between coordinate frames
-from tf2_ros.buffer import Buffer
-from tf2_ros import TransformException
-from tf2_ros.transform_listener import TransformListener
-from rclpy.duration import Duration
-from geometry_msgs.msg import PointStamped
-import tf2_geometry_msgs as tfg
+from delta_perception.transform_cache import TransformCache
 
 # publishing markers
 from visualization_msgs.msg import Marker
@@ -20,23 +15,17 @@ from geometry_msgs.msg import PointStamped
 from rclpy.qos import QoSProfile, QoSReliabilityPolicy
 from builtin_interfaces.msg import Duration
 
+import numpy as np
+
+from object_identifier.object_store import ObjectStore
 
-# structure to store the currently known level objects
-class CurrentCylinderObjects:
-    def __init__(self, position_x, position_y, position_z, color, object_id, number_of_objects):
-        self.position_x = position_x
-        self.position_y = position_y
-        self.position_z = position_z
-        self.color = color
-        self.object_id = object_id
-        self.number_of_objects = number_of_objects
 
 class CylinderObjectIdentifier(Node):
 
     def __init__(self):
         super().__init__('level_object_identifier')
         # initialize member variables
-        self.current_cylinder_objects_ = CurrentCylinderObjects([], [], [], [], [], 0)
+        self.cylinder_objects_ = ObjectStore(position=(np.float64, 3), color=object, object_id=object)
         self.cylinderId = 1
         
         # creating the publisher and a timer to publish level objects regulary
@@ -49,8 +38,7 @@ class CylinderObjectIdentifier(Node):
         self.marker_subscription  # prevent unused variable warning
         
         # for transforming between coordinate frames
-        self.tf_buffer = Buffer()
-        self.tf_listener = TransformListener(self.tf_buffer, self)
+        self.tf_cache = TransformCache(self)
         
         # For publishing the markers
         self.marker_pub = self.create_publisher(Marker, "/delta_cylinder_marker", QoSReliabilityPolicy.RELIABLE)
@@ -96,21 +84,11 @@ class CylinderObjectIdentifier(Node):
         # check if the new cylinder is close to any of the known cylinders
         distance_threshold = 0.75
         distance_threshold_squared = distance_threshold * distance_threshold
-        for i in range(self.current_cylinder_objects_.number_of_objects):
-            x = self.current_cylinder_objects_.position_x[i]
-            y = self.current_cylinder_objects_.position_y[i]
-            z = self.current_cylinder_objects_.position_z[i]
-            
-            dx = x - cylinder_x
-            dy = y - cylinder_y
-            dz = z - cylinder_z
-            
-            dist_squared = dx * dx + dy * dy + dz * dz
-            
-            if (dist_squared < distance_threshold_squared):
-                # this cylinder already exists!
-                #self.get_logger().info('ALREADY KNOWN cylinder detected at (map_frame): (x: %f  y: %f  z: %f)' % (cylinder_x, cylinder_y, cylinder_z))
-                return
+        _, dist_squared = self.cylinder_objects_.nearest('position', (cylinder_x, cylinder_y, cylinder_z))
+        if (dist_squared < distance_threshold_squared):
+            # this cylinder already exists!
+            #self.get_logger().info('ALREADY KNOWN cylinder detected at (map_frame): (x: %f  y: %f  z: %f)' % (cylinder_x, cylinder_y, cylinder_z))
+            return
                 
         color = self.color_detect(colorrgb)
         if color == "":
@@ -123,70 +101,45 @@ class CylinderObjectIdentifier(Node):
         self.get_logger().info('FOUND A NEW cylinder detected at (map_frame): (x: %f  y: %f  z: %f) of a color %s' % (cylinder_x, cylinder_y, cylinder_z, color))
 
 
-    # trys to transfer the given point from robot frame to map frame.
+    # trys to transfer the given point from robot frame to map frame, with the transform at the time of the detection.
     # Returns the array [map_frame_x, map_frame_y, map_frame_z]. If it can not succeede it returns None
     def transform_from_robot_to_map_frame(self, robot_frame_x, robot_frame_y, robot_frame_z, header_stamp):
-        point_in_robot_frame = PointStamped()
-        point_in_robot_frame.header.frame_id = "/base_link"
-        point_in_robot_frame.header.stamp = header_stamp
-        point_in_robot_frame.point.x = robot_frame_x
-        point_in_robot_frame.point.y = robot_frame_y
-        point_in_robot_frame.point.z = robot_frame_z
-        
-        time_now = rclpy.time.Time()
-        timeout = rclpy.duration.Duration(seconds=0.1)
-
-        try:
-            trans = self.tf_buffer.lookup_transform("map", "base_link", time_now, timeout)
-            point_in_map_frame = tfg.do_transform_point(point_in_robot_frame, trans)
-            map_frame_x = point_in_map_frame.point.x
-            map_frame_y = point_in_map_frame.point.y
-            map_frame_z = point_in_map_frame.point.z
-            return [map_frame_x, map_frame_y, map_frame_z]
-        except TransformException as te:
-            self.get_logger().info(f"Cound not get the transform: {te}")
-            return None
+        return self.tf_cache.transform_point(robot_frame_x, robot_frame_y, robot_frame_z, "map", "base_link", header_stamp)
 
 
     # inserts the given level object into the set of known level objects
     def insert_level_object(self, object_position_x, object_position_y, object_position_z, object_color, object_id):
-        # getting pointer to current level objects
-        old_current_cylinder_objects = self.current_cylinder_objects_
-        # creating a new CurrentCylinderObjects object for the member variable 'current_cylinder_objects_'
-        self.current_cylinder_objects_ = CurrentCylinderObjects(
-            old_current_cylinder_objects.position_x + [object_position_x],
-            old_current_cylinder_objects.position_y + [object_position_y],
-            old_current_cylinder_objects.position_z + [object_position_z],
-            old_current_cylinder_objects.color + [object_color],
-            old_current_cylinder_objects.object_id + [object_id],
-            old_current_cylinder_objects.number_of_objects + 1
-        )
+        self.cylinder_objects_.append(
+            position=(object_position_x, object_position_y, object_position_z),
+            color=object_color,
+            object_id=object_id)
         # publish current level objects whenever something changes about them (plus periodically via timer)
         self.publish_level_objects()
 
 
     # is called regulary by a timer to publish all known level objects
     def publish_level_objects(self):
-        # getting pointer to current_cylinder_objects before publishing, in case the object is exchanged while building the message
-        current_cylinder_objects = self.current_cylinder_objects_
+        # read only snapshot, so inserts while building the message do not change it
+        objects = self.cylinder_objects_.snapshot()
         msg = CylinderObjects() # creating msg of type CylinderObjects inter¸ (see import above: from delta_interfaces.msg import CylinderObjects)
-        msg.position_x = current_cylinder_objects.position_x
-        msg.position_y = current_cylinder_objects.position_y
-        msg.position_z = current_cylinder_objects.position_z
-        msg.color = current_cylinder_objects.color
-        msg.id = current_cylinder_objects.object_id
-        msg.number_of_objects = current_cylinder_objects.number_of_objects
+        msg.position_x = objects.position[:, 0].tolist()
+        msg.position_y = objects.position[:, 1].tolist()
+        msg.position_z = objects.position[:, 2].tolist()
+        msg.color = objects.color.tolist()
+        msg.id = objects.object_id.tolist()
+        msg.number_of_objects = objects.number_of_objects
         
         self.publisher_.publish(msg)
         self.publish_level_object_markers()
         #self.get_logger().info('Publishing %d level objects' % msg.number_of_objects)
         
     def publish_level_object_markers(self):
-        for i in range(self.current_cylinder_objects_.number_of_objects):
-            x = self.current_cylinder_objects_.position_x[i]
-            y = self.current_cylinder_objects_.position_y[i]
-            object_id = self.current_cylinder_objects_.object_id[i]
-            color = self.current_cylinder_objects_.color[i]
+        objects = self.cylinder_objects_.snapshot()
+        for i in range(objects.number_of_objects):
+            x = float(objects.position[i, 0])
+            y = float(objects.position[i, 1])
+            object_id = objects.object_id[i]
+            color = objects.color[i]
             
             self.send_marker(x, y, color, 2 * i + 1000)
             self.send_marker(x - 0.15, y, color, 2 * i + 1000 + 1, 0.15, object_id)
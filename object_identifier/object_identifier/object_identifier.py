@@ -7,12 +7,7 @@ from delta_interfaces.msg import LevelObjects
 from visualization_msgs.msg import Marker
 
 # for transforming between coordinate frames
-from tf2_ros.buffer import Buffer
-from tf2_ros import TransformException
-from tf2_ros.transform_listener import TransformListener
-from rclpy.duration import Duration
-from geometry_msgs.msg import PointStamped
-import tf2_geometry_msgs as tfg
+from delta_perception.transform_cache import TransformCache
 
 # publishing markers
 from visualization_msgs.msg import Marker
@@ -22,27 +17,17 @@ from builtin_interfaces.msg import Duration
 
 import numpy as np
 
+from object_identifier.object_store import ObjectStore
 
-# structure to store the currently known level objects
-class CurrentLevelObjects:
-    def __init__(self, position_x, position_y, position_z, p_x, p_y, p_z, rotation, object_id, counter, number_of_objects):
-        self.position_x = position_x
-        self.position_y = position_y
-        self.position_z = position_z
-        self.p_x = p_x
-        self.p_y = p_y
-        self.p_z = p_z
-        self.rotation = rotation
-        self.object_id = object_id
-        self.counter = counter
-        self.number_of_objects = number_of_objects
 
 class LevelObjectIdentifier(Node):
 
     def __init__(self):
         super().__init__('level_object_identifier')
         # initialize member variables
-        self.current_level_objects_ = CurrentLevelObjects([], [], [], [], [], [], [], [], [], 0)
+        # position of the face, approach pose in front of it, how often it was seen
+        self.level_objects_ = ObjectStore(position=(np.float64, 3), approach=(np.float64, 3), rotation=np.float64,
+                                          counter=np.int64, object_id=object)
         self.personId = 1
         
         # creating the publisher and a timer to publish level objects regulary
@@ -55,8 +40,7 @@ class LevelObjectIdentifier(Node):
         self.marker_subscription  # prevent unused variable warning
         
         # for transforming between coordinate frames
-        self.tf_buffer = Buffer()
-        self.tf_listener = TransformListener(self.tf_buffer, self)
+        self.tf_cache = TransformCache(self)
         
         # For publishing the markers
         self.marker_pub = self.create_publisher(Marker, "/delta_nav_marker", QoSReliabilityPolicy.RELIABLE)
@@ -88,27 +72,19 @@ class LevelObjectIdentifier(Node):
         # check if the new face is close to any of the known faces
         distance_threshold = 0.5
         distance_threshold_squared = distance_threshold * distance_threshold
-        for i in range(self.current_level_objects_.number_of_objects):
-            x = self.current_level_objects_.position_x[i]
-            y = self.current_level_objects_.position_y[i]
-            z = self.current_level_objects_.position_z[i]
-            
-            dx = x - face_x
-            dy = y - face_y
-            dz = z - face_z
-            
-            dist_squared = dx * dx + dy * dy + dz * dz
-            
-            if (dist_squared < distance_threshold_squared):
-                self.current_level_objects_.counter[i] += 1
-                if "person" in self.current_level_objects_.object_id[i] and self.current_level_objects_.counter[i] < self.counterThreshold and is_mona_lisa:
-                    self.current_level_objects_.object_id[i] = "monalisa_" + str(self.personId)
-                    self.personId = self.personId + 1
-
-
-                # this face already exists!
-                self.get_logger().info('ALREADY KNOWN person detected at (map_frame): (x: %f  y: %f  z: %f)' % (face_x, face_y, face_z))
-                return
+        objects = self.level_objects_
+        i, dist_squared = objects.nearest('position', (face_x, face_y, face_z))
+        if (dist_squared < distance_threshold_squared):
+            counter = objects.field('counter')[i] + 1
+            objects.set(i, 'counter', counter)
+            object_id = objects.field('object_id')[i]
+            if "person" in object_id and counter < self.counterThreshold and is_mona_lisa:
+                objects.set(i, 'object_id', "monalisa_" + str(self.personId))
+                self.personId = self.personId + 1
+
+            # this face already exists!
+            self.get_logger().info('ALREADY KNOWN person detected at (map_frame): (x: %f  y: %f  z: %f)' % (face_x, face_y, face_z))
+            return
 
         robot_map_position = self.transform_from_robot_to_map_frame_safe(0.0, 0.0)
 
@@ -158,109 +134,42 @@ class LevelObjectIdentifier(Node):
                 time.sleep(1)
         return robot_map_position
 
+    # position of a point of the robot in the map frame, with the latest transform
     def transform_from_robot_to_map_frame1(self, robot_frame_x, robot_frame_y, robot_frame_z):
+        return self.tf_cache.transform_point(robot_frame_x, robot_frame_y, robot_frame_z, "map", "base_link")
 
-        point_in_robot_frame = PointStamped()
-        point_in_robot_frame.header.frame_id = "/base_link"
-        point_in_robot_frame.header.stamp = self.get_clock().now().to_msg()
-        point_in_robot_frame.point.x = robot_frame_x
-        point_in_robot_frame.point.y = robot_frame_y
-        point_in_robot_frame.point.z = robot_frame_z
-
-        time_now = rclpy.time.Time()
-        timeout = rclpy.duration.Duration(seconds=0.1)
-
-        try:
-            trans = self.tf_buffer.lookup_transform("map", "base_link", time_now, timeout)
-            point_in_map_frame = tfg.do_transform_point(point_in_robot_frame, trans)
-            map_frame_x = point_in_map_frame.point.x
-            map_frame_y = point_in_map_frame.point.y
-            map_frame_z = point_in_map_frame.point.z
-            return [map_frame_x, map_frame_y, map_frame_z]
-        except TransformException as te:
-            self.get_logger().info(f"Cound not get the transform: {te}")
-            return None
-
-    # trys to transfer the given point from robot frame to map frame.
+    # trys to transfer the given point from robot frame to map frame, with the transform at the time of the detection.
     # Returns the array [map_frame_x, map_frame_y, map_frame_z]. If it can not succeede it returns None
     def transform_from_robot_to_map_frame(self, robot_frame_x, robot_frame_y, robot_frame_z, header_stamp):
-        point_in_robot_frame = PointStamped()
-        point_in_robot_frame.header.frame_id = "/base_link"
-        point_in_robot_frame.header.stamp = header_stamp
-        point_in_robot_frame.point.x = robot_frame_x
-        point_in_robot_frame.point.y = robot_frame_y
-        point_in_robot_frame.point.z = robot_frame_z
-        
-        time_now = rclpy.time.Time()
-        timeout = rclpy.duration.Duration(seconds=0.1)
-
-        try:
-            trans = self.tf_buffer.lookup_transform("map", "base_link", time_now, timeout)
-            point_in_map_frame = tfg.do_transform_point(point_in_robot_frame, trans)
-            map_frame_x = point_in_map_frame.point.x
-            map_frame_y = point_in_map_frame.point.y
-            map_frame_z = point_in_map_frame.point.z
-            return [map_frame_x, map_frame_y, map_frame_z]
-        except TransformException as te:
-            self.get_logger().info(f"Cound not get the transform: {te}")
-            return None
+        return self.tf_cache.transform_point(robot_frame_x, robot_frame_y, robot_frame_z, "map", "base_link", header_stamp)
 
 
     # inserts the given level object into the set of known level objects
     def insert_level_object(self, object_position_x, object_position_y, object_position_z, p_x, p_y, p_z, object_rotation, object_id):
-        # getting pointer to current level objects
-        old_current_level_objects = self.current_level_objects_
-        # creating a new CurrentLevelObjects object for the member variable 'current_level_objects_'
-        self.current_level_objects_ = CurrentLevelObjects(
-            old_current_level_objects.position_x + [object_position_x],
-            old_current_level_objects.position_y + [object_position_y],
-            old_current_level_objects.position_z + [object_position_z],
-            old_current_level_objects.p_x + [p_x],
-            old_current_level_objects.p_y + [p_y],
-            old_current_level_objects.p_z + [p_z],
-            old_current_level_objects.rotation + [object_rotation],
-            old_current_level_objects.object_id + [object_id],
-            old_current_level_objects.counter + [1],
-            old_current_level_objects.number_of_objects + 1
-        )
+        self.level_objects_.append(
+            position=(object_position_x, object_position_y, object_position_z),
+            approach=(p_x, p_y, p_z),
+            rotation=object_rotation,
+            counter=1,
+            object_id=object_id)
         # publish current level objects whenever something changes about them (plus periodically via timer)
         self.publish_level_objects()
 
 
     # is called regulary by a timer to publish all known level objects
     def publish_level_objects(self):
-        # getting pointer to current_level_objects before publishing, in case the object is exchanged while building the message
-        current_level_objects = self.current_level_objects_
-
-
-        """msg = LevelObjects() # creating msg of type LevelObjects interface (see import above: from delta_interfaces.msg import LevelObjects)
-        msg.position_x = current_level_objects.p_x
-        msg.position_y = current_level_objects.p_y
-        msg.position_z = current_level_objects.p_z
-        msg.rotation = current_level_objects.rotation
-        msg.id = current_level_objects.object_id
-        msg.number_of_objects = current_level_objects.number_of_objects"""
-
-        msg = LevelObjects()
-        msg.position_x = []
-        msg.position_y = []
-        msg.position_z = []
-        msg.rotation = []
-        msg.id = []
-        number_of_objects = 0
-        index = -1
-        for x in current_level_objects.p_x:
-            index += 1
-            if current_level_objects.counter[index] < self.counterThreshold:
-                continue
-            msg.position_x.append(current_level_objects.p_x[index])
-            msg.position_y.append(current_level_objects.p_y[index])
-            msg.position_z.append(current_level_objects.p_z[index])
-            msg.rotation.append(current_level_objects.rotation[index])
-            msg.id.append(current_level_objects.object_id[index])
-            number_of_objects += 1
-
-        msg.number_of_objects = number_of_objects
+        # read only snapshot, so inserts while building the message do not change it
+        objects = self.level_objects_.snapshot()
+
+        # only the objects that were seen often enough, with their approach poses
+        seen = objects.counter >= self.counterThreshold
+        msg = LevelObjects() # creating msg of type LevelObjects interface (see import above: from delta_interfaces.msg import LevelObjects)
+        msg.position_x = objects.approach[seen, 0].tolist()
+        msg.position_y = objects.approach[seen, 1].tolist()
+        msg.position_z = objects.approach[seen, 2].tolist()
+        msg.rotation = objects.rotation[seen].tolist()
+        msg.id = objects.object_id[seen].tolist()
+        msg.number_of_objects = int(np.count_nonzero(seen))
 
         
         self.publisher_.publish(msg)
@@ -268,12 +177,13 @@ class LevelObjectIdentifier(Node):
         #self.get_logger().info('Publishing %d level objects' % msg.number_of_objects)
         
     def publish_level_object_markers(self):
-        for i in range(self.current_level_objects_.number_of_objects):
-            x = self.current_level_objects_.position_x[i]
-            y = self.current_level_objects_.position_y[i]
-            object_id = self.current_level_objects_.object_id[i]
+        objects = self.level_objects_.snapshot()
+        for i in range(objects.number_of_objects):
+            x = float(objects.position[i, 0])
+            y = float(objects.position[i, 1])
+            object_id = objects.object_id[i]
             
-            if "person" in self.current_level_objects_.object_id[i]:
+            if "person" in object_id:
                 self.send_marker(x, y, 2 * i + 1000)
                 self.send_marker(x - 0.15, y, 2 * i + 1000 + 1, 0.15, object_id)
             else:
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+# read only copy of the objects in an ObjectStore at one point in time, for the publishers.
+# Every field is an attribute holding an array with one row per object.
+class ObjectSnapshot:
+    def __init__(self, arrays, count):
+        self.number_of_objects = count
+        for name, array in arrays.items():
+            array.flags.writeable = False
+            setattr(self, name, array)
+
+    def __len__(self):
+        return self.number_of_objects
+
+
+# structure to store the known objects of a level as one growable numpy array per field
+# (struct of arrays). Fields are given as name=dtype or name=(dtype, width), e.g.
+#   ObjectStore(position=(np.float64, 3), counter=np.int64, object_id=object)
+# Appending doubles the capacity when it is full, so it is amortized O(1). field() returns a
+# view of the used rows for reading, changes go through set() so the cached snapshot is renewed.
+# snapshot() returns a read only copy that later changes do not affect.
+class ObjectStore:
+    def __init__(self, capacity=16, **fields):
+        self.count = 0
+        self.capacity = capacity
+        self.arrays = {}
+        for name, spec in fields.items():
+            dtype, width = spec if isinstance(spec, tuple) else (spec, None)
+            shape = (capacity,) if width is None else (capacity, width)
+            self.arrays[name] = np.zeros(shape, dtype=dtype) if dtype is not object else np.full(shape, None, dtype=object)
+        self._snapshot = None
+
+    def __len__(self):
+        return self.count
+
+    # appends one object, every field has to be given, returns its index
+    def append(self, **values):
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        for name, array in self.arrays.items():
+            array[i] = values[name]
+        self.count += 1
+        self._snapshot = None
+        return i
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, array in self.arrays.items():
+            grown = np.zeros((self.capacity,) + array.shape[1:], dtype=array.dtype)
+            if array.dtype == object:
+                grown.fill(None)
+            grown[:self.count] = array[:self.count]
+            self.arrays[name] = grown
+
+    # view of the used rows of a field
+    def field(self, name):
+        return self.arrays[name][:self.count]
+
+    # sets field 'name' of object i
+    def set(self, i, name, value):
+        self.arrays[name][i] = value
+        self._snapshot = None
+
+    def snapshot(self):
+        # only copied again after something changed, the publishers run every second anyway
+        if self._snapshot is None:
+            self._snapshot = ObjectSnapshot({name: array[:self.count].copy() for name, array in self.arrays.items()}, self.count)
+        return self._snapshot
+
+    # index and squared distance of the object whose 'name' field is closest to 'point',
+    # (None, inf) if there are no objects
+    def nearest(self, name, point):
+        if self.count == 0:
+            return None, float('inf')
+        d = self.field(name) - np.asarray(point, dtype=np.float64)
+        dist_squared = np.einsum('ij,ij->i', d, d)
+        i = int(np.argmin(dist_squared))
+        return i, float(dist_squared[i])
+
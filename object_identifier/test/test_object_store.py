@@ -0,0 +1,53 @@
+import math
+
+from object_identifier.object_store import ObjectStore
+import numpy as np
+import pytest
+
+
+def make_store(capacity=2):
+    return ObjectStore(capacity, position=(np.float64, 3), counter=np.int64, object_id=object)
+
+
+def test_grows_past_capacity():
+    store = make_store(capacity=2)
+    for k in range(5):
+        assert store.append(position=(k, 0.0, 0.0), counter=k, object_id='object %d' % k) == k
+
+    assert len(store) == 5
+    assert store.capacity == 8
+    assert store.field('counter').tolist() == [0, 1, 2, 3, 4]
+    assert store.field('position')[:, 0].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert store.field('object_id').tolist() == ['object %d' % k for k in range(5)]
+    # the unused rows of an object field are None, not 0
+    assert store.arrays['object_id'][5] is None
+
+
+def test_nearest():
+    store = make_store()
+    assert store.nearest('position', (0.0, 0.0, 0.0)) == (None, math.inf)
+
+    store.append(position=(1.0, 0.0, 0.0), counter=0, object_id=None)
+    store.append(position=(0.0, 2.0, 0.0), counter=0, object_id=None)
+    i, dist_squared = store.nearest('position', (0.0, 1.5, 0.0))
+    assert i == 1
+    assert dist_squared == pytest.approx(0.25)
+
+
+def test_snapshot_is_immutable():
+    store = make_store()
+    store.append(position=(1.0, 0.0, 0.0), counter=1, object_id='ring')
+    snapshot = store.snapshot()
+    assert store.snapshot() is snapshot
+
+    store.set(0, 'counter', 5)
+    store.set(0, 'position', (2.0, 0.0, 0.0))
+    assert snapshot.counter.tolist() == [1]
+    assert snapshot.position[0].tolist() == [1.0, 0.0, 0.0]
+    with pytest.raises(ValueError):
+        snapshot.counter[0] = 3
+
+    renewed = store.snapshot()
+    assert renewed is not snapshot
+    assert renewed.counter.tolist() == [5]
+    assert len(renewed) == 1